@@ -1,13 +1,23 @@
 import React, { useState, useEffect } from 'react';
 import './LogsViewer.css';
 
+// Log endpoints are admin-only
+const authHeaders = () => {
+  const token = localStorage.getItem('adminToken');
+  return token ? { Authorization: `Bearer ${token}` } : {};
+};
+
 const LogsViewer = () => {
   const [logs, setLogs] = useState([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [selectedLog, setSelectedLog] = useState(null);
+  const [detailLoading, setDetailLoading] = useState(false);
   const [currentPage, setCurrentPage] = useState(1);
   const [totalCount, setTotalCount] = useState(0);
+  const [countIsEstimate, setCountIsEstimate] = useState(false);
+  // Keyset pagination: cursors[i] is the cursor that loads page i + 1
+  const [cursors, setCursors] = useState([null]);
   const [logsPerPage] = useState(20);
 
   useEffect(() => {
@@ -17,8 +27,10 @@ const LogsViewer = () => {
   const fetchLogs = async () => {
     try {
       setLoading(true);
-      const skip = (currentPage - 1) * logsPerPage;
-      const response = await fetch(`http://localhost:8000/api/logs?skip=${skip}&limit=${logsPerPage}`);
+      const params = new URLSearchParams({ limit: logsPerPage });
+      const cursor = cursors[currentPage - 1];
+      if (cursor) params.append('cursor', cursor);
+      const response = await fetch(`http://localhost:8000/api/logs?${params}`, { headers: authHeaders() });
       
       if (!response.ok) {
         throw new Error('Failed to fetch logs');
@@ -27,6 +39,12 @@ const LogsViewer = () => {
       const data = await response.json();
       setLogs(data.logs);
       setTotalCount(data.total_count);
+      setCountIsEstimate(data.count_is_estimate);
+      setCursors(prev => {
+        const next = prev.slice(0, currentPage);
+        if (data.next_cursor) next.push(data.next_cursor);
+        return next;
+      });
       setError(null);
     } catch (err) {
       setError(err.message);
@@ -49,20 +67,39 @@ const LogsViewer = () => {
     });
   };
 
-  const truncateLog = (log, maxLength = 200) => {
-    if (log.length <= maxLength) return log;
-    return log.substring(0, maxLength) + '...';
+  const formatSummary = (summary) => {
+    if (!summary) return 'No summary';
+    const parts = [summary.status];
+    if (summary.duration_ms != null) parts.push(`${(summary.duration_ms / 1000).toFixed(1)}s`);
+    parts.push(`${summary.total_tokens || 0} tokens`);
+    parts.push(`${summary.tool_calls || 0} tool calls`);
+    if (summary.member_calls) parts.push(`${summary.member_calls} delegations`);
+    return parts.join(' · ');
   };
 
-  const handleLogClick = (log) => {
-    setSelectedLog(log);
+  const handleLogClick = async (log) => {
+    // Full trace is loaded on demand; the list only carries summaries
+    setSelectedLog({ ...log, trace: null, raw_log: null });
+    setDetailLoading(true);
+    try {
+      const response = await fetch(`http://localhost:8000/api/logs/runs/${log.id}`, { headers: authHeaders() });
+      if (!response.ok) {
+        throw new Error('Failed to fetch log details');
+      }
+      setSelectedLog(await response.json());
+    } catch (err) {
+      setSelectedLog({ ...log, trace: null, raw_log: `Error: ${err.message}` });
+    } finally {
+      setDetailLoading(false);
+    }
   };
 
   const closeModal = () => {
     setSelectedLog(null);
   };
 
-  const totalPages = Math.ceil(totalCount / logsPerPage);
+  const totalPages = Math.max(1, Math.ceil(totalCount / logsPerPage));
+  const hasNextPage = cursors.length > currentPage;
 
   if (loading) {
     return (
@@ -85,7 +122,7 @@ const LogsViewer = () => {
       <div className="logs-header">
         <h2>Conversation Logs</h2>
         <div className="logs-stats">
-          Total Logs: {totalCount}
+          Total Logs: {countIsEstimate ? '~' : ''}{totalCount}
         </div>
       </div>
 
@@ -97,7 +134,7 @@ const LogsViewer = () => {
               <th>Conversation ID</th>
               <th>Persona ID</th>
               <th>Message ID</th>
-              <th>Log Preview</th>
+              <th>Summary</th>
               <th>Created At</th>
               <th>Actions</th>
             </tr>
@@ -110,7 +147,7 @@ const LogsViewer = () => {
                 <td>{log.persona_id}</td>
                 <td>{log.message_id}</td>
                 <td className="log-preview">
-                  {truncateLog(log.raw_log)}
+                  {formatSummary(log.summary)}
                 </td>
                 <td>{formatDate(log.created_at)}</td>
                 <td>
@@ -137,12 +174,12 @@ const LogsViewer = () => {
         </button>
         
         <span className="page-info">
-          Page {currentPage} of {totalPages}
+          Page {currentPage} of {countIsEstimate ? '~' : ''}{totalPages}
         </span>
         
         <button 
-          onClick={() => setCurrentPage(prev => Math.min(totalPages, prev + 1))}
-          disabled={currentPage === totalPages}
+          onClick={() => setCurrentPage(prev => prev + 1)}
+          disabled={!hasNextPage}
         >
           Next
         </button>
@@ -158,11 +195,41 @@ const LogsViewer = () => {
             </div>
             
             <div className="drawer-body">
-              <div className="log-content">
-                <div className="log-text-container">
-                  <pre className="log-text">{selectedLog.raw_log}</pre>
+              {detailLoading ? (
+                <div className="loading">Loading trace...</div>
+              ) : (
+                <div className="log-content">
+                  {selectedLog.trace && selectedLog.trace.spans && selectedLog.trace.spans.length > 0 && (
+                    <table className="trace-table">
+                      <thead>
+                        <tr>
+                          <th>Kind</th>
+                          <th>Name</th>
+                          <th>Agent</th>
+                          <th>Duration</th>
+                          <th>Tokens</th>
+                          <th>Status</th>
+                        </tr>
+                      </thead>
+                      <tbody>
+                        {selectedLog.trace.spans.map((span, index) => (
+                          <tr key={index}>
+                            <td>{span.kind}</td>
+                            <td>{span.name}</td>
+                            <td>{span.agent}</td>
+                            <td>{span.duration_ms != null ? `${span.duration_ms} ms` : '-'}</td>
+                            <td>{span.total_tokens != null ? span.total_tokens : '-'}</td>
+                            <td>{span.status}</td>
+                          </tr>
+                        ))}
+                      </tbody>
+                    </table>
+                  )}
+                  <div className="log-text-container">
+                    <pre className="log-text">{selectedLog.raw_log || (selectedLog.storage_tier === 'expired' ? 'Trace expired (past retention)' : '')}</pre>
+                  </div>
                 </div>
-              </div>
+              )}
             </div>
           </div>
         </div>
@@ -0,0 +1,42 @@
+"""structured run log traces
+
+Revision ID: 3b7e9d2a41c6
+Revises: c505402f5cbd
+Create Date: 2026-10-17 10:12:40.318204
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '3b7e9d2a41c6'
+down_revision: Union[str, Sequence[str], None] = 'c505402f5cbd'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('logs', sa.Column('summary', sa.JSON(), nullable=True))
+    op.add_column('logs', sa.Column('trace_gz', sa.LargeBinary(), nullable=True))
+    op.add_column('logs', sa.Column('storage_tier', sa.String(), server_default='hot', nullable=False))
+    op.add_column('logs', sa.Column('trace_object_name', sa.String(), nullable=True))
+    op.alter_column('logs', 'raw_log',
+               existing_type=sa.TEXT(),
+               nullable=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    # Rows without a legacy dump cannot satisfy NOT NULL again
+    op.execute("UPDATE logs SET raw_log = '' WHERE raw_log IS NULL")
+    op.alter_column('logs', 'raw_log',
+               existing_type=sa.TEXT(),
+               nullable=False)
+    op.drop_column('logs', 'trace_object_name')
+    op.drop_column('logs', 'storage_tier')
+    op.drop_column('logs', 'trace_gz')
+    op.drop_column('logs', 'summary')
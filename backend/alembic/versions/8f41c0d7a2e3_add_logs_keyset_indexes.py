@@ -0,0 +1,35 @@
+"""add logs keyset indexes
+
+Revision ID: 8f41c0d7a2e3
+Revises: 3b7e9d2a41c6
+Create Date: 2026-10-17 11:03:15.902117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8f41c0d7a2e3'
+down_revision: Union[str, Sequence[str], None] = '3b7e9d2a41c6'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build without blocking writes to the logs table
+    with op.get_context().autocommit_block():
+        op.create_index('ix_logs_created_at_id', 'logs', ['created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_logs_conversation_id_created_at_id', 'logs', ['conversation_id', 'created_at', 'id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_logs_conversation_id_created_at_id', table_name='logs', postgresql_concurrently=True)
+        op.drop_index('ix_logs_created_at_id', table_name='logs', postgresql_concurrently=True)
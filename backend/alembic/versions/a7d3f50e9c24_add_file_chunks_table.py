@@ -0,0 +1,42 @@
+"""add file chunks table
+
+Revision ID: a7d3f50e9c24
+Revises: 5c19e8b4f7a0
+Create Date: 2026-10-17 14:58:32.674410
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f50e9c24'
+down_revision: Union[str, Sequence[str], None] = '5c19e8b4f7a0'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('file_chunks',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('chunk_index', sa.Integer(), nullable=False),
+    sa.Column('page', sa.Integer(), nullable=True),
+    sa.Column('text', sa.Text(), nullable=False),
+    sa.Column('embedding', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('content_hash', 'chunk_index', name='uq_file_chunks_content_hash_chunk_index')
+    )
+    op.create_index(op.f('ix_file_chunks_id'), 'file_chunks', ['id'], unique=False)
+    op.create_index(op.f('ix_file_chunks_content_hash'), 'file_chunks', ['content_hash'], unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_file_chunks_content_hash'), table_name='file_chunks')
+    op.drop_index(op.f('ix_file_chunks_id'), table_name='file_chunks')
+    op.drop_table('file_chunks')
@@ -0,0 +1,37 @@
+"""add gmail credentials table
+
+Revision ID: a7d3f5e9c812
+Revises: b4e81c6f2d07
+Create Date: 2026-10-17 21:05:44.912357
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'a7d3f5e9c812'
+down_revision: Union[str, Sequence[str], None] = 'b4e81c6f2d07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('gmail_credentials',
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(), nullable=True),
+    sa.Column('token_encrypted', sa.LargeBinary(), nullable=False),
+    sa.Column('scopes', sa.JSON(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+    sa.PrimaryKeyConstraint('user_id')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('gmail_credentials')
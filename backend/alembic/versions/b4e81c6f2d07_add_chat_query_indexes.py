@@ -0,0 +1,54 @@
+"""add chat query indexes
+
+Revision ID: b4e81c6f2d07
+Revises: e6b2c94d1f38
+Create Date: 2026-10-17 18:42:06.318520
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b4e81c6f2d07'
+down_revision: Union[str, Sequence[str], None] = 'e6b2c94d1f38'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Collapse duplicate assignments before enforcing uniqueness: keep the
+    # active row if there is one, otherwise the newest
+    op.execute("""
+        DELETE FROM user_personas a
+        USING user_personas b
+        WHERE a.user_id = b.user_id
+          AND a.persona_id = b.persona_id
+          AND (COALESCE(b.is_active, false), b.id) > (COALESCE(a.is_active, false), a.id)
+    """)
+
+    # Build without blocking writes to the chat tables
+    with op.get_context().autocommit_block():
+        op.create_index('ix_messages_conversation_id_timestamp', 'messages', ['conversation_id', 'timestamp'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_messages_conversation_id_id', 'messages', ['conversation_id', 'id'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('ix_conversations_user_id_updated_at', 'conversations', ['user_id', 'updated_at'],
+                        unique=False, postgresql_concurrently=True)
+        op.create_index('uq_user_personas_user_id_persona_id', 'user_personas', ['user_id', 'persona_id'],
+                        unique=True, postgresql_include=['is_active'], postgresql_concurrently=True)
+        op.create_index('ix_user_personas_persona_id', 'user_personas', ['persona_id'],
+                        unique=False, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_user_personas_persona_id', table_name='user_personas', postgresql_concurrently=True)
+        op.drop_index('uq_user_personas_user_id_persona_id', table_name='user_personas', postgresql_concurrently=True)
+        op.drop_index('ix_conversations_user_id_updated_at', table_name='conversations', postgresql_concurrently=True)
+        op.drop_index('ix_messages_conversation_id_id', table_name='messages', postgresql_concurrently=True)
+        op.drop_index('ix_messages_conversation_id_timestamp', table_name='messages', postgresql_concurrently=True)
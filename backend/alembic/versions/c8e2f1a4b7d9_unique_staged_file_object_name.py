@@ -0,0 +1,33 @@
+"""unique staged file object name
+
+Revision ID: c8e2f1a4b7d9
+Revises: a7d3f5e9c812
+Create Date: 2026-10-17 23:12:38.604117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'c8e2f1a4b7d9'
+down_revision: Union[str, Sequence[str], None] = 'a7d3f5e9c812'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Build without blocking uploads
+    with op.get_context().autocommit_block():
+        op.create_index('uq_files_staged_object_name', 'files', ['object_name'],
+                        unique=True, postgresql_where=sa.text("object_name LIKE 'staging/%'"),
+                        postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index('uq_files_staged_object_name', table_name='files', postgresql_concurrently=True)
@@ -0,0 +1,30 @@
+"""add conversation summary
+
+Revision ID: d2a86f3c5b19
+Revises: 8f41c0d7a2e3
+Create Date: 2026-10-17 12:20:48.551093
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd2a86f3c5b19'
+down_revision: Union[str, Sequence[str], None] = '8f41c0d7a2e3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('conversations', sa.Column('summary', sa.Text(), nullable=True))
+    op.add_column('conversations', sa.Column('summary_message_id', sa.Integer(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('conversations', 'summary_message_id')
+    op.drop_column('conversations', 'summary')
@@ -0,0 +1,35 @@
+"""add file blobs table
+
+Revision ID: e6b2c94d1f38
+Revises: a7d3f50e9c24
+Create Date: 2026-10-17 16:05:19.447152
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e6b2c94d1f38'
+down_revision: Union[str, Sequence[str], None] = 'a7d3f50e9c24'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('file_blobs',
+    sa.Column('content_hash', sa.String(length=64), nullable=False),
+    sa.Column('object_name', sa.String(), nullable=False),
+    sa.Column('file_size', sa.Integer(), nullable=False),
+    sa.Column('ref_count', sa.Integer(), nullable=False, server_default='0'),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('content_hash')
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('file_blobs')
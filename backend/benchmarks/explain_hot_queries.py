@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+EXPLAIN check: hot chat queries must use index scans at scale
+
+Usage:
+    python benchmarks/explain_hot_queries.py [--messages 1000000] [--conversations 20000] [--users 2000] [--keep]
+
+Creates a scratch schema in the DATABASE_URL database, builds the tables
+from the models (indexes included), seeds them with generate_series, runs
+ANALYZE and then EXPLAINs the queries the chat endpoints issue on every
+turn. Fails (exit 1) if any plan sequentially scans one of the hot
+tables. Point it at a local Postgres; the schema is dropped afterwards
+unless --keep is given.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, text
+from sqlalchemy.dialects import postgresql
+
+from database import engine, Base
+from models import AgentRunLog, Conversation, Message, Persona, UserPersona
+
+SCHEMA = "explain_bench"
+HOT_TABLES = {"messages", "conversations", "user_personas", "logs"}
+
+
+def seed(conn, args):
+    """Fill the scratch tables; rows are spread evenly across parents"""
+    params = {
+        "users": args.users,
+        "personas": max(10, args.users // 100),
+        "conversations": args.conversations,
+        "messages": args.messages,
+    }
+    statements = [
+        "INSERT INTO user_roles (id, name) VALUES (1, 'user')",
+        """INSERT INTO users (id, email, username, role_id, is_active, created_at)
+           SELECT g, 'user' || g || '@example.com', 'user' || g, 1, true, now()
+           FROM generate_series(1, :users) g""",
+        """INSERT INTO personas (id, name, is_active, created_at)
+           SELECT g, 'persona ' || g, true, now() FROM generate_series(1, :personas) g""",
+        # Every user gets three personas
+        """INSERT INTO user_personas (user_id, persona_id, is_active, assigned_at)
+           SELECT u, ((u + k) % :personas) + 1, k <> 2, now()
+           FROM generate_series(1, :users) u, generate_series(0, 2) k""",
+        """INSERT INTO conversations (id, title, user_id, persona_id, status, created_at, updated_at)
+           SELECT g, 'conversation ' || g, (g % :users) + 1, (g % :personas) + 1, 'active',
+                  now() - (g || ' minutes')::interval, now() - (g || ' seconds')::interval
+           FROM generate_series(1, :conversations) g""",
+        """INSERT INTO messages (id, conversation_id, role, content, sender_type, timestamp)
+           SELECT g, (g % :conversations) + 1, CASE WHEN g % 2 = 0 THEN 'user' ELSE 'assistant' END,
+                  repeat('lorem ipsum ', 8), 'user', now() - ((:messages - g) || ' seconds')::interval
+           FROM generate_series(1, :messages) g""",
+        # One run log per assistant message
+        """INSERT INTO logs (conversation_id, persona_id, message_id, storage_tier, created_at)
+           SELECT m.conversation_id, 1, m.id, 'hot', m.timestamp
+           FROM messages m WHERE m.role = 'assistant'""",
+    ]
+    for statement in statements:
+        started = time.perf_counter()
+        conn.execute(text(statement), params)
+        print(f"  {statement.split()[2]:14} {time.perf_counter() - started:6.1f}s")
+    for table in ("users", "personas", "user_personas", "conversations", "messages", "logs"):
+        conn.execute(text(f"ANALYZE {table}"))
+
+
+def hot_queries(args):
+    """The statements the chat endpoints run, built from the models"""
+    conversation_id = args.conversations // 2
+    user_id = args.users // 2
+    return {
+        "conversation transcript": select(Message)
+            .where(Message.conversation_id == conversation_id)
+            .order_by(Message.timestamp),
+        "context window": select(Message)
+            .where(Message.conversation_id == conversation_id, Message.id > 0)
+            .order_by(Message.id.desc()).limit(200),
+        "user conversations": select(Conversation)
+            .where(Conversation.user_id == user_id)
+            .order_by(Conversation.updated_at.desc()),
+        "assignment check": select(UserPersona)
+            .where(UserPersona.user_id == user_id, UserPersona.persona_id == 1, UserPersona.is_active == True),
+        "user personas": select(Persona.id, Persona.name)
+            .join(UserPersona, UserPersona.persona_id == Persona.id)
+            .where(UserPersona.user_id == user_id, UserPersona.is_active == True, Persona.is_active == True),
+        "conversation logs": select(AgentRunLog.id, AgentRunLog.created_at)
+            .where(AgentRunLog.conversation_id == conversation_id)
+            .order_by(AgentRunLog.created_at.desc(), AgentRunLog.id.desc()).limit(50),
+    }
+
+
+def seq_scans(plan: dict) -> list:
+    """Hot tables read by a sequential scan anywhere in a plan tree"""
+    found = []
+    if plan.get("Node Type") == "Seq Scan" and plan.get("Relation Name") in HOT_TABLES:
+        found.append(plan["Relation Name"])
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def scan_nodes(plan: dict) -> list:
+    nodes = []
+    if "Relation Name" in plan:
+        nodes.append(f"{plan['Node Type']} on {plan['Relation Name']}" + (f" using {plan['Index Name']}" if "Index Name" in plan else ""))
+    for child in plan.get("Plans", []):
+        nodes.extend(scan_nodes(child))
+    return nodes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--conversations", type=int, default=20_000)
+    parser.add_argument("--users", type=int, default=2_000)
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch schema")
+    args = parser.parse_args()
+
+    failures = 0
+    with engine.connect() as conn:
+        conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        conn.execute(text(f"SET search_path TO {SCHEMA}"))
+        try:
+            Base.metadata.create_all(conn)
+            print(f"🌱 Seeding {args.messages:,} messages in {args.conversations:,} conversations")
+            seed(conn, args)
+            conn.commit()
+
+            for name, query in hot_queries(args).items():
+                sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+                plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+                bad = seq_scans(plan)
+                failures += bool(bad)
+                print(f"{'❌' if bad else '✅'} {name}: {', '.join(scan_nodes(plan))} (cost {plan['Total Cost']:.0f})")
+        finally:
+            conn.rollback()
+            if not args.keep:
+                conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+                conn.commit()
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
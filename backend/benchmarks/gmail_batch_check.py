@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""
+Round-trip check for GmailTool searches against a local Gmail API stub
+
+Usage:
+    python benchmarks/gmail_batch_check.py [--latency-ms 40]
+
+Swaps the tool's service object for an in-process stub that sleeps
+--latency-ms per HTTP round-trip and counts them. Each search must cost
+one list call plus one batch per GMAIL_BATCH_SIZE results, request
+metadata only and keep Gmail's result order. A throttled run rate-limits
+one call per batch to exercise the retry round. Exits 1 on a regression;
+no Google account or network needed.
+"""
+
+import argparse
+import math
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.errors import HttpError
+from httplib2 import Response
+
+from tools.gmail_tool import GmailTool, GMAIL_BATCH_SIZE
+
+
+class StubRequest:
+    def __init__(self, service, kwargs):
+        self.service = service
+        self.kwargs = kwargs
+
+    def execute(self, http=None):
+        self.service.round_trip()
+        return self.service.list_result(self.kwargs)
+
+
+class StubBatch:
+    def __init__(self, service, callback):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, request_id=None):
+        self.requests.append((request_id, request))
+
+    def execute(self, http=None):
+        self.service.round_trip()
+        for index, (request_id, request) in enumerate(self.requests):
+            self.service.fetch_kwargs.append(request.kwargs)
+            message_id = request.kwargs["id"]
+            if self.service.throttle and index == 0 and message_id not in self.service.throttled:
+                # First call of every batch is rejected once, like a per-user rate limit
+                self.service.throttled.add(message_id)
+                self.callback(request_id, None, HttpError(Response({"status": 429}), b"rateLimitExceeded"))
+                continue
+            self.callback(request_id, {
+                "id": message_id,
+                "snippet": f"snippet {message_id}",
+                "labelIds": ["INBOX", "UNREAD"],
+                "payload": {"headers": [
+                    {"name": "Subject", "value": f"subject {message_id}"},
+                    {"name": "From", "value": "sender@example.com"},
+                    {"name": "Date", "value": "Mon, 1 Jan 2024 09:00:00 +0000"},
+                ]},
+            }, None)
+
+
+class StubGmailService:
+    """Just enough of googleapiclient's Gmail resource for the search path"""
+
+    def __init__(self, latency: float, throttle: bool = False):
+        self.latency = latency
+        self.throttle = throttle
+        self.round_trips = 0
+        self.fetch_kwargs = []
+        self.throttled = set()
+
+    def round_trip(self):
+        self.round_trips += 1
+        time.sleep(self.latency)
+
+    def users(self):
+        return self
+
+    def messages(self):
+        return self
+
+    def list(self, **kwargs):
+        return StubRequest(self, kwargs)
+
+    def get(self, **kwargs):
+        return StubRequest(self, kwargs)
+
+    def new_batch_http_request(self, callback=None):
+        return StubBatch(self, callback)
+
+    def list_result(self, kwargs):
+        count = kwargs["maxResults"]
+        return {"messages": [{"id": f"m{index:04d}"} for index in range(count)]}
+
+
+def check(name: str, search, count: int, latency: float, throttle: bool = False) -> bool:
+    tool = GmailTool()
+    tool.service = service = StubGmailService(latency, throttle)
+    started = time.perf_counter()
+    results = search(tool, count)
+    elapsed = time.perf_counter() - started
+
+    batches = math.ceil(count / GMAIL_BATCH_SIZE)
+    # List call and the batches, plus one retry round for rate-limited calls
+    budget = 1 + batches + (math.ceil(batches / GMAIL_BATCH_SIZE) if throttle else 0)
+    problems = []
+    if service.round_trips > budget:
+        problems.append(f"{service.round_trips} round-trips, budget {budget}")
+    if [result["id"] for result in results] != [f"m{index:04d}" for index in range(count)]:
+        problems.append("results missing or out of order")
+    if any(kwargs.get("format") != "metadata" for kwargs in service.fetch_kwargs):
+        problems.append("fetched full message payloads")
+
+    print(
+        f"{'❌' if problems else '✅'} {name} x{count}{' (throttled)' if throttle else ''}: {service.round_trips} round-trips "
+        f"(sequential gets: {1 + count}), {elapsed * 1000:.0f} ms"
+        + (f" - {'; '.join(problems)}" if problems else "")
+    )
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=40)
+    args = parser.parse_args()
+    latency = args.latency_ms / 1000
+
+    searches = {
+        "search_emails": lambda tool, n: tool.search_emails("invoice", max_results=n),
+        "search_emails_by_date_range": lambda tool, n: tool.search_emails_by_date_range("2024/01/01", "2024/02/01", max_results=n),
+        "search_emails_by_category": lambda tool, n: tool.search_emails_by_category("updates", max_results=n),
+        "get_unread_emails": lambda tool, n: tool.get_unread_emails(max_results=n),
+    }
+    results = [
+        check(name, search, count, latency, throttle)
+        for name, search in searches.items()
+        for count, throttle in ((1, False), (50, False), (200, False), (50, True))
+    ]
+    sys.exit(0 if all(results) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Login throughput benchmark: inline bcrypt vs the password process pool
+
+Usage:
+    python benchmarks/password_hash_benchmark.py [--logins 64] [--concurrency 16] [--rounds 12]
+
+Simulates a login storm on one event loop. "inline" runs bcrypt in the
+default threadpool the way the old sync handlers did; "pool" goes through
+PasswordService. Besides logins/s it reports how late a 10 ms heartbeat
+task (a stand-in for chat requests on the same loop) fired. Runs offline,
+no database needed.
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.password_service import PasswordService, PasswordServiceBusy, hash_password, verify_password
+
+HEARTBEAT_SECONDS = 0.01
+
+
+async def heartbeat(lags: list, stop: asyncio.Event):
+    """Record how late the loop wakes a periodic task"""
+    loop = asyncio.get_running_loop()
+    while not stop.is_set():
+        expected = loop.time() + HEARTBEAT_SECONDS
+        await asyncio.sleep(HEARTBEAT_SECONDS)
+        lags.append(max(0.0, loop.time() - expected) * 1000)
+
+
+async def storm(verify, logins: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    rejected = 0
+
+    async def one_login():
+        nonlocal rejected
+        async with semaphore:
+            try:
+                await verify()
+            except PasswordServiceBusy:
+                rejected += 1
+
+    lags: list = []
+    stop = asyncio.Event()
+    beat = asyncio.create_task(heartbeat(lags, stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one_login() for _ in range(logins)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await beat
+    return {
+        "elapsed": elapsed,
+        "rate": (logins - rejected) / elapsed,
+        "rejected": rejected,
+        "lag_p50": statistics.median(lags) if lags else 0.0,
+        "lag_max": max(lags) if lags else 0.0,
+    }
+
+
+async def run(args):
+    password = "correct horse battery staple"
+    stored = hash_password(password, args.rounds)
+
+    async def inline_verify():
+        await asyncio.get_running_loop().run_in_executor(None, verify_password, password, stored)
+
+    service = PasswordService()
+    service.rounds = args.rounds
+    # Warm the worker processes so spawn time is not counted
+    await asyncio.gather(*(service.verify(password, stored) for _ in range(service.max_workers)))
+
+    async def pool_verify():
+        await service.verify(password, stored)
+
+    print(f"🔐 bcrypt cost {args.rounds}, {args.logins} logins, concurrency {args.concurrency}, {service.max_workers} pool workers\n")
+    print(f"{'mode':8} {'seconds':>8} {'logins/s':>9} {'rejected':>9} {'lag p50 ms':>11} {'lag max ms':>11}")
+    for name, verify in (("inline", inline_verify), ("pool", pool_verify)):
+        result = await storm(verify, args.logins, args.concurrency)
+        print(
+            f"{name:8} {result['elapsed']:>8.2f} {result['rate']:>9.1f} {result['rejected']:>9} "
+            f"{result['lag_p50']:>11.1f} {result['lag_max']:>11.1f}"
+        )
+    service.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--rounds", type=int, default=12)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Prompt-token benchmark: whole-document process_file vs search_file retrieval
+
+Usage:
+    python benchmarks/rag_token_benchmark.py path/to/file.pdf "query one" "query two" [--k 5]
+
+Runs offline: extraction, chunking and the hashing-vectorizer index are
+built in memory, no database or MinIO needed.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.context_builder import context_builder
+from services.file_index import chunk_document, embed, search_chunks
+from services.pdf_extraction import iter_pdf_pages
+
+
+def load_document(path: str) -> dict:
+    """Extract pages from a PDF or a plain-text file"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if path.lower().endswith(".pdf"):
+        return {"kind": "pdf", "pages": list(iter_pdf_pages(data))}
+    return {"kind": "txt", "pages": [data.decode("utf-8", errors="replace")]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path")
+    parser.add_argument("queries", nargs="+")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--model", default="gpt-4o")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    document = load_document(args.path)
+    extract_s = time.perf_counter() - started
+
+    started = time.perf_counter()
+    chunks = chunk_document(document)
+    matrix = embed([chunk["text"] for chunk in chunks])
+    index_s = time.perf_counter() - started
+
+    whole_text = "\n".join(document["pages"])
+    whole_tokens = context_builder.count_tokens(whole_text, args.model)
+
+    print(f"📄 {args.path}: {len(document['pages'])} pages, {len(chunks)} chunks")
+    print(f"⏱️  extract {extract_s:.2f}s, index {index_s:.2f}s")
+    print(f"📏 whole-document mode: {whole_tokens} prompt tokens per call\n")
+    print(f"{'query':40} {'tokens':>8} {'saved':>7} {'search ms':>10}")
+
+    for query in args.queries:
+        started = time.perf_counter()
+        results = search_chunks(matrix, chunks, query, args.k)
+        search_ms = (time.perf_counter() - started) * 1000
+        passages = "\n".join(f"[{r['page']}] {r['text']}" for r in results)
+        tokens = context_builder.count_tokens(passages, args.model)
+        saved = 1 - tokens / whole_tokens if whole_tokens else 0
+        print(f"{query[:40]:40} {tokens:>8} {saved:>6.0%} {search_ms:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
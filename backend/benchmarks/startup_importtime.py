@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Startup budget check: how long `import main` takes and what it pulls in
+
+Usage:
+    python benchmarks/startup_importtime.py [--budget-ms 3000] [--top 15] [--runs 3]
+
+Runs `python -X importtime -c "import main"` in fresh interpreters, prints
+the slowest top-level packages of the fastest run and fails (exit 1) when
+the import exceeds the budget or loads a module that must stay lazy (tool
+SDKs, document parsers). Importing main must not need MinIO or Postgres;
+those connect in the lifespan hook.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loaded on first use only; importing any of them at startup is a regression
+LAZY_MODULES = (
+    "litellm",
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "youtube_transcript_api",
+    "newspaper",
+    "PyPDF2",
+    "docx",
+)
+
+
+def import_profile() -> list:
+    """(self_us, cumulative_us, module) rows of one interpreter start"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr[-2000:])
+        raise SystemExit("❌ import main failed")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, module = line[len("import time:"):].split("|")
+        rows.append((int(self_us), int(cumulative_us), module.rstrip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "3000")))
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--runs", type=int, default=3, help="Take the fastest of this many runs")
+    args = parser.parse_args()
+
+    profiles = [import_profile() for _ in range(args.runs)]
+    total_us = lambda rows: next(cumulative for _, cumulative, module in rows if module.strip() == "main")
+    rows = min(profiles, key=total_us)
+    total_ms = total_us(rows) / 1000
+
+    by_package = defaultdict(int)
+    for self_us, _, module in rows:
+        by_package[module.strip().split(".")[0]] += self_us
+    imported = {module.strip() for _, _, module in rows}
+
+    print(f"⏱️  import main: {total_ms:.0f} ms (budget {args.budget_ms:.0f} ms, fastest of {args.runs})\n")
+    print(f"{'package':32} {'ms':>8}")
+    for package, self_us in sorted(by_package.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:32} {self_us / 1000:>8.1f}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f"\n❌ Imported at startup but should load lazily: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"\n❌ Startup import over budget by {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    if not failed:
+        print("\n✅ Within budget")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
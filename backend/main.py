@@ -1,27 +1,32 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status, UploadFile, File
+from fastapi import FastAPI, Request, Response, Depends, HTTPException, status, UploadFile, File
 import re
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from fastapi.responses import StreamingResponse, RedirectResponse
+from fastapi.responses import StreamingResponse, RedirectResponse, JSONResponse
 from pydantic import BaseModel, Field, EmailStr
-from agno.agent import Agent as AgnoAgent
-from agno.models.openai import OpenAIChat
-from agno.models.groq import Groq
 from dotenv import load_dotenv
 import os
 import jwt
-import bcrypt
 from datetime import datetime, timedelta
 import pytz
 from typing import Any, Dict, List, Optional
 import asyncio
+import hashlib
+import hmac
 import json
+import secrets
+import weakref
+from contextlib import asynccontextmanager
+from functools import lru_cache
 from authlib.integrations.httpx_client import AsyncOAuth2Client
 from urllib.parse import urlencode, quote_plus
 
 
-from sqlalchemy.orm import Session
-from database import engine, SessionLocal
+from sqlalchemy import select, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, joinedload
+from database import engine, SessionLocal, AsyncSessionLocal, pool_stats
 from models import (
     Base, 
     User, 
@@ -39,8 +44,14 @@ from models import (
 from typing import List
 from datetime import datetime
 from services.agno_team_service import agno_team_service
-from services.file_service import file_service
+from services.file_service import file_service, FileTooLargeError, content_type_matches
 from services.model_service import model_service
+from services.run_log_store import run_log_store, COUNT_MODES as RUN_LOG_COUNT_MODES
+from services.context_builder import context_builder
+from services.extraction_service import extraction_service
+from services.principal_cache import principal_cache, UserPrincipal
+from services.password_service import password_service, PasswordServiceBusy
+from services.gmail_credentials import gmail_credential_store, GMAIL_SCOPES
 
 
 
@@ -68,7 +79,27 @@ FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:3001")
 # Security
 security = HTTPBearer()
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Connect services and start background jobs once the worker is up"""
+    # Network setup happens here rather than at import so workers boot fast
+    await asyncio.to_thread(file_service.connect)
+    await asyncio.to_thread(agno_team_service.connect)
+    await asyncio.to_thread(ensure_tools_exist)
+    try:
+        await asyncio.to_thread(gmail_credential_store.import_legacy_token)
+    except Exception as e:
+        print(f"⚠️  Could not import the legacy Gmail token: {e}")
+    run_log_store.start_compaction()
+    file_service.start_staging_sweep()
+    model_service.warm()
+    yield
+    await run_log_store.stop_compaction()
+    await file_service.stop_staging_sweep()
+    password_service.shutdown()
+    await model_service.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Database dependency
 def get_db():
@@ -78,21 +109,36 @@ def get_db():
     finally:
         db.close()
 
+# Async database dependency for non-blocking handlers
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
 # Authentication dependency
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security), db: Session = Depends(get_db)):
     try:
         token = credentials.credentials
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
+        # Scoped tickets (e.g. upload tokens) are not session tokens
+        if payload.get("purpose"):
             raise HTTPException(status_code=401, detail="Invalid token")
-    except jwt.PyJWTError:
+        user_id: int = int(payload.get("sub"))
+    except (jwt.PyJWTError, TypeError, ValueError):
         raise HTTPException(status_code=401, detail="Invalid token")
     
-    user = db.query(User).join(UserRole).filter(User.id == user_id).first()
-    if user is None:
-        raise HTTPException(status_code=401, detail="User not found")
-    return user
+    # Cached snapshot of the user; write endpoints load the row themselves
+    principal = principal_cache.get(user_id)
+    if principal is None:
+        generation = principal_cache.generation(user_id)
+        user = db.query(User).join(UserRole).filter(User.id == user_id).first()
+        if user is None:
+            raise HTTPException(status_code=401, detail="User not found")
+        principal = UserPrincipal.from_user(user)
+        principal_cache.put(principal, generation)
+    
+    if not principal.is_active:
+        raise HTTPException(status_code=401, detail="Account is deactivated")
+    return principal
 
 def get_current_admin_user(current_user: User = Depends(get_current_user)):
     if current_user.user_role.name != "admin":
@@ -196,53 +242,112 @@ class PersonaTeamInfo(BaseModel):
 
 # Base.metadata.create_all(bind=engine)
 
+# Upload size limits
+MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", str(100 * 1024 * 1024)))
+# Room for multipart boundaries and part headers on top of the file itself
+UPLOAD_BODY_OVERHEAD = int(os.getenv("UPLOAD_BODY_OVERHEAD", str(64 * 1024)))
+
+
+class UploadSizeLimitMiddleware:
+    """Rejects upload bodies over max_size before the app parses them.
+
+    Starlette spools the whole multipart body to disk before the endpoint
+    runs, so the limit is enforced here: a Content-Length over the limit is
+    refused up front, and bodies without one are counted as they arrive and
+    cut off once they cross it.
+    """
+
+    def __init__(self, app, max_size: int, paths: List[str]):
+        self.app = app
+        self.max_size = max_size
+        self.paths = set(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] not in self.paths:
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        exceeded = False
+        rejected = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Stop feeding the parser; whatever it answers is replaced with a 413
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            nonlocal rejected
+            if not exceeded:
+                await send(message)
+            elif message["type"] == "http.response.start" and not rejected:
+                rejected = True
+                await self._reject(scope, receive, send)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded and not rejected:
+            await self._reject(scope, receive, send)
+
+    async def _reject(self, scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": str(FileTooLargeError(MAX_UPLOAD_SIZE))})
+        await response(scope, receive, send)
+
+
+# Added before CORSMiddleware so CORS wraps it and its 413s carry CORS headers
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_size=MAX_UPLOAD_SIZE + UPLOAD_BODY_OVERHEAD,
+    paths=["/user/upload"]
+)
+
+# Origins allowed to call the API from a browser, comma-separated; credentialed
+# requests (the Gmail connect nonce cookie) need them listed explicitly.
+# Defaults to the user UI, the admin UI and the static admin page.
+CORS_ORIGINS = [
+    origin.strip()
+    for origin in os.getenv(
+        "CORS_ORIGINS",
+        f"{FRONTEND_URL},http://localhost:3000,http://localhost:3001,http://localhost:8001"
+    ).split(",")
+    if origin.strip()
+]
+
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"], 
+    allow_origins=CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
-# Initialize the agent globally
 openai_api_key = os.getenv("OPENAI_API_KEY")
 groq_api_key = os.getenv("GROQ_API_KEY")
 
-# Import tools from registry
-from tools.registry import get_tools, TOOL_REGISTRY
+# Tool modules are imported on first use, not here
+from tools.registry import get_tools, tool_class_name, TOOL_REGISTRY, TOOL_DESCRIPTIONS, stats as tool_pool_stats
 
-# Get all available tools automatically
-available_tools = get_tools(list(TOOL_REGISTRY.keys()))
-print(f"🔧 Loaded {len(available_tools)} tools: {[tool.name for tool in available_tools]}")
-
-# Auto-create tools in database on startup
+# Sync the tools table with the registry; runs from the lifespan hook
 def ensure_tools_exist():
     """Sync database tools with tools folder - tools folder is source of truth"""
     db = SessionLocal()
     try:
-        # Get tools from registry (source of truth)
-        from tools.registry import TOOL_REGISTRY
-        
-        # Map tool names to their classes for descriptions
-        tool_descriptions = {
-            "youtube": {
-                "description": "YouTube video transcript extraction tool",
-                "tool_class": "YouTube_Tool"
-            },
-            "web_search": {
-                "description": "Web search tool for finding information",
-                "tool_class": "WebSearchTool"
-            },
-            "file_processing": {
-                "description": "File processing tool for PDF, DOCX, and other document types",
-                "tool_class": "FileProcessingTool"
-            },
-            "gmail": {
-                "description": "Gmail integration tool for email management",
-                "tool_class": "GmailTool"
-            }
-        }
-        
         # Get all tools currently in registry (source of truth)
         registry_tool_names = set(TOOL_REGISTRY.keys())
         
@@ -256,14 +361,10 @@ def ensure_tools_exist():
         # Create missing tools
         for tool_name in registry_tool_names:
             if tool_name not in db_tool_names:
-                tool_info = tool_descriptions.get(tool_name, {
-                    "description": f"{tool_name} tool",
-                    "tool_class": TOOL_REGISTRY[tool_name]().__class__.__name__
-                })
                 tool = Tool(
                     name=tool_name,
-                    description=tool_info["description"],
-                    tool_class=tool_info["tool_class"],
+                    description=TOOL_DESCRIPTIONS.get(tool_name, f"{tool_name} tool"),
+                    tool_class=tool_class_name(tool_name),
                     config={"enabled": True},
                     is_active=True
                 )
@@ -296,39 +397,40 @@ def ensure_tools_exist():
     finally:
         db.close()
 
-# Run on startup
-ensure_tools_exist()
-
-agent = AgnoAgent(
-    name="Basic Agent",
-    model=OpenAIChat(id="gpt-4o", api_key=openai_api_key),
-    # model=Groq(id="llama-3.3-70b-versatile",api_key=groq_api_key),
-    tools=available_tools,
-    instructions=[
-        "You are a helpful AI assistant with access to various tools. Automatically detect and use the appropriate tools based on the user's input:",
-        "- If the user mentions YouTube, provides a YouTube URL, or asks about video content, automatically use the YouTube tools to:",
-        "  * Extract video transcripts using get_transcript_from_video ONLY",
-        "  * Return the raw transcript text as provided by the tool - do not summarize or modify it",
-        "  * Handle any YouTube-related queries",
-        "- For general questions, conversations, or non-YouTube requests, respond conversationally without using tools",
-        "- Always be helpful, clear, and informative in your responses",
-        "- When using tools, explain what you're doing and provide the results in a user-friendly format",
-        f"- Available tools: {', '.join(TOOL_REGISTRY.keys())}"
-    ],
-    # show_tool_calls=True,
-    debug_mode=True,
-    markdown=True,
-)
+@lru_cache(maxsize=1)
+def get_basic_agent():
+    """The /run-agent agent with every registered tool, built on first use"""
+    from agno.agent import Agent as AgnoAgent
+    from agno.models.openai import OpenAIChat
+    
+    available_tools = get_tools(list(TOOL_REGISTRY.keys()))
+    print(f"🔧 Loaded {len(available_tools)} tools: {[tool.name for tool in available_tools]}")
+    return AgnoAgent(
+        name="Basic Agent",
+        model=OpenAIChat(id="gpt-4o", api_key=openai_api_key),
+        # model=Groq(id="llama-3.3-70b-versatile",api_key=groq_api_key),
+        tools=available_tools,
+        instructions=[
+            "You are a helpful AI assistant with access to various tools. Automatically detect and use the appropriate tools based on the user's input:",
+            "- If the user mentions YouTube, provides a YouTube URL, or asks about video content, automatically use the YouTube tools to:",
+            "  * Extract video transcripts using get_transcript_from_video ONLY",
+            "  * Return the raw transcript text as provided by the tool - do not summarize or modify it",
+            "  * Handle any YouTube-related queries",
+            "- For general questions, conversations, or non-YouTube requests, respond conversationally without using tools",
+            "- Always be helpful, clear, and informative in your responses",
+            "- When using tools, explain what you're doing and provide the results in a user-friendly format",
+            f"- Available tools: {', '.join(TOOL_REGISTRY.keys())}"
+        ],
+        # show_tool_calls=True,
+        debug_mode=True,
+        markdown=True,
+    )
 
 # Authentication helper functions
-def hash_password(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
-
-def verify_password(password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+@app.exception_handler(PasswordServiceBusy)
+async def password_service_busy_handler(request: Request, exc: PasswordServiceBusy):
+    """Shed load instead of queueing more bcrypt work"""
+    return JSONResponse(status_code=429, content={"detail": str(exc)}, headers={"Retry-After": "1"})
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     """Create JWT access token"""
@@ -349,7 +451,8 @@ class Prompt(BaseModel):
 async def run_agent(prompt: Prompt):
     try:
         print(f"\n🚀 Running agent with message: {prompt.message}")
-        print(f"📋 Available tools: {[tool.name for tool in available_tools]}")
+        agent = get_basic_agent()
+        print(f"📋 Available tools: {[tool.name for tool in agent.tools or []]}")
         
         import asyncio
         import concurrent.futures
@@ -457,6 +560,12 @@ def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
     
     # Delete logs first (they reference messages via foreign key)
     from models import AgentRunLog
+    cold_objects = [
+        row.trace_object_name for row in db.query(AgentRunLog.trace_object_name).filter(
+            AgentRunLog.conversation_id == conversation_id,
+            AgentRunLog.trace_object_name.isnot(None)
+        )
+    ]
     db.query(AgentRunLog).filter_by(conversation_id=conversation_id).delete()
     
     # Delete all messages in the conversation
@@ -465,6 +574,7 @@ def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
     # Delete the conversation
     db.delete(conversation)
     db.commit()
+    run_log_store.delete_cold_objects(cold_objects)
     
     return {"message": "Conversation deleted successfully"}
     
@@ -474,38 +584,52 @@ def delete_conversation(conversation_id: int, db: Session = Depends(get_db)):
 
 # Authentication Endpoints
 @app.post("/auth/register", response_model=UserResponse)
-def register_user(user: UserCreate, db: Session = Depends(get_db)):
+async def register_user(user: UserCreate, db: AsyncSession = Depends(get_async_db)):
     """Register a new user"""
     # Check if user already exists
-    existing_user = db.query(User).filter(
-        (User.email == user.email) | (User.username == user.username)
-    ).first()
-    if existing_user:
+    existing_user = await db.execute(
+        select(User.id).where((User.email == user.email) | (User.username == user.username))
+    )
+    if existing_user.first():
         raise HTTPException(
             status_code=400, 
             detail="Email or username already registered"
         )
     
+    # Self-registered accounts always get the regular user role
+    role = (await db.execute(select(UserRole).where(UserRole.name == "user"))).scalar_one_or_none()
+    if not role:
+        raise HTTPException(status_code=500, detail="Default user role is not configured")
+    
     # Create new user
-    hashed_password = hash_password(user.password)
+    hashed_password = await password_service.hash(user.password)
     db_user = User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password,
-        role="user",
+        role_id=role.id,
         is_active=True
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
-    return db_user
+    return {
+        "id": db_user.id,
+        "email": db_user.email,
+        "username": db_user.username,
+        "role_id": db_user.role_id,
+        "role_name": role.name,
+        "is_active": db_user.is_active,
+        "created_at": db_user.created_at
+    }
 
 @app.post("/auth/login", response_model=Token)
-def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
+async def login_user(user_credentials: UserLogin, db: AsyncSession = Depends(get_async_db)):
     """Login user and return access token"""
-    user = db.query(User).filter(User.username == user_credentials.username).first()
+    result = await db.execute(select(User).where(User.username == user_credentials.username))
+    user = result.scalar_one_or_none()
     
     # Check if user exists
     if not user:
@@ -522,7 +646,7 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
         )
     
     # Verify password for local users
-    if not user.hashed_password or not verify_password(user_credentials.password, user.hashed_password):
+    if not user.hashed_password or not await password_service.verify(user_credentials.password, user.hashed_password):
         raise HTTPException(
             status_code=401,
             detail="Incorrect username or password"
@@ -534,6 +658,14 @@ def login_user(user_credentials: UserLogin, db: Session = Depends(get_db)):
             detail="Account is deactivated"
         )
     
+    # Upgrade hashes made at an older cost factor while the plaintext is at hand
+    if password_service.needs_rehash(user.hashed_password):
+        try:
+            user.hashed_password = await password_service.hash(user_credentials.password)
+            await db.commit()
+        except PasswordServiceBusy:
+            pass
+    
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = create_access_token(
         data={"sub": str(user.id)}, expires_delta=access_token_expires
@@ -701,6 +833,133 @@ async def google_callback(
             detail=f"OAuth authentication failed: {str(e)}"
         )
 
+# Gmail Connection Endpoints
+# Each user connects their own mailbox for the Gmail tool; tokens are stored
+# encrypted per user by gmail_credential_store
+GMAIL_REDIRECT_URI = os.getenv("GMAIL_REDIRECT_URI", f"{BACKEND_URL}/user/gmail/callback")
+GMAIL_CONNECT_EXPIRE_MINUTES = 10
+# HttpOnly cookie holding the nonce that the state parameter is bound to
+GMAIL_STATE_COOKIE = "gmail_oauth_nonce"
+GMAIL_STATE_COOKIE_SECURE = GMAIL_REDIRECT_URI.startswith("https://")
+
+def gmail_redirect(**params) -> RedirectResponse:
+    """Redirect back to the frontend with escaped query params, clearing the state cookie"""
+    response = RedirectResponse(url=f"{FRONTEND_URL}/?{urlencode(params)}")
+    response.delete_cookie(GMAIL_STATE_COOKIE, path="/user/gmail/callback")
+    return response
+
+@app.get("/user/gmail")
+async def get_gmail_connection(current_user: User = Depends(get_current_user)):
+    """Whether the current user has connected Gmail, and which account"""
+    connection = await asyncio.to_thread(gmail_credential_store.status, current_user.id)
+    return {"connected": connection is not None, **(connection or {})}
+
+@app.get("/user/gmail/connect")
+async def connect_gmail(response: Response, current_user: User = Depends(get_current_user)):
+    """Start the Google consent flow for the Gmail tool.
+
+    Sets an HttpOnly nonce cookie that the callback checks against the
+    state, so only the browser that started the flow can complete it; the
+    frontend must call this with credentials included.
+    """
+    if not gmail_credential_store.configured:
+        raise HTTPException(
+            status_code=500,
+            detail="Gmail is not configured. Please set GMAIL_CLIENT_ID and GMAIL_CLIENT_SECRET."
+        )
+    
+    # The callback is a browser redirect without our bearer token, so the
+    # state parameter carries a short-lived signed ticket naming the user,
+    # bound to a nonce only this browser holds
+    nonce = secrets.token_urlsafe(32)
+    state = create_access_token(
+        {
+            "sub": str(current_user.id),
+            "purpose": "gmail_connect",
+            "nonce": hashlib.sha256(nonce.encode()).hexdigest()
+        },
+        expires_delta=timedelta(minutes=GMAIL_CONNECT_EXPIRE_MINUTES)
+    )
+    response.set_cookie(
+        GMAIL_STATE_COOKIE,
+        nonce,
+        max_age=GMAIL_CONNECT_EXPIRE_MINUTES * 60,
+        path="/user/gmail/callback",
+        httponly=True,
+        secure=GMAIL_STATE_COOKIE_SECURE,
+        # Set from a cross-origin fetch, so it must be SameSite=None where that is allowed (https)
+        samesite="none" if GMAIL_STATE_COOKIE_SECURE else "lax"
+    )
+    params = urlencode({
+        "client_id": gmail_credential_store.client_id,
+        "redirect_uri": GMAIL_REDIRECT_URI,
+        "response_type": "code",
+        "scope": " ".join(GMAIL_SCOPES),
+        "access_type": "offline",
+        "prompt": "consent",
+        "state": state,
+    })
+    return {"auth_url": f"https://accounts.google.com/o/oauth2/v2/auth?{params}"}
+
+@app.get("/user/gmail/callback")
+async def gmail_callback(
+    request: Request,
+    code: Optional[str] = None,
+    state: Optional[str] = None,
+    error: Optional[str] = None
+):
+    """Handle the Google consent redirect and store the user's Gmail token"""
+    if error or not code or not state:
+        return gmail_redirect(gmail="error", error=error or "missing_code")
+    
+    try:
+        ticket = jwt.decode(state, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        return gmail_redirect(gmail="error", error="invalid_state")
+    if ticket.get("purpose") != "gmail_connect":
+        return gmail_redirect(gmail="error", error="invalid_state")
+    
+    # Reject states started in another browser (e.g. a link crafted by someone else)
+    nonce = request.cookies.get(GMAIL_STATE_COOKIE)
+    if not nonce or not hmac.compare_digest(
+        hashlib.sha256(nonce.encode()).hexdigest(), str(ticket.get("nonce", ""))
+    ):
+        return gmail_redirect(gmail="error", error="invalid_state")
+    user_id = int(ticket["sub"])
+    
+    try:
+        async with AsyncOAuth2Client(
+            client_id=gmail_credential_store.client_id,
+            client_secret=gmail_credential_store.client_secret,
+        ) as client:
+            token = await client.fetch_token(
+                "https://oauth2.googleapis.com/token",
+                code=code,
+                redirect_uri=GMAIL_REDIRECT_URI,
+            )
+            profile_response = await client.get(
+                "https://gmail.googleapis.com/gmail/v1/users/me/profile",
+                headers={"Authorization": f"Bearer {token.get('access_token')}"}
+            )
+            email = profile_response.json().get("emailAddress")
+        
+        await asyncio.to_thread(gmail_credential_store.save, user_id, dict(token), email)
+        agno_team_service.evict_user(user_id)
+    except Exception as e:
+        print(f"❌ Gmail connect failed for user {user_id}: {e}")
+        return gmail_redirect(gmail="error", error="token_exchange_failed")
+    
+    return gmail_redirect(gmail="connected")
+
+@app.delete("/user/gmail")
+async def disconnect_gmail(current_user: User = Depends(get_current_user)):
+    """Remove the current user's stored Gmail token"""
+    deleted = await asyncio.to_thread(gmail_credential_store.delete, current_user.id)
+    agno_team_service.evict_user(current_user.id)
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Gmail is not connected")
+    return {"message": "Gmail disconnected"}
+
 @app.get("/auth/me", response_model=UserResponse)
 def get_current_user_info(current_user: User = Depends(get_current_user)):
     """Get current user information"""
@@ -722,6 +981,8 @@ def update_user_profile(
     db: Session = Depends(get_db)
 ):
     """Update user profile"""
+    user = db.query(User).filter(User.id == current_user.id).first()
+    
     # Check if email is already taken by another user
     if user_update.email and user_update.email != current_user.email:
         existing_user = db.query(User).filter(User.email == user_update.email).first()
@@ -736,39 +997,42 @@ def update_user_profile(
     
     # Update user fields
     if user_update.username:
-        current_user.username = user_update.username
+        user.username = user_update.username
     if user_update.email:
-        current_user.email = user_update.email
+        user.email = user_update.email
     
-    current_user.updated_at = datetime.utcnow()
+    user.updated_at = datetime.utcnow()
     db.commit()
-    db.refresh(current_user)
+    principal_cache.invalidate(user.id)
+    db.refresh(user)
     
     return {
-        "id": current_user.id,
-        "email": current_user.email,
-        "username": current_user.username,
-        "role_id": current_user.role_id,
-        "role_name": current_user.user_role.name,
-        "is_active": current_user.is_active,
-        "created_at": current_user.created_at
+        "id": user.id,
+        "email": user.email,
+        "username": user.username,
+        "role_id": user.role_id,
+        "role_name": user.user_role.name,
+        "is_active": user.is_active,
+        "created_at": user.created_at
     }
 
 @app.post("/users/change-password")
-def change_password(
+async def change_password(
     password_change: PasswordChange,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Change user password"""
+    user = await db.get(User, current_user.id)
+    
     # Verify current password
-    if not verify_password(password_change.current_password, current_user.hashed_password):
+    if not user.hashed_password or not await password_service.verify(password_change.current_password, user.hashed_password):
         raise HTTPException(status_code=400, detail="Current password is incorrect")
     
     # Update password
-    current_user.hashed_password = hash_password(password_change.new_password)
-    current_user.updated_at = datetime.utcnow()
-    db.commit()
+    user.hashed_password = await password_service.hash(password_change.new_password)
+    user.updated_at = datetime.utcnow()
+    await db.commit()
     
     return {"message": "Password changed successfully"}
 
@@ -781,21 +1045,33 @@ def get_all_users(
     db: Session = Depends(get_db)
 ):
     """Get all users (Admin only)"""
-    users = db.query(User).join(UserRole).offset(skip).limit(limit).all()
-    total = db.query(User).count()
-    
-    # Convert to response format with role information
-    user_responses = []
-    for user in users:
-        user_responses.append({
-            "id": user.id,
-            "email": user.email,
-            "username": user.username,
-            "role_id": user.role_id,
-            "role_name": user.user_role.name,
-            "is_active": user.is_active,
-            "created_at": user.created_at
-        })
+    # One statement: role name joined in, total as a window over the whole result
+    rows = db.query(
+        User.id,
+        User.email,
+        User.username,
+        User.role_id,
+        UserRole.name.label("role_name"),
+        User.is_active,
+        User.created_at,
+        func.count().over().label("total")
+    ).join(UserRole, User.role_id == UserRole.id).order_by(User.id).offset(skip).limit(limit).all()
+    
+    # A page past the end has no row to carry the total
+    total = rows[0].total if rows else db.query(func.count(User.id)).scalar()
+    
+    user_responses = [
+        {
+            "id": row.id,
+            "email": row.email,
+            "username": row.username,
+            "role_id": row.role_id,
+            "role_name": row.role_name,
+            "is_active": row.is_active,
+            "created_at": row.created_at
+        }
+        for row in rows
+    ]
     
     return UserListResponse(users=user_responses, total=total)
 
@@ -843,6 +1119,7 @@ def update_user_role(
     user.role_id = role.id
     user.updated_at = datetime.utcnow()
     db.commit()
+    principal_cache.invalidate(user.id)
     
     return {"message": f"User role updated to {new_role}"}
 
@@ -864,6 +1141,9 @@ def deactivate_user(
     user.is_active = False
     user.updated_at = datetime.utcnow()
     db.commit()
+    principal_cache.invalidate(user.id)
+    agno_team_service.evict_user(user.id)
+    gmail_credential_store.invalidate(user.id)
     
     return {"message": "User deactivated successfully"}
 
@@ -881,6 +1161,7 @@ def activate_user(
     user.is_active = True
     user.updated_at = datetime.utcnow()
     db.commit()
+    principal_cache.invalidate(user.id)
     
     return {"message": "User activated successfully"}
 
@@ -961,21 +1242,25 @@ def get_user_personas(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    assignments = db.query(UserPersona).filter(
+    rows = db.query(
+        Persona.id,
+        Persona.name,
+        Persona.description,
+        UserPersona.assigned_at
+    ).join(UserPersona, UserPersona.persona_id == Persona.id).filter(
         UserPersona.user_id == user_id,
         UserPersona.is_active == True
-    ).all()
+    ).order_by(UserPersona.id).all()
     
-    personas = []
-    for assignment in assignments:
-        persona = db.query(Persona).filter(Persona.id == assignment.persona_id).first()
-        if persona:
-            personas.append({
-                "id": persona.id,
-                "name": persona.name,
-                "description": persona.description,
-                "assigned_at": assignment.assigned_at
-            })
+    personas = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "assigned_at": row.assigned_at
+        }
+        for row in rows
+    ]
     
     return {"user_id": user_id, "personas": personas}
 
@@ -990,29 +1275,29 @@ def get_user_roles(
     return roles
 
 @app.post("/admin/users", response_model=UserResponse)
-def create_user_by_admin(
+async def create_user_by_admin(
     user_data: UserCreate,
     admin_user: User = Depends(get_current_admin_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Create a new user (Admin only)"""
     # Check if user already exists
-    existing_user = db.query(User).filter(
-        (User.email == user_data.email) | (User.username == user_data.username)
-    ).first()
-    if existing_user:
+    existing_user = await db.execute(
+        select(User.id).where((User.email == user_data.email) | (User.username == user_data.username))
+    )
+    if existing_user.first():
         raise HTTPException(
             status_code=400, 
             detail="Email or username already registered"
         )
     
     # Verify role exists
-    role = db.query(UserRole).filter(UserRole.id == user_data.role_id).first()
+    role = await db.get(UserRole, user_data.role_id)
     if not role:
         raise HTTPException(status_code=400, detail="Invalid role ID")
     
     # Create new user
-    hashed_password = hash_password(user_data.password)
+    hashed_password = await password_service.hash(user_data.password)
     db_user = User(
         email=user_data.email,
         username=user_data.username,
@@ -1022,8 +1307,8 @@ def create_user_by_admin(
     )
     
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
     
     # Return user with role information
     return {
@@ -1046,23 +1331,30 @@ def get_user_personas(
     db: Session = Depends(get_db)
 ):
     """Get personas assigned to current user"""
-    assignments = db.query(UserPersona).filter(
+    rows = db.query(
+        Persona.id,
+        Persona.name,
+        Persona.description,
+        Persona.instructions,
+        Persona.model_provider,
+        Persona.model_id
+    ).join(UserPersona, UserPersona.persona_id == Persona.id).filter(
         UserPersona.user_id == current_user.id,
-        UserPersona.is_active == True
-    ).all()
+        UserPersona.is_active == True,
+        Persona.is_active == True
+    ).order_by(UserPersona.id).all()
     
-    personas = []
-    for assignment in assignments:
-        persona = db.query(Persona).filter(Persona.id == assignment.persona_id).first()
-        if persona and persona.is_active:
-            personas.append({
-                "id": persona.id,
-                "name": persona.name,
-                "description": persona.description,
-                "instructions": persona.instructions,
-                "model_provider": persona.model_provider,
-                "model_id": persona.model_id
-            })
+    personas = [
+        {
+            "id": row.id,
+            "name": row.name,
+            "description": row.description,
+            "instructions": row.instructions,
+            "model_provider": row.model_provider,
+            "model_id": row.model_id
+        }
+        for row in rows
+    ]
     
     return {"personas": personas}
 
@@ -1128,55 +1420,149 @@ def get_user_conversation(
     
     return conversation
 
+MESSAGE_PAGE_DEFAULT = 50
+MESSAGE_PAGE_MAX = 200
+
+def serialize_message(message: Message) -> Dict[str, Any]:
+    """Compact message payload; optional columns are left out when unset"""
+    data = {
+        "id": message.id,
+        "role": message.role,
+        "content": message.content,
+        "timestamp": message.timestamp.isoformat() if message.timestamp else None
+    }
+    if message.sender_type and message.sender_type != "user":
+        data["sender_type"] = message.sender_type
+    if message.agent_name:
+        data["agent_name"] = message.agent_name
+    return data
+
 @app.get("/user/conversations/{conversation_id}/messages")
-def get_conversation_messages(
+async def get_conversation_messages(
     conversation_id: int,
+    limit: int = MESSAGE_PAGE_DEFAULT,
+    before_id: Optional[int] = None,
+    after_id: Optional[int] = None,
+    since: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get messages for a conversation"""
-    # Verify conversation belongs to user
-    conversation = db.query(Conversation).filter(
-        Conversation.id == conversation_id,
-        Conversation.user_id == current_user.id
-    ).first()
+    """Get a page of messages for a conversation, oldest first.
+
+    Without cursors this is the newest page; before_id pages backwards,
+    after_id and since fetch what was added after the client's last sync.
+    """
+    if before_id is not None and (after_id is not None or since is not None):
+        raise HTTPException(status_code=400, detail="before_id cannot be combined with after_id or since")
+    limit = max(1, min(limit, MESSAGE_PAGE_MAX))
     
+    # Verify conversation belongs to user
+    conversation = await get_user_conversation_async(db, conversation_id, current_user.id)
     if not conversation:
         raise HTTPException(status_code=404, detail="Conversation not found")
     
-    messages = db.query(Message).filter(
-        Message.conversation_id == conversation_id
-    ).order_by(Message.timestamp.asc()).all()
+    query = select(Message).where(Message.conversation_id == conversation_id)
+    if after_id is not None or since is not None:
+        # Forward sync: oldest first from the cursor
+        if after_id is not None:
+            query = query.where(Message.id > after_id)
+        if since is not None:
+            query = query.where(Message.timestamp > since)
+        query = query.order_by(Message.id.asc())
+    else:
+        # Backward paging: newest first from the cursor, flipped below
+        if before_id is not None:
+            query = query.where(Message.id < before_id)
+        query = query.order_by(Message.id.desc())
+    
+    # One extra row tells whether another page exists
+    rows = list((await db.execute(query.limit(limit + 1))).scalars().all())
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if after_id is None and since is None:
+        rows.reverse()
+    
+    return {
+        "messages": [serialize_message(message) for message in rows],
+        "has_more": has_more
+    }
+
+# Conversation locks to ensure sequential processing. Entries vanish once no
+# request holds or waits on them, so the map stays bounded.
+conversation_locks: "weakref.WeakValueDictionary[int, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+def get_conversation_lock(conversation_id: int) -> asyncio.Lock:
+    """Get or create an asyncio lock for a specific conversation"""
+    lock = conversation_locks.get(conversation_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        conversation_locks[conversation_id] = lock
+    return lock
+
+async def save_run_log(
+    conversation_id: int,
+    persona_id: int,
+    message_id: int,
+    raw_log: Optional[str],
+    trace: Optional[Dict[str, Any]] = None
+):
+    """Persist the compressed run trace and Agno log for an assistant message (best effort).
     
-    return messages
+    Uses its own session: a failed write rolls back only the log, never the
+    caller's session, whose messages are still serialized afterwards.
+    """
+    if not raw_log and not trace:
+        return
+    try:
+        async with AsyncSessionLocal() as log_db:
+            run_log = run_log_store.build_record(conversation_id, persona_id, message_id, trace, raw_log)
+            log_db.add(run_log)
+            await log_db.commit()
+    except Exception as e:
+        print(f"⚠️ Could not save run log for message {message_id}: {e}")
 
-# Conversation locks to ensure sequential processing
-conversation_locks = {}
-import threading
+async def get_user_conversation_async(db: AsyncSession, conversation_id: int, user_id: int) -> Optional[Conversation]:
+    """Get a conversation if it belongs to the user"""
+    result = await db.execute(
+        select(Conversation).where(
+            Conversation.id == conversation_id,
+            Conversation.user_id == user_id
+        )
+    )
+    return result.scalar_one_or_none()
+
+# Background summary refreshes; referenced here so they are not garbage collected
+summary_refresh_tasks: "set[asyncio.Task]" = set()
 
-def get_conversation_lock(conversation_id: int):
-    """Get or create a lock for a specific conversation"""
-    if conversation_id not in conversation_locks:
-        conversation_locks[conversation_id] = threading.Lock()
-    return conversation_locks[conversation_id]
+async def refresh_conversation_summary(conversation_id: int):
+    """Fold old turns into the conversation summary once the current turn is done"""
+    try:
+        # The lock is taken around reads and writes only, not the summary model call
+        async with AsyncSessionLocal() as summary_db:
+            await context_builder.refresh_summary(summary_db, conversation_id, lock=get_conversation_lock(conversation_id))
+    except Exception as e:
+        print(f"⚠️ Summary refresh failed for conversation {conversation_id}: {e}")
+
+def schedule_summary_refresh(conversation_id: int):
+    """Run the summary refresh off the request path"""
+    task = asyncio.create_task(refresh_conversation_summary(conversation_id))
+    summary_refresh_tasks.add(task)
+    task.add_done_callback(summary_refresh_tasks.discard)
 
 @app.post("/user/conversations/{conversation_id}/messages")
-def send_message(
+async def send_message(
     conversation_id: int,
     message_data: dict,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a message in a conversation"""
     # Get conversation lock to ensure sequential processing
     conversation_lock = get_conversation_lock(conversation_id)
     
-    with conversation_lock:
+    async with conversation_lock:
         # Verify conversation belongs to user
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id,
-            Conversation.user_id == current_user.id
-        ).first()
+        conversation = await get_user_conversation_async(db, conversation_id, current_user.id)
         
         if not conversation:
             raise HTTPException(status_code=404, detail="Conversation not found")
@@ -1197,34 +1583,28 @@ def send_message(
         )
         
         db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
+        await db.commit()
+        await db.refresh(user_message)
         
         # Process message with persona's team leader agent
         try:
-            # Get conversation history for context
-            recent_messages = db.query(Message).filter(
-                Message.conversation_id == conversation_id
-            ).order_by(Message.timestamp.desc()).limit(10).all()
-            
-            # Convert to format expected by AgnoTeamService
-            conversation_history = []
-            for msg in reversed(recent_messages):  # Reverse to get chronological order
-                conversation_history.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
+            # Recent turns within the token budget plus the rolling summary of older ones
+            conversation_history, conversation_summary = await context_builder.build(
+                db, conversation, exclude_message_id=user_message.id
+            )
             
             # Process message with persona's team leader
             # Use user email as user_id for agentic memory
             user_id = current_user.email if current_user else None
-            ai_result = agno_team_service.process_message_with_persona(
+            ai_result = await agno_team_service.aprocess_message_with_persona(
                 db=db,
                 persona_id=conversation.persona_id,
                 message=content,
-                conversation_history=conversation_history[:-1],  # Exclude the current message
+                conversation_history=conversation_history,
                 file_ids=file_ids,
-                user_id=user_id
+                user_id=user_id,
+                conversation_summary=conversation_summary,
+                account_id=current_user.id
             )
             ai_response = ai_result["content"] if isinstance(ai_result, dict) else ai_result
             # Create AI response message
@@ -1238,25 +1618,16 @@ def send_message(
             )
             # First persist AI message to get a real ID
             db.add(ai_message)
-            db.commit()
-            db.refresh(ai_message)
+            await db.commit()
+            await db.refresh(ai_message)
 
             # Persist raw Agno log if available (now with message_id present)
-            try:
-                from models import AgentRunLog
-                if isinstance(ai_result, dict) and ai_result.get("raw_log"):
-                    ansi_cleaner = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
-                    clean_log = ansi_cleaner.sub("", ai_result["raw_log"])
-                    run_log = AgentRunLog(
-                        conversation_id=conversation_id,
-                        persona_id=conversation.persona_id,
-                        message_id=ai_message.id,
-                        raw_log=clean_log,
-                    )
-                    db.add(run_log)
-                    db.commit()
-            except Exception as _:
-                pass
+            if isinstance(ai_result, dict):
+                await save_run_log(
+                    conversation_id, conversation.persona_id, ai_message.id,
+                    ai_result.get("raw_log"), ai_result.get("trace")
+                )
+            schedule_summary_refresh(conversation_id)
             
             return {
                 "user_message": user_message,
@@ -1264,6 +1635,7 @@ def send_message(
             }
         
         except Exception as e:
+            await db.rollback()
             # If agent processing fails, return user message with error
             error_message = Message(
                 conversation_id=conversation_id,
@@ -1274,8 +1646,9 @@ def send_message(
             )
             
             db.add(error_message)
-            db.commit()
-            db.refresh(error_message)
+            await db.commit()
+            await db.refresh(error_message)
+            await db.refresh(user_message)  # Expired by the rollback above
             
             return {
                 "user_message": user_message,
@@ -1288,144 +1661,116 @@ async def send_message_stream(
     conversation_id: int,
     message_data: dict,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Send a message in a conversation with streaming response"""
-    # Get conversation lock to ensure sequential processing
-    conversation_lock = get_conversation_lock(conversation_id)
+    # Verify conversation belongs to user
+    conversation = await get_user_conversation_async(db, conversation_id, current_user.id)
     
-    with conversation_lock:
-        # Verify conversation belongs to user
-        conversation = db.query(Conversation).filter(
-            Conversation.id == conversation_id,
-            Conversation.user_id == current_user.id
-        ).first()
-        
-        if not conversation:
-            raise HTTPException(status_code=404, detail="Conversation not found")
-        
-        content = message_data.get("content")
-        file_ids = message_data.get("file_ids", [])
-        
-        if not content:
-            raise HTTPException(status_code=400, detail="content is required")
-        
-        # Create user message
-        user_message = Message(
-            conversation_id=conversation_id,
-            role="user",
-            content=content,
-            sender_type="user",
-            timestamp=datetime.utcnow()
-        )
-        
-        db.add(user_message)
-        db.commit()
-        db.refresh(user_message)
-        
-        # Process AI response inside the lock
-        try:
-            # Get conversation history for context
-            recent_messages = db.query(Message).filter(
-                Message.conversation_id == conversation_id
-            ).order_by(Message.timestamp.desc()).limit(10).all()
-            
-            # Convert to format expected by AgnoTeamService
-            conversation_history = []
-            for msg in reversed(recent_messages):
-                conversation_history.append({
-                    "role": msg.role,
-                    "content": msg.content
-                })
-            
-            # Process message with persona's team leader
-            # Use user email as user_id for agentic memory
-            user_id = current_user.email if current_user else None
-            ai_result = agno_team_service.process_message_with_persona(
-                db=db,
-                persona_id=conversation.persona_id,
-                message=content,
-                conversation_history=conversation_history[:-1],
-                file_ids=file_ids,
-                user_id=user_id
-            )
-            ai_response = ai_result["content"] if isinstance(ai_result, dict) else ai_result
-
-            # Create AI message
-            ai_message = Message(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=ai_response,
-                sender_type="persona",
-                agent_name="Team Leader",
-                timestamp=datetime.utcnow()
-            )
-            # First persist AI message to get a real ID
-            db.add(ai_message)
-            db.commit()
-            db.refresh(ai_message)
-
-            # Persist raw Agno log if available (now with message_id present)
-            try:
-                from models import AgentRunLog
-                if isinstance(ai_result, dict) and ai_result.get("raw_log"):
-                    ansi_cleaner = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
-                    clean_log = ansi_cleaner.sub("", ai_result["raw_log"])
-                    run_log = AgentRunLog(
-                        conversation_id=conversation_id,
-                        persona_id=conversation.persona_id,
-                        message_id=ai_message.id,
-                        raw_log=clean_log,
-                    )
-                    db.add(run_log)
-                    db.commit()
-            except Exception:
-                pass
-            
-            db.add(ai_message)
-            db.commit()
-            db.refresh(ai_message)
-            
-        except Exception as e:
-            # Create error message
-            ai_message = Message(
-                conversation_id=conversation_id,
-                role="assistant",
-                content=f"Sorry, I encountered an error: {str(e)}",
-                sender_type="system",
-                timestamp=datetime.utcnow()
-            )
-            
-            db.add(ai_message)
-            db.commit()
-            db.refresh(ai_message)
-            ai_response = ai_message.content
+    if not conversation:
+        raise HTTPException(status_code=404, detail="Conversation not found")
+    
+    content = message_data.get("content")
+    file_ids = message_data.get("file_ids", [])
+    
+    if not content:
+        raise HTTPException(status_code=400, detail="content is required")
+    
+    persona_id = conversation.persona_id
+    # Use user email as user_id for agentic memory
+    user_id = current_user.email if current_user else None
+    account_id = current_user.id
+    
+    def sse(payload: dict) -> str:
+        return f"data: {json.dumps(payload)}\n\n"
     
     async def generate_stream():
+        # The lock keeps turns sequential for the whole lifetime of the stream
+        conversation_lock = get_conversation_lock(conversation_id)
         try:
-            # Send user message first
-            yield f"data: {json.dumps({'type': 'user_message', 'data': {'id': user_message.id, 'content': user_message.content, 'role': user_message.role}})}\n\n"
-            
-            # Simulate streaming by breaking response into character chunks
-            chunk_size = 1  # One character per chunk for letter-by-letter streaming
-            full_response = ""
-            
-            for i in range(0, len(ai_response), chunk_size):
-                chunk = ai_response[i:i + chunk_size]
-                full_response += chunk
+            async with conversation_lock, AsyncSessionLocal() as stream_db:
+                # Create user message
+                user_message = Message(
+                    conversation_id=conversation_id,
+                    role="user",
+                    content=content,
+                    sender_type="user",
+                    timestamp=datetime.utcnow()
+                )
                 
-                # Send chunk
-                yield f"data: {json.dumps({'type': 'chunk', 'data': chunk})}\n\n"
+                stream_db.add(user_message)
+                await stream_db.commit()
+                await stream_db.refresh(user_message)
                 
-                # Small delay to simulate streaming
-                await asyncio.sleep(0.01)  # Much faster for letter-by-letter
-            
-            # Send completion signal
-            yield f"data: {json.dumps({'type': 'complete', 'data': {'id': ai_message.id, 'content': ai_response, 'role': ai_message.role}})}\n\n"
-            
+                # Send user message first
+                yield sse({'type': 'user_message', 'data': {'id': user_message.id, 'content': user_message.content, 'role': user_message.role}})
+                
+                try:
+                    # Recent turns within the token budget plus the rolling summary of older ones
+                    stream_conversation = await stream_db.get(Conversation, conversation_id)
+                    conversation_history, conversation_summary = await context_builder.build(
+                        stream_db, stream_conversation, exclude_message_id=user_message.id
+                    )
+                    
+                    # Forward tokens, member and tool events as they are produced
+                    ai_response = ""
+                    raw_log = ""
+                    trace = None
+                    async for event in agno_team_service.astream_message_with_persona(
+                        db=stream_db,
+                        persona_id=persona_id,
+                        message=content,
+                        conversation_history=conversation_history,
+                        file_ids=file_ids,
+                        user_id=user_id,
+                        conversation_summary=conversation_summary,
+                        account_id=account_id
+                    ):
+                        if event["type"] == "done":
+                            ai_response = event["content"]
+                            raw_log = event["raw_log"]
+                            trace = event.get("trace")
+                            continue
+                        yield sse(event)
+                    
+                    # Persist the assistant message once the stream finishes
+                    ai_message = Message(
+                        conversation_id=conversation_id,
+                        role="assistant",
+                        content=ai_response,
+                        sender_type="persona",
+                        agent_name="Team Leader",
+                        timestamp=datetime.utcnow()
+                    )
+                    stream_db.add(ai_message)
+                    await stream_db.commit()
+                    await stream_db.refresh(ai_message)
+                    
+                    await save_run_log(conversation_id, persona_id, ai_message.id, raw_log, trace)
+                    schedule_summary_refresh(conversation_id)
+                    
+                except Exception as e:
+                    await stream_db.rollback()
+                    # Create error message
+                    ai_message = Message(
+                        conversation_id=conversation_id,
+                        role="assistant",
+                        content=f"Sorry, I encountered an error: {str(e)}",
+                        sender_type="system",
+                        timestamp=datetime.utcnow()
+                    )
+                    
+                    stream_db.add(ai_message)
+                    await stream_db.commit()
+                    await stream_db.refresh(ai_message)
+                    yield sse({'type': 'chunk', 'data': ai_message.content})
+                
+                # Send completion signal
+                yield sse({'type': 'complete', 'data': {'id': ai_message.id, 'content': ai_message.content, 'role': ai_message.role}})
+        
         except Exception as e:
             # Send error
-            yield f"data: {json.dumps({'type': 'error', 'data': str(e)})}\n\n"
+            yield sse({'type': 'error', 'data': str(e)})
     
     return StreamingResponse(
         generate_stream(),
@@ -1556,7 +1901,9 @@ def get_all_personas(
     db: Session = Depends(get_db)
 ):
     """Get all personas (Admin only)"""
-    personas = db.query(Persona).offset(skip).limit(limit).all()
+    personas = db.query(Persona).options(
+        joinedload(Persona.created_by_admin)
+    ).order_by(Persona.id).offset(skip).limit(limit).all()
     
     return [
         {
@@ -1581,7 +1928,9 @@ def get_persona_by_id(
     db: Session = Depends(get_db)
 ):
     """Get persona by ID (Admin only)"""
-    persona = db.query(Persona).filter(Persona.id == persona_id).first()
+    persona = db.query(Persona).options(
+        joinedload(Persona.created_by_admin)
+    ).filter(Persona.id == persona_id).first()
     if not persona:
         raise HTTPException(status_code=404, detail="Persona not found")
     
@@ -1638,6 +1987,7 @@ def update_persona(
     
     persona.updated_at = datetime.utcnow()
     db.commit()
+    agno_team_service.team_cache.invalidate_persona(persona_id)
     
     return {"message": "Persona updated successfully"}
 
@@ -1699,21 +2049,25 @@ def get_persona_users(
     if not persona:
         raise HTTPException(status_code=404, detail="Persona not found")
     
-    assignments = db.query(UserPersona).filter(
+    rows = db.query(
+        User.id,
+        User.username,
+        User.email,
+        UserPersona.assigned_at
+    ).join(UserPersona, UserPersona.user_id == User.id).filter(
         UserPersona.persona_id == persona_id,
         UserPersona.is_active == True
-    ).all()
+    ).order_by(UserPersona.id).all()
     
-    users = []
-    for assignment in assignments:
-        user = db.query(User).filter(User.id == assignment.user_id).first()
-        if user:
-            users.append({
-                "id": user.id,
-                "username": user.username,
-                "email": user.email,
-                "assigned_at": assignment.assigned_at
-            })
+    users = [
+        {
+            "id": row.id,
+            "username": row.username,
+            "email": row.email,
+            "assigned_at": row.assigned_at
+        }
+        for row in rows
+    ]
     
     return {"persona_id": persona_id, "persona_name": persona.name, "users": users}
 
@@ -1819,6 +2173,7 @@ def attach_agent_to_persona(
     updated_agents = current_agents + [agent_id]
     persona.agents = updated_agents
     db.commit()
+    agno_team_service.team_cache.invalidate_persona(persona_id)
     
     return {"message": f"Agent '{agent.name}' attached to persona '{persona.name}' successfully"}
 
@@ -1849,6 +2204,7 @@ def detach_agent_from_persona(
     updated_agents = [id for id in current_agents if id != agent_id]
     persona.agents = updated_agents
     db.commit()
+    agno_team_service.team_cache.invalidate_persona(persona_id)
     
     return {"message": f"Agent '{agent.name}' detached from persona '{persona.name}' successfully"}
 
@@ -1922,6 +2278,7 @@ def update_agent(
     
     db.commit()
     db.refresh(agent)
+    agno_team_service.team_cache.invalidate_agent(agent_id)
     
     return AgentResponse(
         id=agent.id,
@@ -1951,6 +2308,7 @@ def delete_persona_agent(
     agent.is_active = False
     agent.updated_at = datetime.utcnow()
     db.commit()
+    agno_team_service.team_cache.invalidate_agent(agent_id)
     
     return {"message": "Agent deleted successfully"}
 
@@ -2007,41 +2365,61 @@ def get_all_tools(
     
     return tool_responses
 
+# =============================================================================
+# METRICS ENDPOINTS (Admin Only)
+# =============================================================================
+
+@app.get("/admin/metrics")
+def get_metrics(
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Get in-process cache metrics (Admin only)"""
+    return {
+        "team_cache": agno_team_service.team_cache.stats(),
+        "context_builder": context_builder.stats(),
+        "extraction_cache": extraction_service.stats(),
+        "file_service": file_service.stats(),
+        "principal_cache": principal_cache.stats(),
+        "password_service": password_service.stats(),
+        "db_pool": pool_stats(),
+        "model_catalog": model_service.stats(),
+        "tool_pool": tool_pool_stats(),
+        "gmail": gmail_credential_store.stats()
+    }
+
 
 # File Upload Endpoints
+ALLOWED_UPLOAD_TYPES = [
+    'image/jpeg', 'image/png', 'image/gif', 'image/webp',
+    'application/pdf', 'text/plain', 'application/msword',
+    'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+    'application/zip', 'application/x-rar-compressed',
+    'text/javascript', 'text/css', 'text/html', 'text/x-python'
+]
+
 @app.post("/user/upload")
 async def upload_file(
     file: UploadFile = File(...),
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Upload a file and return file info"""
     try:
-        # Validate file size (max 10MB)
-        max_size = 10 * 1024 * 1024  # 10MB
-        file_content = await file.read()
-        if len(file_content) > max_size:
-            raise HTTPException(status_code=400, detail="File too large. Maximum size is 10MB")
+        # Exact per-file check; the body limit is enforced by UploadSizeLimitMiddleware
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+            raise FileTooLargeError(MAX_UPLOAD_SIZE)
         
         # Validate file type
-        allowed_types = [
-            'image/jpeg', 'image/png', 'image/gif', 'image/webp',
-            'application/pdf', 'text/plain', 'application/msword',
-            'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            'application/zip', 'application/x-rar-compressed',
-            'text/javascript', 'text/css', 'text/html', 'text/x-python'
-        ]
-        
-        if file.content_type not in allowed_types:
+        if file.content_type not in ALLOWED_UPLOAD_TYPES:
             raise HTTPException(status_code=400, detail="File type not allowed")
         
-        # Upload to MinIO
-        from io import BytesIO
-        file_data = BytesIO(file_content)
-        file_info = file_service.upload_file(
-            file_data, 
-            file.filename, 
-            file.content_type
+        # Stream to MinIO (size cutoff and hash on the way), stored once per content hash
+        file_info = await file_service.store_upload(
+            db,
+            file.file,
+            file.filename,
+            file.content_type,
+            MAX_UPLOAD_SIZE
         )
         
         # Save file info to database
@@ -2051,12 +2429,17 @@ async def upload_file(
             file_size=file_info['file_size'],
             content_type=file_info['content_type'],
             bucket_name=file_info['bucket_name'],
+            content_hash=file_info['content_hash'],
             uploaded_by_id=current_user.id
         )
         
         db.add(db_file)
-        db.commit()
-        db.refresh(db_file)
+        await db.commit()  # Also releases the blob row lock taken by store_upload
+        await db.refresh(db_file)
+        
+        # Extract text in the background so process_file calls hit the cache;
+        # duplicates of an earlier upload find its sidecar and index already built
+        extraction_service.warm(db_file.content_hash, db_file.content_type, db_file.object_name)
         
         return {
             "file_id": db_file.id,
@@ -2066,9 +2449,137 @@ async def upload_file(
             "uploaded_at": db_file.created_at.isoformat()
         }
         
+    except FileTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+# Direct-to-MinIO uploads: presign, client uploads to storage, finalize
+UPLOAD_POLICY_EXPIRE_SECONDS = int(os.getenv("UPLOAD_POLICY_EXPIRE_SECONDS", "900"))
+
+class UploadPresignRequest(BaseModel):
+    filename: str = Field(..., min_length=1, max_length=255)
+    content_type: str
+    file_size: int = Field(..., gt=0)
+
+class UploadFinalizeRequest(BaseModel):
+    upload_token: str
+
+# Keep finalize follow-up jobs referenced until they finish
+upload_adopt_tasks: "set[asyncio.Task]" = set()
+
+async def adopt_direct_upload(file_id: int):
+    """Hash and deduplicate a finalized direct upload, then warm the text cache"""
+    try:
+        async with AsyncSessionLocal() as adopt_db:
+            file_record = await file_service.adopt_staged(adopt_db, file_id)
+            if file_record is not None and file_record.content_hash:
+                extraction_service.warm(file_record.content_hash, file_record.content_type, file_record.object_name)
+    except Exception as e:
+        print(f"⚠️ Failed to finalize storage for file {file_id}: {e}")
+
+@app.post("/user/uploads/presign")
+async def presign_upload(
+    request: UploadPresignRequest,
+    current_user: User = Depends(get_current_user)
+):
+    """Issue a presigned POST policy so the client can upload straight to storage"""
+    if not file_service.direct_uploads_enabled:
+        # Clients fall back to POST /user/upload
+        raise HTTPException(status_code=501, detail="Direct uploads are not configured")
+    if request.content_type not in ALLOWED_UPLOAD_TYPES:
+        raise HTTPException(status_code=400, detail="File type not allowed")
+    if request.file_size > MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=413, detail=str(FileTooLargeError(MAX_UPLOAD_SIZE)))
+    
+    try:
+        policy = await asyncio.to_thread(
+            file_service.create_upload_policy,
+            request.filename,
+            request.content_type,
+            MAX_UPLOAD_SIZE,
+            UPLOAD_POLICY_EXPIRE_SECONDS
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Upload presign failed: {str(e)}")
+    
+    # Signed ticket binding the staged object to this user and declared metadata
+    upload_token = create_access_token(
+        {
+            "sub": str(current_user.id),
+            "purpose": "upload",
+            "object_name": policy["object_name"],
+            "filename": request.filename,
+            "content_type": request.content_type
+        },
+        expires_delta=timedelta(seconds=UPLOAD_POLICY_EXPIRE_SECONDS * 2)
+    )
+    
+    return {
+        "upload_url": policy["upload_url"],
+        "fields": policy["fields"],
+        "upload_token": upload_token,
+        "expires_at": policy["expires_at"]
+    }
+
+@app.post("/user/uploads/finalize")
+async def finalize_upload(
+    request: UploadFinalizeRequest,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Verify a direct upload and register it as a file"""
+    try:
+        ticket = jwt.decode(request.upload_token, SECRET_KEY, algorithms=[ALGORITHM])
+    except jwt.PyJWTError:
+        raise HTTPException(status_code=400, detail="Invalid or expired upload token")
+    if ticket.get("purpose") != "upload" or ticket.get("sub") != str(current_user.id):
+        raise HTTPException(status_code=403, detail="Upload token does not belong to this user")
+    
+    object_name = ticket["object_name"]
+    content_type = ticket["content_type"]
+    try:
+        inspection = await asyncio.to_thread(file_service.inspect_staged, object_name)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Uploaded object not found")
+    
+    # The policy already bounds size and type; re-check what actually landed
+    if inspection["file_size"] > MAX_UPLOAD_SIZE or not content_type_matches(content_type, inspection["sniffed_type"]):
+        await asyncio.to_thread(file_service.delete_file, object_name)
+        raise HTTPException(status_code=400, detail="Uploaded file does not match the declared size or type")
+    
+    db_file = FileModel(
+        filename=ticket["filename"],
+        object_name=object_name,
+        file_size=inspection["file_size"],
+        content_type=content_type,
+        bucket_name=file_service.bucket_name,
+        uploaded_by_id=current_user.id
+    )
+    db.add(db_file)
+    try:
+        await db.commit()
+    except IntegrityError:
+        # Tokens stay valid until expiry; the unique staged object_name refuses a second row
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Upload already finalized")
+    await db.refresh(db_file)
+    
+    # Hashing, deduplication and text extraction happen off the request path
+    task = asyncio.create_task(adopt_direct_upload(db_file.id))
+    upload_adopt_tasks.add(task)
+    task.add_done_callback(upload_adopt_tasks.discard)
+    
+    return {
+        "file_id": db_file.id,
+        "filename": db_file.filename,
+        "file_size": db_file.file_size,
+        "content_type": db_file.content_type,
+        "uploaded_at": db_file.created_at.isoformat()
+    }
+
 @app.get("/user/files/{file_id}/download")
 async def download_file(
     file_id: int,
@@ -2087,7 +2598,7 @@ async def download_file(
             raise HTTPException(status_code=403, detail="Access denied")
         
         # Generate download URL
-        download_url = file_service.get_download_url(file_record.object_name)
+        download_url = file_service.get_download_url(file_record.object_name, filename=file_record.filename)
         
         return {
             "download_url": download_url,
@@ -2103,12 +2614,12 @@ async def download_file(
 async def delete_file(
     file_id: int,
     current_user: User = Depends(get_current_user),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     """Delete a file"""
     try:
         # Get file info from database
-        file_record = db.query(FileModel).filter(FileModel.id == file_id).first()
+        file_record = await db.get(FileModel, file_id)
         if not file_record:
             raise HTTPException(status_code=404, detail="File not found")
         
@@ -2116,81 +2627,119 @@ async def delete_file(
         if file_record.uploaded_by_id != current_user.id:
             raise HTTPException(status_code=403, detail="Access denied")
         
-        # Delete from MinIO
-        success = file_service.delete_file(file_record.object_name)
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to delete file from storage")
+        # Drop this file's reference; the object is removed with the last one
+        object_name, content_hash = file_record.object_name, file_record.content_hash
+        released = await file_service.release_upload(db, object_name, content_hash)
         
         # Delete from database
-        db.delete(file_record)
-        db.commit()
+        await db.delete(file_record)
+        await db.commit()
+        
+        # Storage is touched only once the rows are gone
+        if released:
+            try:
+                await file_service.purge_released(db, object_name, content_hash)
+            except Exception as e:
+                await db.rollback()
+                print(f"⚠️ Could not purge storage for deleted file {file_id}: {e}")
         
         return {"message": "File deleted successfully"}
         
+    except HTTPException:
+        raise
     except Exception as e:
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Delete failed: {str(e)}")
 
 # Logs API endpoints
+def serialize_run_log_summary(log: AgentRunLog) -> Dict[str, Any]:
+    """List view of a run log - summary only, the trace is fetched lazily"""
+    return {
+        "id": log.id,
+        "conversation_id": log.conversation_id,
+        "persona_id": log.persona_id,
+        "message_id": log.message_id,
+        "summary": log.summary,
+        "storage_tier": log.storage_tier,
+        "created_at": log.created_at.replace(tzinfo=pytz.UTC).astimezone(IST).isoformat()
+    }
+
 @app.get("/api/logs")
-async def get_all_logs(skip: int = 0, limit: int = 100):
-    """Get all logs with pagination"""
-    db = SessionLocal()
+async def get_all_logs(
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    count: str = "approximate",
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Get log summaries, newest first, with keyset (cursor) pagination (Admin only)"""
+    limit = max(1, min(limit, 200))
+    if count not in RUN_LOG_COUNT_MODES:
+        raise HTTPException(status_code=400, detail=f"count must be one of {', '.join(RUN_LOG_COUNT_MODES)}")
     try:
-        logs = db.query(AgentRunLog).order_by(
-            AgentRunLog.created_at.desc()
-        ).offset(skip).limit(limit).all()
-        
-        total_count = db.query(AgentRunLog).count()
-        
-        return {
-            "logs": [
-                {
-                    "id": log.id,
-                    "conversation_id": log.conversation_id,
-                    "persona_id": log.persona_id,
-                    "message_id": log.message_id,
-                    "raw_log": log.raw_log,
-                    "created_at": log.created_at.replace(tzinfo=pytz.UTC).astimezone(IST).isoformat()
-                }
-                for log in logs
-            ],
-            "total_count": total_count,
-            "skip": skip,
-            "limit": limit
-        }
-    finally:
-        db.close()
+        logs, next_cursor = await run_log_store.list_summaries(db, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    total_count, is_estimate = await run_log_store.count(db, count)
+    
+    return {
+        "logs": [serialize_run_log_summary(log) for log in logs],
+        "next_cursor": next_cursor,
+        "limit": limit,
+        "total_count": total_count,
+        "count_is_estimate": is_estimate
+    }
+
+@app.get("/api/logs/runs/{log_id}")
+async def get_run_log_detail(
+    log_id: int,
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Get the full structured trace and raw log of one agent run (Admin only)"""
+    log = await db.get(AgentRunLog, log_id)
+    if not log:
+        raise HTTPException(status_code=404, detail="Log not found")
+    
+    try:
+        # Decompression and cold-tier reads are blocking
+        detail = await asyncio.to_thread(run_log_store.load_detail, log)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"Failed to load trace: {str(e)}")
+    
+    return {
+        **serialize_run_log_summary(log),
+        "trace": detail.get("trace"),
+        "raw_log": detail.get("raw_log")
+    }
 
 @app.get("/api/logs/{conversation_id}")
-async def get_conversation_logs(conversation_id: int):
-    """Get logs for a specific conversation"""
-    db = SessionLocal()
+async def get_conversation_logs(
+    conversation_id: int,
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_db),
+    admin_user: User = Depends(get_current_admin_user)
+):
+    """Get log summaries for a specific conversation with keyset pagination (Admin only)"""
+    limit = max(1, min(limit, 200))
     try:
-        logs = db.query(AgentRunLog).filter(
-            AgentRunLog.conversation_id == conversation_id
-        ).order_by(AgentRunLog.created_at.desc()).all()
-        
-        return {
-            "conversation_id": conversation_id,
-            "logs": [
-                {
-                    "id": log.id,
-                    "persona_id": log.persona_id,
-                    "message_id": log.message_id,
-                    "raw_log": log.raw_log,
-                    "created_at": log.created_at.replace(tzinfo=pytz.UTC).astimezone(IST).isoformat()
-                }
-                for log in logs
-            ]
-        }
-    finally:
-        db.close()
+        logs, next_cursor = await run_log_store.list_summaries(db, limit, cursor, conversation_id=conversation_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    return {
+        "conversation_id": conversation_id,
+        "logs": [serialize_run_log_summary(log) for log in logs],
+        "next_cursor": next_cursor,
+        "limit": limit
+    }
 
 @app.get("/api/models")
 async def get_available_models():
     """Get all available models from all providers"""
     try:
-        models = model_service.get_all_models()
+        models = await model_service.get_all_models()
         return {
             "success": True,
             "data": models,
@@ -2200,7 +2749,7 @@ async def get_available_models():
         return {
             "success": False,
             "error": str(e),
-            "data": model_service.get_all_models(),  # Return fallback data
+            "data": model_service.get_fallback_catalog(),  # Return fallback data
             "timestamp": datetime.utcnow().isoformat()
         }
 
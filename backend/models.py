@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Float
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, Boolean, JSON, Float, LargeBinary, Index, UniqueConstraint, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from database import Base
@@ -56,12 +56,44 @@ class File(Base):
     file_size = Column(Integer, nullable=False)
     content_type = Column(String, nullable=False)
     bucket_name = Column(String, nullable=False)
+    content_hash = Column(String(64), index=True)  # sha256 of the content, keys the extracted-text cache
     uploaded_by_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     created_at = Column(DateTime, default=datetime.utcnow)
     
+    # A staged direct upload is registered at most once; content-addressed
+    # objects are shared by many rows, so only staging keys are unique
+    __table_args__ = (
+        Index("uq_files_staged_object_name", "object_name", unique=True,
+              postgresql_where=text("object_name LIKE 'staging/%'")),
+    )
+    
     # Relationships
     uploaded_by = relationship("User", foreign_keys=[uploaded_by_id])
 
+# Content-addressed storage object shared by every upload with the same bytes
+class FileBlob(Base):
+    __tablename__ = "file_blobs"
+    content_hash = Column(String(64), primary_key=True)  # sha256 of the content
+    object_name = Column(String, nullable=False)  # MinIO key, sha256/<hash>
+    file_size = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0)  # files rows pointing at this object
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+# Retrieval chunks of extracted file text, shared by every file with the same content
+class FileChunk(Base):
+    __tablename__ = "file_chunks"
+    id = Column(Integer, primary_key=True, index=True)
+    content_hash = Column(String(64), nullable=False, index=True)
+    chunk_index = Column(Integer, nullable=False)
+    page = Column(Integer)  # 1-based source page (PDF) or 1 for single-section documents
+    text = Column(Text, nullable=False)
+    embedding = Column(LargeBinary, nullable=False)  # float32 hashing-vectorizer embedding
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        UniqueConstraint("content_hash", "chunk_index", name="uq_file_chunks_content_hash_chunk_index"),
+    )
+
 class MessageFile(Base):
     __tablename__ = "message_files"
     id = Column(Integer, primary_key=True, index=True)
@@ -130,6 +162,13 @@ class UserPersona(Base):
     is_active = Column(Boolean, default=True)
     assigned_by_admin_id = Column(Integer, ForeignKey("users.id"))
     
+    # One row per user/persona pair (unassigning flips is_active); is_active is
+    # carried in the index so assignment checks are index-only
+    __table_args__ = (
+        Index("uq_user_personas_user_id_persona_id", "user_id", "persona_id", unique=True, postgresql_include=["is_active"]),
+        Index("ix_user_personas_persona_id", "persona_id"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="assigned_personas", foreign_keys=[user_id])
     persona = relationship("Persona", back_populates="assigned_users", foreign_keys=[persona_id])
@@ -170,9 +209,16 @@ class Conversation(Base):
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     persona_id = Column(Integer, ForeignKey("personas.id"), nullable=False)
     status = Column(String, default="active")  # active, ended, paused
+    summary = Column(Text)  # Rolling summary of turns older than the context window
+    summary_message_id = Column(Integer)  # Last message folded into summary (no FK - messages are deleted first)
     created_at = Column(DateTime, default=datetime.utcnow)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # A user's conversation list, most recently active first
+    __table_args__ = (
+        Index("ix_conversations_user_id_updated_at", "user_id", "updated_at"),
+    )
+    
     # Relationships
     user = relationship("User", back_populates="conversations")
     persona = relationship("Persona", back_populates="conversations")
@@ -188,22 +234,48 @@ class Message(Base):
     agent_name = Column(String)  # Name of the specific agent if from team
     timestamp = Column(DateTime, default=datetime.utcnow)
     
+    # Conversation transcripts (by time) and context windows (by id)
+    __table_args__ = (
+        Index("ix_messages_conversation_id_timestamp", "conversation_id", "timestamp"),
+        Index("ix_messages_conversation_id_id", "conversation_id", "id"),
+    )
+    
     # Relationships
     conversation = relationship("Conversation", back_populates="messages")
 
 # Tracking Models (Removed: ToolUsage, AgentInteraction, ConversationAnalytics)
 # These tables were removed as they are not used with Agno Teams implementation
 
-# Store raw Agno logs per agent run
+# Store structured Agno run traces per agent run
 class AgentRunLog(Base):
     __tablename__ = "logs"
     id = Column(Integer, primary_key=True, index=True)
     conversation_id = Column(Integer, ForeignKey("conversations.id"), nullable=False)
     persona_id = Column(Integer, ForeignKey("personas.id"), nullable=False)
     message_id = Column(Integer, ForeignKey("messages.id"), nullable=False)
-    raw_log = Column(Text, nullable=False)
+    raw_log = Column(Text, nullable=True)  # Legacy uncompressed dump, emptied by compaction
+    summary = Column(JSON)  # Status, duration, token and span counts for list views
+    trace_gz = Column(LargeBinary, nullable=True)  # gzip JSON of spans + raw log (hot tier)
+    storage_tier = Column(String, default="hot", nullable=False)  # hot, cold, expired
+    trace_object_name = Column(String, nullable=True)  # MinIO object holding the trace (cold tier)
     created_at = Column(DateTime, default=datetime.utcnow)
 
+    # Keyset pagination indexes for the global and per-conversation log views
+    __table_args__ = (
+        Index("ix_logs_created_at_id", "created_at", "id"),
+        Index("ix_logs_conversation_id_created_at_id", "conversation_id", "created_at", "id"),
+    )
+
     # Relationships
     conversation = relationship("Conversation")
     message = relationship("Message")
+
+# Per-user Gmail OAuth tokens, Fernet-encrypted JSON (services/gmail_credentials.py)
+class GmailCredential(Base):
+    __tablename__ = "gmail_credentials"
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    email = Column(String, nullable=True)  # Connected Gmail address
+    token_encrypted = Column(LargeBinary, nullable=False)  # access/refresh token, expiry and scopes
+    scopes = Column(JSON)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
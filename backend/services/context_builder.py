@@ -0,0 +1,348 @@
+"""
+ContextBuilder - Token-budgeted conversation context for persona runs
+
+Recent turns are packed newest-first until the token budget is used up.
+Everything older is folded into a rolling summary stored on the
+Conversation, which is refreshed incrementally after each turn so the
+prompt stays bounded however long the conversation gets.
+"""
+from collections import OrderedDict
+from contextlib import aclosing
+from functools import lru_cache
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import threading
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import release_connection
+from models import Conversation, Message, Persona
+
+try:
+    import tiktoken
+except ImportError:  # Fall back to a character heuristic
+    tiktoken = None
+
+# Per-message framing overhead of chat formats ("role: ...\n")
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an assistant.
+Update the existing summary with the new turns below. Keep facts, decisions, names, numbers,
+open questions and user preferences; drop pleasantries and repetition. Write plain prose,
+at most {max_tokens} tokens.
+
+Existing summary:
+{summary}
+
+New turns:
+{turns}
+
+Updated summary:"""
+
+
+@lru_cache(maxsize=32)
+def _encoding_for(model_id: str):
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.encoding_for_model(model_id)
+    except KeyError:
+        # Non-OpenAI models (Groq/Llama etc.) - cl100k is a close enough estimate
+        return tiktoken.get_encoding("cl100k_base")
+
+
+class TokenCountCache:
+    """LRU of token counts keyed by a digest of the text, so message bodies are not retained"""
+
+    def __init__(self, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self._counts: "OrderedDict[Tuple[str, bytes], int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def count(self, model_id: str, text: str) -> int:
+        key = (model_id, hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest())
+        with self._lock:
+            cached = self._counts.get(key)
+            if cached is not None:
+                self._counts.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+
+        encoding = _encoding_for(model_id)
+        if encoding is None:
+            tokens = max(1, len(text) // 4)
+        else:
+            tokens = len(encoding.encode(text, disallowed_special=()))
+
+        with self._lock:
+            self._counts[key] = tokens
+            while len(self._counts) > self.max_entries:
+                self._counts.popitem(last=False)
+        return tokens
+
+
+class ContextBuilder:
+    def __init__(self):
+        self.token_budget = int(os.getenv("CONTEXT_TOKEN_BUDGET", "6000"))
+        # Single turns larger than this are cut so one answer cannot evict everything else
+        self.max_message_tokens = int(os.getenv("CONTEXT_MAX_MESSAGE_TOKENS", str(self.token_budget // 3)))
+        self.summary_max_tokens = int(os.getenv("CONTEXT_SUMMARY_MAX_TOKENS", "600"))
+        # Summaries use this model when its provider has an API key, else the persona's own model
+        self.summary_provider = os.getenv("CONTEXT_SUMMARY_PROVIDER", "openai")
+        self.summary_model_id = os.getenv("CONTEXT_SUMMARY_MODEL", "gpt-4o-mini")
+        # Fold old turns into the summary once unsummarized turns exceed this share of the budget
+        self.summary_trigger_ratio = float(os.getenv("CONTEXT_SUMMARY_TRIGGER_RATIO", "0.75"))
+        # Page size when walking a conversation's messages
+        self.fetch_limit = int(os.getenv("CONTEXT_FETCH_LIMIT", "200"))
+        # Turns folded per summary call, so a long backlog is summarized in several calls
+        self.summary_chunk_tokens = int(os.getenv("CONTEXT_SUMMARY_CHUNK_TOKENS", "8000"))
+        self.token_counts = TokenCountCache(int(os.getenv("CONTEXT_TOKEN_COUNT_CACHE_SIZE", "8192")))
+        # Conversations with a summary refresh in flight
+        self._refreshing: set = set()
+
+    def count_tokens(self, text: str, model_id: str = "gpt-4o") -> int:
+        """Token count of a string for the given model"""
+        if not text:
+            return 0
+        return self.token_counts.count(model_id or "gpt-4o", text)
+
+    def clip(self, text: str, max_tokens: int, model_id: str) -> str:
+        """Cut text to at most max_tokens tokens"""
+        if self.count_tokens(text, model_id) <= max_tokens:
+            return text
+        encoding = _encoding_for(model_id)
+        if encoding is None:
+            return text[:max_tokens * 4] + " [...truncated]"
+        tokens = encoding.encode(text, disallowed_special=())
+        return encoding.decode(tokens[:max_tokens]) + " [...truncated]"
+
+    def _message_tokens(self, message: Message, model_id: str) -> int:
+        return self.count_tokens(message.content or "", model_id) + MESSAGE_OVERHEAD_TOKENS
+
+    async def _unsummarized_messages(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        exclude_message_id: Optional[int] = None,
+        newest_first: bool = True,
+        before_id: Optional[int] = None
+    ) -> AsyncIterator[Message]:
+        """Messages after the summary watermark, paged by id so long backlogs are not cut off"""
+        cursor = before_id if newest_first else conversation.summary_message_id
+        while True:
+            query = select(Message).where(Message.conversation_id == conversation.id)
+            if conversation.summary_message_id:
+                query = query.where(Message.id > conversation.summary_message_id)
+            if exclude_message_id:
+                query = query.where(Message.id != exclude_message_id)
+            if newest_first:
+                if cursor is not None:
+                    query = query.where(Message.id < cursor)
+                query = query.order_by(Message.id.desc())
+            else:
+                if cursor is not None:
+                    query = query.where(Message.id > cursor)
+                if before_id is not None:
+                    query = query.where(Message.id < before_id)
+                query = query.order_by(Message.id)
+            page = list((await db.execute(query.limit(self.fetch_limit))).scalars().all())
+            for message in page:
+                yield message
+            if len(page) < self.fetch_limit:
+                return
+            cursor = page[-1].id
+
+    async def _persona_model_id(self, db: AsyncSession, persona_id: int) -> str:
+        result = await db.execute(select(Persona.model_id).where(Persona.id == persona_id))
+        return result.scalar() or "gpt-4o"
+
+    async def _summary_model(self, db: AsyncSession, persona_id: int) -> Tuple[str, str]:
+        """(provider, model_id) for summary calls, falling back to the persona's model"""
+        from services.agno_team_service import agno_team_service
+        
+        if agno_team_service.has_api_key(self.summary_provider):
+            return self.summary_provider, self.summary_model_id
+        result = await db.execute(
+            select(Persona.model_provider, Persona.model_id).where(Persona.id == persona_id)
+        )
+        row = result.first()
+        if row is None or not row.model_provider or not row.model_id:
+            return self.summary_provider, self.summary_model_id
+        return row.model_provider, row.model_id
+
+    async def build(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        exclude_message_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, str]], Optional[str]]:
+        """Recent turns (chronological) that fit the budget, plus the rolling summary"""
+        model_id = await self._persona_model_id(db, conversation.persona_id)
+        summary = conversation.summary or None
+        remaining = self.token_budget - self.count_tokens(summary or "", model_id)
+
+        history: List[Dict[str, str]] = []
+        async with aclosing(self._unsummarized_messages(db, conversation, exclude_message_id)) as messages:
+            async for message in messages:
+                content = message.content or ""
+                tokens = self._message_tokens(message, model_id)
+                if tokens > self.max_message_tokens:
+                    content = self.clip(content, self.max_message_tokens, model_id)
+                    tokens = self.max_message_tokens + MESSAGE_OVERHEAD_TOKENS
+                if tokens > remaining:
+                    break
+                history.append({"role": message.role, "content": content})
+                remaining -= tokens
+
+        history.reverse()
+        return history, summary
+
+    async def refresh_summary(
+        self,
+        db: AsyncSession,
+        conversation_id: int,
+        lock: Optional[asyncio.Lock] = None
+    ) -> bool:
+        """Fold the oldest unsummarized turns into the rolling summary when they outgrow the budget.
+        
+        ``lock`` is the conversation's send lock. It is held only while
+        reading and while writing each summary step, never across a summary
+        model call; a write is skipped if the watermark moved meanwhile.
+        Long backlogs are folded oldest-first in chunks of
+        summary_chunk_tokens, one model call and commit per chunk.
+        """
+        if conversation_id in self._refreshing:
+            return False
+        self._refreshing.add(conversation_id)
+        lock = lock or asyncio.Lock()
+        try:
+            async with lock:
+                conversation = await db.get(Conversation, conversation_id, populate_existing=True)
+                if conversation is None:
+                    return False
+                model_id = await self._persona_model_id(db, conversation.persona_id)
+                summary_model = await self._summary_model(db, conversation.persona_id)
+                boundary = await self._fold_boundary(db, conversation, model_id)
+                await release_connection(db)
+            if boundary is None:
+                return False
+
+            folded = False
+            while True:
+                async with lock:
+                    conversation = await db.get(Conversation, conversation_id, populate_existing=True)
+                    if conversation is None:
+                        return folded
+                    watermark = conversation.summary_message_id
+                    previous_summary = conversation.summary
+                    chunk = await self._next_chunk(db, conversation, boundary, summary_model[1])
+                    # The summary call takes seconds; give the connection back meanwhile
+                    await release_connection(db)
+                if not chunk:
+                    return folded
+
+                summary = await self._summarize(previous_summary, chunk, *summary_model)
+                if summary is None:
+                    return folded
+
+                async with lock:
+                    conversation = await db.get(Conversation, conversation_id, populate_existing=True)
+                    if conversation is None or conversation.summary_message_id != watermark:
+                        await release_connection(db)
+                        return folded
+                    conversation.summary = summary
+                    conversation.summary_message_id = chunk[-1].id
+                    await db.commit()
+                    folded = True
+        finally:
+            self._refreshing.discard(conversation_id)
+
+    async def _fold_boundary(self, db: AsyncSession, conversation: Conversation, model_id: str) -> Optional[int]:
+        """Id of the oldest turn kept verbatim, when unsummarized turns exceed the trigger; None otherwise"""
+        trigger = self.token_budget * self.summary_trigger_ratio
+        # Keep the newest half of the budget verbatim, summarize the rest
+        keep_budget = self.token_budget // 2
+        total = 0
+        kept = 0
+        boundary = None
+        async with aclosing(self._unsummarized_messages(db, conversation)) as messages:
+            async for message in messages:
+                tokens = min(self._message_tokens(message, model_id), self.max_message_tokens)
+                if boundary is None:
+                    if kept + tokens > keep_budget:
+                        boundary = message.id + 1
+                    else:
+                        kept += tokens
+                total += tokens
+                if boundary is not None and total > trigger:
+                    return boundary
+        return None
+
+    async def _next_chunk(
+        self,
+        db: AsyncSession,
+        conversation: Conversation,
+        boundary: int,
+        model_id: str
+    ) -> List[Message]:
+        """Oldest unsummarized turns below the boundary, up to summary_chunk_tokens"""
+        chunk: List[Message] = []
+        used = 0
+        async with aclosing(self._unsummarized_messages(db, conversation, newest_first=False, before_id=boundary)) as messages:
+            async for message in messages:
+                tokens = min(self._message_tokens(message, model_id), self.max_message_tokens)
+                if chunk and used + tokens > self.summary_chunk_tokens:
+                    break
+                chunk.append(message)
+                used += tokens
+        return chunk
+
+    async def _summarize(
+        self,
+        previous_summary: Optional[str],
+        messages: List[Message],
+        model_provider: str,
+        model_id: str
+    ) -> Optional[str]:
+        """Ask the summary model to merge new turns into the summary"""
+        turns = "\n".join(
+            f"{'User' if m.role == 'user' else 'Assistant'}: "
+            f"{self.clip(m.content or '', self.max_message_tokens, model_id)}"
+            for m in messages
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_tokens=self.summary_max_tokens,
+            summary=previous_summary or "(none yet)",
+            turns=turns,
+        )
+        from agno.agent import Agent
+        from services.agno_team_service import agno_team_service
+        
+        try:
+            model = agno_team_service.create_model(model_provider, model_id)
+            summarizer = Agent(model=model, markdown=False)
+            response = await summarizer.arun(prompt)
+        except Exception as e:
+            print(f"⚠️ Conversation summary failed: {e}")
+            return None
+        content = response.content if isinstance(response.content, str) else None
+        if not content:
+            return None
+        return self.clip(content, self.summary_max_tokens, model_id)
+
+    def stats(self) -> Dict[str, Any]:
+        """Token counter cache usage"""
+        return {
+            "token_count_cache_hits": self.token_counts.hits,
+            "token_count_cache_misses": self.token_counts.misses,
+            "token_budget": self.token_budget,
+        }
+
+# Global context builder instance
+context_builder = ContextBuilder()
@@ -0,0 +1,282 @@
+"""
+ExtractionService - Cached text extraction for uploaded files
+
+Extracted text is keyed by the file's content hash and persisted as a gzip
+JSON sidecar object in MinIO, with an in-process LRU on top. Uploads warm
+the cache on a background worker so agent tool calls do not download or
+parse the file again.
+"""
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import gzip
+import hashlib
+import io
+import json
+import os
+import threading
+
+from services.file_index import file_index
+from services.file_service import file_service
+from services.pdf_extraction import iter_pdf_pages, parse_page_range
+
+# Bump when the extraction output changes to ignore older sidecars
+EXTRACTION_VERSION = 1
+
+SIDECAR_PREFIX = f"extracted/v{EXTRACTION_VERSION}/"
+
+PDF_TYPES = ("application/pdf",)
+DOCX_TYPES = (
+    "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "application/msword",
+)
+TEXT_TYPES = ("text/plain",)
+
+# Pages returned by process_file when no range is given
+DEFAULT_MAX_PAGES = int(os.getenv("PROCESS_FILE_MAX_PAGES", "50"))
+
+
+def content_hash(data: bytes) -> str:
+    """sha256 hex digest used as the cache key of a file's content"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_extractable(content_type: str) -> bool:
+    """Whether text can be extracted from this content type"""
+    content_type = (content_type or "").lower()
+    return content_type in PDF_TYPES or content_type in DOCX_TYPES or content_type in TEXT_TYPES
+
+
+def iter_document_pages(data: bytes, content_type: str) -> Tuple[str, Iterator[str]]:
+    """Document kind and its extracted text, one entry per page, produced as it is read"""
+    content_type = (content_type or "").lower()
+    if content_type in PDF_TYPES:
+        return "pdf", iter_pdf_pages(data)
+    if content_type in DOCX_TYPES:
+        from docx import Document  # Imported on first use to keep startup light
+        doc = Document(io.BytesIO(data))
+        return "docx", iter(["\n".join(p.text for p in doc.paragraphs)])
+    if content_type in TEXT_TYPES:
+        return "txt", iter([data.decode("utf-8")])
+    raise ValueError(f"Unsupported file type: {content_type}")
+
+
+class _SidecarWriter:
+    """Writes {"kind": ..., "pages": [...]} as gzip JSON one page at a time"""
+
+    def __init__(self, kind: str):
+        self.buffer = io.BytesIO()
+        self.gzip = gzip.GzipFile(fileobj=self.buffer, mode="wb")
+        self.gzip.write(('{"kind":%s,"pages":[' % json.dumps(kind)).encode("utf-8"))
+        self.pages = 0
+
+    def add(self, page: str) -> None:
+        if self.pages:
+            self.gzip.write(b",")
+        self.gzip.write(json.dumps(page).encode("utf-8"))
+        self.pages += 1
+
+    def finish(self) -> bytes:
+        self.gzip.write(b"]}")
+        self.gzip.close()
+        return self.buffer.getvalue()
+
+
+def render_document(
+    document: Dict[str, Any],
+    filename: str,
+    pages: Optional[str] = None,
+    max_pages: int = DEFAULT_MAX_PAGES
+) -> str:
+    """Format an extracted document for the agent; PDFs can be read a page range at a time"""
+    kind = document["kind"]
+    if kind == "pdf":
+        total_pages = len(document["pages"])
+        start, end = parse_page_range(pages, total_pages)
+        if not pages:
+            end = min(end, start + max_pages)
+        parts = [f"PDF Content from '{filename}':\n"]
+        for page_num in range(start, end):
+            parts.append(f"\n--- Page {page_num + 1} ---\n")
+            parts.append(document["pages"][page_num])
+        if pages or end < total_pages:
+            parts.append(f"\n\n[Showing pages {start + 1}-{end} of {total_pages}.")
+            if end < total_pages:
+                parts.append(f" Call process_file with pages='{end + 1}-{min(end + max_pages, total_pages)}' to continue.")
+            parts.append("]")
+        return "".join(parts)
+    if kind == "docx":
+        return f"Word Document Content from '{filename}':\n{document['pages'][0]}\n"
+    return f"Text File Content from '{filename}':\n{document['pages'][0]}"
+
+
+class ExtractionService:
+    def __init__(self):
+        self.max_cached_chars = int(os.getenv("EXTRACTION_CACHE_MAX_CHARS", str(50 * 1024 * 1024)))
+        self.warm_timeout = float(os.getenv("EXTRACTION_WARM_WAIT_SECONDS", "30"))
+        self.executor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("EXTRACTION_WORKERS", "2")),
+            thread_name_prefix="extract"
+        )
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._cached_chars = 0
+        self._pending: Dict[str, Future] = {}
+        self.hits = 0
+        self.sidecar_hits = 0
+        self.misses = 0
+
+    def _sidecar_name(self, digest: str) -> str:
+        return f"{SIDECAR_PREFIX}{digest}.json.gz"
+
+    def _cache_get(self, digest: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            document = self._cache.get(digest)
+            if document is not None:
+                self._cache.move_to_end(digest)
+            return document
+
+    def _cache_put(self, digest: str, document: Dict[str, Any]) -> None:
+        size = sum(len(page) for page in document["pages"])
+        if size > self.max_cached_chars:
+            return
+        with self._lock:
+            if digest in self._cache:
+                return
+            self._cache[digest] = document
+            self._cached_chars += size
+            while self._cached_chars > self.max_cached_chars:
+                _, evicted = self._cache.popitem(last=False)
+                self._cached_chars -= sum(len(page) for page in evicted["pages"])
+
+    def _load_sidecar(self, digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            return json.loads(gzip.decompress(file_service.get_bytes(self._sidecar_name(digest))).decode("utf-8"))
+        except Exception:
+            return None
+
+    def _store_sidecar(self, digest: str, payload: bytes) -> None:
+        try:
+            file_service.put_bytes(self._sidecar_name(digest), payload, content_type="application/gzip")
+        except Exception as e:
+            print(f"⚠️ Could not store extracted text for {digest[:12]}: {e}")
+
+    def _extract_and_store(
+        self,
+        digest: str,
+        data: bytes,
+        content_type: str,
+        retain: bool = True,
+        index: bool = False
+    ) -> Optional[Dict[str, Any]]:
+        """Extract pages one at a time into the sidecar, and the index when asked.
+
+        With retain=False pages are only kept while the document still fits
+        the LRU; past that None is returned and readers use the sidecar.
+        """
+        kind, pages = iter_document_pages(data, content_type)
+        sidecar = _SidecarWriter(kind)
+        retained: Optional[List[str]] = []
+        size = 0
+
+        def consume() -> Iterator[str]:
+            nonlocal retained, size
+            for page in pages:
+                sidecar.add(page)
+                if retained is not None:
+                    retained.append(page)
+                    size += len(page)
+                    if not retain and size > self.max_cached_chars:
+                        retained = None
+                yield page
+
+        stream = consume()
+        if index:
+            file_index.build(digest, {"kind": kind, "pages": stream})
+        for _ in stream:
+            pass
+        self._store_sidecar(digest, sidecar.finish())
+        if retained is None:
+            return None
+        document = {"kind": kind, "pages": retained}
+        self._cache_put(digest, document)
+        return document
+
+    def warm(self, digest: str, content_type: str, object_name: str) -> None:
+        """Extract and index a stored upload on the background worker"""
+        if not is_extractable(content_type):
+            return
+        with self._lock:
+            if digest in self._cache or digest in self._pending:
+                return
+            future = self.executor.submit(self._warm, digest, content_type, object_name)
+            self._pending[digest] = future
+
+    def _warm(self, digest: str, content_type: str, object_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            indexed = file_index.is_indexed(digest)
+            document = self._load_sidecar(digest)
+            if document is None:
+                # Build the retrieval index from the same pass over the pages
+                data = file_service.get_bytes(object_name)
+                return self._extract_and_store(digest, data, content_type, retain=False, index=not indexed)
+            self._cache_put(digest, document)
+            if not indexed:
+                file_index.build(digest, document)
+            return document
+        except Exception as e:
+            print(f"⚠️ Background extraction failed for {digest[:12]}: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(digest, None)
+
+    def get_document(self, object_name: str, content_type: str, digest: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Content hash and extracted document of a stored file.
+
+        Looks in the LRU, then waits for an in-flight warm-up, then reads the
+        sidecar, and only then downloads and parses the object itself.
+        """
+        if digest:
+            document = self._cache_get(digest)
+            if document is not None:
+                self.hits += 1
+                return digest, document
+
+            with self._lock:
+                pending = self._pending.get(digest)
+            if pending is not None:
+                try:
+                    document = pending.result(timeout=self.warm_timeout)
+                except Exception:
+                    document = None
+                if document is not None:
+                    self.hits += 1
+                    return digest, document
+
+            document = self._load_sidecar(digest)
+            if document is not None:
+                self.sidecar_hits += 1
+                self._cache_put(digest, document)
+                return digest, document
+
+        # Cold path: fetch the object itself (legacy rows have no hash yet)
+        self.misses += 1
+        data = file_service.get_bytes(object_name)
+        digest = digest or content_hash(data)
+        return digest, self._extract_and_store(digest, data, content_type)
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "sidecar_hits": self.sidecar_hits,
+                "misses": self.misses,
+                "cached_documents": len(self._cache),
+                "cached_chars": self._cached_chars,
+                "pending": len(self._pending),
+            }
+
+# Global extraction service instance
+extraction_service = ExtractionService()
@@ -0,0 +1,176 @@
+"""
+FileIndex - Chunked retrieval over extracted file text
+
+Documents are split into overlapping chunks that remember their pages,
+embedded with a hashing vectorizer (no model download, pure numpy) and
+stored in the file_chunks table keyed by content hash. Searches score the
+query against a cached in-memory matrix per document.
+"""
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+import os
+import re
+import threading
+import zlib
+
+import numpy as np
+from sqlalchemy.exc import IntegrityError
+
+from database import SessionLocal
+from models import FileChunk
+
+EMBEDDING_DIM = int(os.getenv("FILE_INDEX_DIM", "1024"))
+CHUNK_CHARS = int(os.getenv("FILE_INDEX_CHUNK_CHARS", "1200"))
+CHUNK_OVERLAP_CHARS = int(os.getenv("FILE_INDEX_OVERLAP_CHARS", "200"))
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Row stored for documents without any text, so they count as indexed
+EMPTY_MARKER_INDEX = -1
+
+
+def chunk_document(document: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Split extracted pages into overlapping chunks that keep their page numbers"""
+    chunks: List[Dict[str, Any]] = []
+    for page_num, page_text in enumerate(document["pages"], start=1):
+        text = " ".join(page_text.split())
+        if not text:
+            continue
+        start = 0
+        while start < len(text):
+            end = min(start + CHUNK_CHARS, len(text))
+            if end < len(text):
+                # Prefer to cut at a sentence or word boundary
+                boundary = max(text.rfind(". ", start, end), text.rfind(" ", start, end))
+                if boundary > start + CHUNK_CHARS // 2:
+                    end = boundary + 1
+            chunks.append({"page": page_num, "text": text[start:end].strip()})
+            if end >= len(text):
+                break
+            start = max(end - CHUNK_OVERLAP_CHARS, start + 1)
+    return chunks
+
+
+def _features(text: str) -> List[str]:
+    words = TOKEN_RE.findall(text.lower())
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def embed(texts: List[str], dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """Hashing-vectorizer embeddings (unigrams + bigrams, sublinear tf, L2-normalized)"""
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, text in enumerate(texts):
+        for feature in _features(text):
+            # crc32 is stable across processes, unlike hash()
+            digest = zlib.crc32(feature.encode("utf-8"))
+            sign = 1.0 if digest & 0x80000000 else -1.0
+            matrix[row, digest % dim] += sign
+    matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def search_chunks(matrix: np.ndarray, chunks: List[Dict[str, Any]], query: str, k: int) -> List[Dict[str, Any]]:
+    """Top-k chunks by cosine similarity to the query"""
+    if not chunks:
+        return []
+    scores = matrix @ embed([query], matrix.shape[1])[0]
+    k = min(k, len(chunks))
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    return [{**chunks[i], "score": float(scores[i])} for i in top]
+
+
+class FileIndex:
+    def __init__(self):
+        self.max_cached_documents = int(os.getenv("FILE_INDEX_CACHE_SIZE", "64"))
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def is_indexed(self, digest: str) -> bool:
+        """Whether chunks for this content hash are stored"""
+        db = SessionLocal()
+        try:
+            return db.query(FileChunk.id).filter(FileChunk.content_hash == digest).first() is not None
+        finally:
+            db.close()
+
+    def build(self, digest: str, document: Dict[str, Any]) -> int:
+        """Chunk, embed and store a document once per content hash"""
+        chunks = chunk_document(document)
+        matrix = embed([chunk["text"] for chunk in chunks]) if chunks else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+        db = SessionLocal()
+        try:
+            if db.query(FileChunk.id).filter(FileChunk.content_hash == digest).first() is not None:
+                return 0
+            if chunks:
+                db.add_all([
+                    FileChunk(
+                        content_hash=digest,
+                        chunk_index=index,
+                        page=chunk["page"],
+                        text=chunk["text"],
+                        embedding=matrix[index].tobytes(),
+                    )
+                    for index, chunk in enumerate(chunks)
+                ])
+            else:
+                db.add(FileChunk(content_hash=digest, chunk_index=EMPTY_MARKER_INDEX, text="", embedding=b""))
+            db.commit()
+        except IntegrityError:
+            # Another worker indexed the same content concurrently
+            db.rollback()
+            print(f"ℹ️ Index for {digest[:12]} was stored by another worker")
+            return 0
+        except Exception as e:
+            db.rollback()
+            print(f"❌ Failed to store index for {digest[:12]}: {e}")
+            raise
+        finally:
+            db.close()
+        self._remember(digest, matrix, chunks)
+        return len(chunks)
+
+    def _remember(self, digest: str, matrix: np.ndarray, chunks: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._cache[digest] = (matrix, chunks)
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.max_cached_documents:
+                self._cache.popitem(last=False)
+
+    def _load(self, digest: str) -> Optional[tuple]:
+        with self._lock:
+            entry = self._cache.get(digest)
+            if entry is not None:
+                self._cache.move_to_end(digest)
+                return entry
+        db = SessionLocal()
+        try:
+            rows = db.query(FileChunk).filter(
+                FileChunk.content_hash == digest
+            ).order_by(FileChunk.chunk_index).all()
+        finally:
+            db.close()
+        if not rows:
+            return None
+        rows = [row for row in rows if row.chunk_index != EMPTY_MARKER_INDEX]
+        if not rows:
+            matrix = np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+            self._remember(digest, matrix, [])
+            return matrix, []
+        matrix = np.vstack([np.frombuffer(row.embedding, dtype=np.float32) for row in rows])
+        chunks = [{"page": row.page, "text": row.text} for row in rows]
+        self._remember(digest, matrix, chunks)
+        return matrix, chunks
+
+    def search(self, digest: str, query: str, k: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Top-k passages of an indexed document, or None if it is not indexed"""
+        entry = self._load(digest)
+        if entry is None:
+            return None
+        matrix, chunks = entry
+        return search_chunks(matrix, chunks, query, k)
+
+# Global file index instance
+file_index = FileIndex()
@@ -1,9 +1,110 @@
+import asyncio
+import hashlib
+import io
 import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import urllib3
 from minio import Minio
+from minio.commonconfig import CopySource
+from minio.datatypes import PostPolicy
 from minio.error import S3Error
-from typing import Optional, BinaryIO
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Iterator, Optional, BinaryIO, Tuple
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
+
+from database import SessionLocal
+from models import FileBlob, File as FileModel
+
+try:
+    import magic
+except ImportError:  # libmagic missing - fall back to a few well-known signatures
+    magic = None
+
+# Multipart part size for streamed uploads (MinIO minimum is 5 MiB); bounds memory per upload
+UPLOAD_PART_SIZE = int(os.getenv("MINIO_UPLOAD_PART_SIZE", str(8 * 1024 * 1024)))
+
+# Uploads land under a temporary key until their hash is known
+STAGING_PREFIX = "staging/"
+# Content-addressed objects, shared by every file row with the same bytes
+BLOB_PREFIX = "sha256/"
+
+
+# Leading bytes read to sniff the real type of a direct upload
+SNIFF_BYTES = 4096
+
+_SIGNATURES = (
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"Rar!\x1a\x07", "application/x-rar-compressed"),
+    (b"\xd0\xcf\x11\xe0", "application/msword"),
+)
+
+
+def sniff_content_type(head: bytes) -> str:
+    """Best guess of a file's type from its first bytes"""
+    if magic is not None:
+        return magic.from_buffer(head, mime=True)
+    for signature, content_type in _SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    if head.startswith(b"RIFF") and head[8:12] == b"WEBP":
+        return "image/webp"
+    try:
+        head.decode("utf-8")
+        return "text/plain"
+    except UnicodeDecodeError:
+        return "application/octet-stream"
+
+
+def content_type_matches(declared: str, sniffed: str) -> bool:
+    """Whether sniffed bytes are plausible for the declared content type"""
+    if declared == sniffed:
+        return True
+    # Text formats are indistinguishable by magic; OOXML documents are zip files
+    if declared.startswith("text/") and sniffed.startswith("text/"):
+        return True
+    if declared == "application/vnd.openxmlformats-officedocument.wordprocessingml.document":
+        return sniffed in ("application/zip", "application/octet-stream")
+    if declared == "application/msword":
+        return sniffed in ("application/x-ole-storage", "application/CDFV2")
+    return False
+
+
+class FileTooLargeError(Exception):
+    """Raised when an upload stream exceeds the allowed size"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"File too large. Maximum size is {max_size // (1024 * 1024)}MB")
+        self.max_size = max_size
+
+
+class _HashingReader:
+    """File-like wrapper that hashes and counts bytes as MinIO reads them"""
+
+    def __init__(self, stream: BinaryIO, max_size: Optional[int] = None):
+        self.stream = stream
+        self.max_size = max_size
+        self.size = 0
+        self.sha256 = hashlib.sha256()
+
+    def read(self, size: int = -1) -> bytes:
+        chunk = self.stream.read(size)
+        self.size += len(chunk)
+        if self.max_size is not None and self.size > self.max_size:
+            # Aborts the multipart upload before the rest is read
+            raise FileTooLargeError(self.max_size)
+        self.sha256.update(chunk)
+        return chunk
+
 
 class FileService:
     def __init__(self):
@@ -12,18 +113,47 @@ class FileService:
         self.access_key = os.getenv('MINIO_ACCESS_KEY', 'minioadmin')
         self.secret_key = os.getenv('MINIO_SECRET_KEY', 'minioadmin123')
         self.secure = os.getenv('MINIO_SECURE', 'false').lower() == 'true'
+        # Host browsers use for direct uploads (MINIO_ENDPOINT is often a container
+        # name); unset disables direct uploads and clients use /user/upload
+        self.public_endpoint = os.getenv('MINIO_PUBLIC_ENDPOINT')
+        self.public_secure = os.getenv('MINIO_PUBLIC_SECURE', str(self.secure)).lower() == 'true'
         
-        # Initialize MinIO client
+        # Initialize MinIO client; its pool is shared by every reader and uploader in the process
         self.client = Minio(
             self.endpoint,
             access_key=self.access_key,
             secret_key=self.secret_key,
-            secure=self.secure
+            secure=self.secure,
+            http_client=urllib3.PoolManager(
+                maxsize=int(os.getenv('MINIO_POOL_SIZE', '16')),
+                timeout=urllib3.Timeout(connect=5.0, read=float(os.getenv('MINIO_READ_TIMEOUT', '60'))),
+                retries=urllib3.Retry(total=3, backoff_factor=0.2, status_forcelist=[500, 502, 503, 504])
+            )
         )
         
-        # Bucket name for chat files
+        # Presigned download URLs, reused until they get close to expiry
+        self.url_cache_size = int(os.getenv('DOWNLOAD_URL_CACHE_SIZE', '1024'))
+        self._url_lock = threading.Lock()
+        self._url_cache: "OrderedDict[Tuple[str, Optional[str], int], Tuple[str, datetime]]" = OrderedDict()
+        self.url_cache_hits = 0
+        self.url_cache_misses = 0
+        
+        # Bucket name for chat files; checked in connect(), not at import
         self.bucket_name = 'chat-files'
-        self._ensure_bucket_exists()
+        self._connect_lock = threading.Lock()
+        self._connected = False
+        
+        # Presigned uploads that are never finalized are swept once they are this old
+        self.staging_max_age = timedelta(hours=float(os.getenv('STAGING_MAX_AGE_HOURS', '24')))
+        self.staging_sweep_interval = int(os.getenv('STAGING_SWEEP_INTERVAL_SECONDS', '3600'))
+        self._sweep_task: Optional[asyncio.Task] = None
+    
+    def connect(self) -> None:
+        """Make sure the bucket exists; called once from the app's lifespan hook"""
+        with self._connect_lock:
+            if not self._connected:
+                self._ensure_bucket_exists()
+                self._connected = True
     
     def _ensure_bucket_exists(self):
         """Create bucket if it doesn't exist"""
@@ -37,25 +167,26 @@ class FileService:
             print(f"Warning: Could not connect to MinIO or create bucket '{self.bucket_name}': {e}")
             print("The application will start, but file operations may fail until MinIO is available.")
     
-    def upload_file(self, file_data: BinaryIO, filename: str, content_type: str) -> dict:
-        """Upload file to MinIO and return file info"""
+    def upload_file(self, file_data: BinaryIO, filename: str, content_type: str, max_size: Optional[int] = None) -> dict:
+        """Stream a file to MinIO as a multipart upload and return file info.
+
+        The stream is read one part at a time, so memory stays bounded by the
+        part size; the SHA-256 and size are computed on the way through.
+        Blocking - call from a worker thread in async code.
+        """
         try:
-            # Generate unique object name
+            # Generate unique staging object name
             file_id = str(uuid.uuid4())
             file_extension = os.path.splitext(filename)[1]
-            object_name = f"{file_id}{file_extension}"
+            object_name = f"{STAGING_PREFIX}{file_id}{file_extension}"
             
-            # Get file size
-            file_data.seek(0, 2)  # Seek to end
-            file_size = file_data.tell()
-            file_data.seek(0)  # Reset to beginning
-            
-            # Upload file
+            reader = _HashingReader(file_data, max_size)
             self.client.put_object(
                 self.bucket_name,
                 object_name,
-                file_data,
-                file_size,
+                reader,
+                length=-1,
+                part_size=UPLOAD_PART_SIZE,
                 content_type=content_type
             )
             
@@ -63,7 +194,8 @@ class FileService:
                 'file_id': file_id,
                 'filename': filename,
                 'object_name': object_name,
-                'file_size': file_size,
+                'file_size': reader.size,
+                'content_hash': reader.sha256.hexdigest(),
                 'content_type': content_type,
                 'bucket_name': self.bucket_name,
                 'uploaded_at': datetime.utcnow().isoformat()
@@ -73,20 +205,326 @@ class FileService:
             print(f"Error uploading file: {e}")
             raise Exception(f"Failed to upload file: {str(e)}")
     
-    def get_download_url(self, object_name: str, expires_in_seconds: int = 3600) -> str:
-        """Generate presigned URL for file download"""
+    async def store_upload(
+        self,
+        db: AsyncSession,
+        file_data: BinaryIO,
+        filename: str,
+        content_type: str,
+        max_size: Optional[int] = None
+    ) -> dict:
+        """Upload a file once per content hash and take a reference on its blob.
+
+        The blob row stays locked until the caller commits the transaction
+        that creates the file row, so the reference and the row land together.
+        """
+        file_info = await asyncio.to_thread(self.upload_file, file_data, filename, content_type, max_size)
+        staged_name = file_info['object_name']
+        try:
+            blob = await self._lock_blob(db, file_info['content_hash'], file_info['file_size'])
+            if blob.ref_count == 0:
+                # First reference - move the staged upload to its content address
+                await asyncio.to_thread(self._promote, staged_name, blob.object_name)
+                file_info['deduplicated'] = False
+            else:
+                await asyncio.to_thread(self.delete_file, staged_name)
+                file_info['deduplicated'] = True
+            blob.ref_count += 1
+            file_info['object_name'] = blob.object_name
+            return file_info
+        except Exception:
+            await db.rollback()
+            await asyncio.to_thread(self.delete_file, staged_name)
+            raise
+
+    async def release_upload(self, db: AsyncSession, object_name: str, content_hash: Optional[str]) -> bool:
+        """Drop one reference to a file's object inside the caller's transaction.
+
+        Nothing is removed from storage here, so a failed commit leaves the
+        object in place. Returns True when the object may now be unreferenced;
+        the caller then commits and calls purge_released.
+        """
+        if not content_hash or not object_name.startswith(BLOB_PREFIX):
+            # Files stored before deduplication own their object outright
+            return True
+
+        result = await db.execute(
+            select(FileBlob).where(FileBlob.content_hash == content_hash).with_for_update()
+        )
+        blob = result.scalar_one_or_none()
+        if blob is None:
+            return False
+        blob.ref_count = max(blob.ref_count - 1, 0)
+        return blob.ref_count == 0
+
+    async def purge_released(self, db: AsyncSession, object_name: str, content_hash: Optional[str]) -> None:
+        """Remove an object released by a committed delete, unless it was referenced again since.
+
+        A blob left at zero references (e.g. when MinIO was unreachable) is
+        reused by the next upload of the same content.
+        """
+        if not content_hash or not object_name.startswith(BLOB_PREFIX):
+            if not await asyncio.to_thread(self.delete_file, object_name):
+                print(f"⚠️ Could not remove released object {object_name}")
+            return
+
+        result = await db.execute(
+            select(FileBlob).where(FileBlob.content_hash == content_hash).with_for_update()
+        )
+        blob = result.scalar_one_or_none()
+        if blob is None or blob.ref_count > 0:
+            await db.rollback()
+            return
+        # Removed while the blob row is locked, so a concurrent upload waits and re-creates it
+        if await asyncio.to_thread(self.delete_file, blob.object_name):
+            await db.delete(blob)
+            await db.commit()
+        else:
+            await db.rollback()
+            print(f"⚠️ Could not remove released object {blob.object_name}")
+
+    async def _lock_blob(self, db: AsyncSession, content_hash: str, file_size: int) -> FileBlob:
+        """Get-or-create the blob row for a hash and lock it for this transaction"""
+        for _ in range(3):
+            await db.execute(
+                pg_insert(FileBlob).values(
+                    content_hash=content_hash,
+                    object_name=f"{BLOB_PREFIX}{content_hash}",
+                    file_size=file_size,
+                    ref_count=0,
+                    created_at=datetime.utcnow()
+                ).on_conflict_do_nothing(index_elements=["content_hash"])
+            )
+            result = await db.execute(
+                select(FileBlob).where(FileBlob.content_hash == content_hash).with_for_update()
+            )
+            blob = result.scalar_one_or_none()
+            # None only if the last reference was released between the two statements
+            if blob is not None:
+                return blob
+        raise Exception("Could not reserve storage for file")
+
+    @property
+    def direct_uploads_enabled(self) -> bool:
+        return bool(self.public_endpoint)
+
+    def create_upload_policy(self, filename: str, content_type: str, max_size: int, expires_in_seconds: int = 900) -> dict:
+        """Presigned POST policy for uploading one file straight to MinIO.
+
+        The policy pins the object key and content type and caps the size, so
+        the client cannot write anything else with it. The signature covers
+        the policy, not the host, so the form can be posted to the public
+        endpoint. The bucket must allow cross-origin POSTs from the UI
+        (MinIO's MINIO_API_CORS_ALLOW_ORIGIN, or a bucket CORS rule on S3).
+        """
+        file_extension = os.path.splitext(filename)[1]
+        object_name = f"{STAGING_PREFIX}{uuid.uuid4()}{file_extension}"
+        expires_at = datetime.utcnow() + timedelta(seconds=expires_in_seconds)
+        
+        policy = PostPolicy(self.bucket_name, expires_at)
+        policy.add_equals_condition("key", object_name)
+        policy.add_equals_condition("Content-Type", content_type)
+        policy.add_content_length_range_condition(1, max_size)
+        try:
+            form_data = self.client.presigned_post_policy(policy)
+        except S3Error as e:
+            print(f"Error creating upload policy: {e}")
+            raise Exception(f"Failed to create upload policy: {str(e)}")
+        
+        upload_url = f"{'https' if self.public_secure else 'http'}://{self.public_endpoint}/{self.bucket_name}"
+        return {
+            'upload_url': upload_url,
+            'fields': {**form_data, 'key': object_name, 'Content-Type': content_type},
+            'object_name': object_name,
+            'expires_at': expires_at.isoformat()
+        }
+
+    def inspect_staged(self, object_name: str) -> dict:
+        """Size and sniffed content type of an object uploaded directly by a client"""
+        stat = self.client.stat_object(self.bucket_name, object_name)
+        with self.open_object(object_name, length=SNIFF_BYTES) as reader:
+            head = reader.read()
+        return {'file_size': stat.size, 'sniffed_type': sniff_content_type(head)}
+
+    def hash_object(self, object_name: str) -> str:
+        """SHA-256 of a stored object, streamed part by part"""
+        sha256 = hashlib.sha256()
+        with self.open_object(object_name) as reader:
+            for chunk in reader.stream(UPLOAD_PART_SIZE):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    async def adopt_staged(self, db: AsyncSession, file_id: int) -> Optional[FileModel]:
+        """Hash a directly uploaded file and move it into content-addressed storage"""
+        file_record = await db.get(FileModel, file_id)
+        if file_record is None or not file_record.object_name.startswith(STAGING_PREFIX):
+            return file_record
+        staged_name = file_record.object_name
+        content_hash = await asyncio.to_thread(self.hash_object, staged_name)
+        
+        # Lock the row and re-check, so a concurrent adopt cannot take a second reference
+        result = await db.execute(
+            select(FileModel).where(FileModel.id == file_id).with_for_update().execution_options(populate_existing=True)
+        )
+        file_record = result.scalar_one_or_none()
+        if file_record is None or file_record.object_name != staged_name:
+            await db.rollback()
+            return file_record
+        
+        blob = await self._lock_blob(db, content_hash, file_record.file_size)
+        if blob.ref_count == 0:
+            await asyncio.to_thread(self._promote, staged_name, blob.object_name)
+        blob.ref_count += 1
+        file_record.object_name = blob.object_name
+        file_record.content_hash = content_hash
+        await db.commit()
+        if blob.ref_count > 1:
+            # Duplicate of an earlier upload - the row no longer points at the staged copy
+            await asyncio.to_thread(self.delete_file, staged_name)
+        return file_record
+
+    def sweep_staging(self) -> int:
+        """Delete staged uploads older than staging_max_age that no file row points at"""
+        cutoff = datetime.utcnow() - self.staging_max_age
+        stale = [
+            obj.object_name
+            for obj in self.client.list_objects(self.bucket_name, prefix=STAGING_PREFIX, recursive=True)
+            if obj.last_modified is not None and obj.last_modified.replace(tzinfo=None) < cutoff
+        ]
+        if not stale:
+            return 0
+        
+        # A finalized upload waiting to be adopted still points at its staged object
+        db = SessionLocal()
+        try:
+            referenced = {
+                row.object_name
+                for row in db.query(FileModel.object_name).filter(FileModel.object_name.in_(stale))
+            }
+        finally:
+            db.close()
+        
+        removed = 0
+        for object_name in stale:
+            if object_name not in referenced and self.delete_file(object_name):
+                removed += 1
+        return removed
+
+    async def run_sweep_loop(self):
+        """Periodically sweep abandoned staged uploads without blocking the event loop"""
+        while True:
+            try:
+                removed = await asyncio.to_thread(self.sweep_staging)
+                if removed:
+                    print(f"🧹 Removed {removed} abandoned staged uploads")
+            except Exception as e:
+                print(f"⚠️ Staged upload sweep failed: {e}")
+            await asyncio.sleep(self.staging_sweep_interval)
+
+    def start_staging_sweep(self):
+        """Start the background staging sweep once per process"""
+        if self.staging_sweep_interval <= 0 or self._sweep_task is not None:
+            return
+        self._sweep_task = asyncio.create_task(self.run_sweep_loop())
+
+    async def stop_staging_sweep(self):
+        """Cancel the background staging sweep"""
+        if self._sweep_task is None:
+            return
+        self._sweep_task.cancel()
+        try:
+            await self._sweep_task
+        except asyncio.CancelledError:
+            pass
+        self._sweep_task = None
+
+    def _promote(self, staged_name: str, object_name: str) -> None:
+        """Server-side copy of a staged upload to its final key"""
+        self.client.copy_object(self.bucket_name, object_name, CopySource(self.bucket_name, staged_name))
+        self.client.remove_object(self.bucket_name, staged_name)
+
+    def get_download_url(self, object_name: str, expires_in_seconds: int = 3600, filename: Optional[str] = None) -> str:
+        """Presigned download URL, reused while more than half of its lifetime is left"""
+        key = (object_name, filename, expires_in_seconds)
+        now = datetime.utcnow()
+        with self._url_lock:
+            cached = self._url_cache.get(key)
+            if cached is not None and cached[1] - now > timedelta(seconds=expires_in_seconds / 2):
+                self._url_cache.move_to_end(key)
+                self.url_cache_hits += 1
+                return cached[0]
+            self.url_cache_misses += 1
+        
+        url = self._sign_download_url(object_name, expires_in_seconds, filename)
+        with self._url_lock:
+            self._url_cache[key] = (url, now + timedelta(seconds=expires_in_seconds))
+            self._url_cache.move_to_end(key)
+            while len(self._url_cache) > self.url_cache_size:
+                self._url_cache.popitem(last=False)
+        return url
+
+    def _forget_download_urls(self, object_name: str) -> None:
+        with self._url_lock:
+            for key in [key for key in self._url_cache if key[0] == object_name]:
+                del self._url_cache[key]
+
+    def _sign_download_url(self, object_name: str, expires_in_seconds: int, filename: Optional[str]) -> str:
         try:
+            # Content-addressed keys carry no name, so let the download set one
+            response_headers = None
+            if filename:
+                safe_name = filename.replace('"', '')
+                response_headers = {"response-content-disposition": f'attachment; filename="{safe_name}"'}
             return self.client.presigned_get_object(
                 self.bucket_name,
                 object_name,
-                expires=expires_in_seconds
+                expires=timedelta(seconds=expires_in_seconds),
+                response_headers=response_headers
             )
         except S3Error as e:
             print(f"Error generating download URL: {e}")
             raise Exception(f"Failed to generate download URL: {str(e)}")
     
+    def put_bytes(self, object_name: str, data: bytes, content_type: str = "application/octet-stream") -> None:
+        """Store an in-memory payload under an explicit object name"""
+        try:
+            self.client.put_object(
+                self.bucket_name,
+                object_name,
+                io.BytesIO(data),
+                len(data),
+                content_type=content_type
+            )
+        except S3Error as e:
+            print(f"Error storing object: {e}")
+            raise Exception(f"Failed to store object: {str(e)}")
+
+    @contextmanager
+    def open_object(self, object_name: str, offset: int = 0, length: int = 0) -> Iterator[BinaryIO]:
+        """Streaming reader over an object, or over `length` bytes from `offset` (0 = to the end).
+
+        Reads go through the pooled MinIO client; the connection is returned
+        to the pool when the block exits. Use .read(n) or .stream(chunk_size).
+        """
+        try:
+            response = self.client.get_object(self.bucket_name, object_name, offset=offset, length=length)
+        except S3Error as e:
+            print(f"Error reading object: {e}")
+            raise Exception(f"Failed to read object: {str(e)}")
+        try:
+            yield response
+        finally:
+            response.close()
+            response.release_conn()
+
+    def get_bytes(self, object_name: str, offset: int = 0, length: int = 0) -> bytes:
+        """Read an object, or a byte range of it, into memory"""
+        with self.open_object(object_name, offset, length) as reader:
+            return reader.read()
+
     def delete_file(self, object_name: str) -> bool:
         """Delete file from MinIO"""
+        self._forget_download_urls(object_name)
         try:
             self.client.remove_object(self.bucket_name, object_name)
             return True
@@ -94,6 +532,15 @@ class FileService:
             print(f"Error deleting file: {e}")
             return False
 
+    def stats(self) -> dict:
+        """Download URL cache counters"""
+        with self._url_lock:
+            return {
+                "download_url_cache_hits": self.url_cache_hits,
+                "download_url_cache_misses": self.url_cache_misses,
+                "cached_download_urls": len(self._url_cache),
+            }
+
 # Global file service instance
 file_service = FileService()
 
@@ -0,0 +1,296 @@
+"""
+GmailCredentialStore - Per-user Gmail OAuth tokens and cached Gmail API clients
+
+Tokens live encrypted (Fernet) in the gmail_credentials table, one row per
+user. Built Gmail service objects are kept in an LRU so a chat turn does not
+rebuild the API client; they are built from the discovery document bundled
+with google-api-python-client, so building never hits the network.
+
+httplib2 connections are not thread-safe, so services are cached per
+(user, thread) while the credentials object is shared per user. Refreshes
+happen under a per-user lock and the new token is written back, so
+concurrent tool calls refresh once instead of racing.
+"""
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import base64
+import hashlib
+import json
+import os
+import threading
+
+from database import SessionLocal
+from models import GmailCredential
+
+GMAIL_SCOPES = [
+    'https://www.googleapis.com/auth/gmail.readonly',
+    'https://www.googleapis.com/auth/gmail.send',
+    'https://www.googleapis.com/auth/gmail.modify'
+]
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+
+# Refresh this long before Google's expiry so a token never lapses mid-call
+REFRESH_MARGIN = timedelta(minutes=5)
+
+# Single-mailbox token file written by the old GmailTool, relative to the working directory
+LEGACY_TOKEN_FILE = "gmail_token.json"
+
+
+def _fernet_keys() -> List[bytes]:
+    """GMAIL_TOKEN_KEYS is a comma-separated list of Fernet keys, newest first.
+
+    Older keys still decrypt, so keys can be rotated; without it a key is
+    derived from SECRET_KEY.
+    """
+    configured = [key.strip() for key in os.getenv("GMAIL_TOKEN_KEYS", "").split(",") if key.strip()]
+    if configured:
+        return [key.encode() for key in configured]
+    print("⚠️  GMAIL_TOKEN_KEYS not set; deriving the Gmail token key from SECRET_KEY")
+    secret = os.getenv("SECRET_KEY", "your-secret-key-change-in-production")
+    return [base64.urlsafe_b64encode(hashlib.sha256(secret.encode()).digest())]
+
+
+def _is_revoked_grant(error: Exception) -> bool:
+    """Whether a RefreshError means the refresh token itself is dead (invalid_grant)"""
+    if getattr(error, "retryable", False):
+        return False
+    response = error.args[1] if len(error.args) > 1 else None
+    if isinstance(response, dict):
+        return response.get("error") == "invalid_grant"
+    return "invalid_grant" in str(error)
+
+
+class GmailCredentialStore:
+    """Encrypted per-user token store with an LRU of built Gmail services"""
+
+    def __init__(self, max_services: int = 256):
+        self.max_services = max_services
+        self.client_id = os.getenv("GMAIL_CLIENT_ID") or os.getenv("GOOGLE_CLIENT_ID")
+        self.client_secret = os.getenv("GMAIL_CLIENT_SECRET") or os.getenv("GOOGLE_CLIENT_SECRET")
+        self._fernet = None
+        self._lock = threading.Lock()
+        self._user_locks: Dict[int, threading.Lock] = {}
+        self._credentials: "OrderedDict[int, Any]" = OrderedDict()
+        self._services: "OrderedDict[Tuple[int, int], Tuple[Any, Any]]" = OrderedDict()
+        self.hits = 0
+        self.builds = 0
+        self.refreshes = 0
+
+    @property
+    def configured(self) -> bool:
+        return bool(self.client_id and self.client_secret)
+
+    def _cipher(self):
+        if self._fernet is None:
+            from cryptography.fernet import Fernet, MultiFernet
+            self._fernet = MultiFernet([Fernet(key) for key in _fernet_keys()])
+        return self._fernet
+
+    def _user_lock(self, user_id: int) -> threading.Lock:
+        with self._lock:
+            return self._user_locks.setdefault(user_id, threading.Lock())
+
+    def save(self, user_id: int, token: Dict[str, Any], email: Optional[str] = None) -> None:
+        """Store a user's token (access_token, refresh_token, expires_at, scope) and drop cached clients"""
+        payload = {
+            "token": token.get("access_token") or token.get("token"),
+            "refresh_token": token.get("refresh_token"),
+            "expiry": token.get("expiry"),
+            "scopes": token.get("scopes") or (token.get("scope") or "").split() or GMAIL_SCOPES,
+        }
+        if payload["expiry"] is None and token.get("expires_at"):
+            payload["expiry"] = datetime.utcfromtimestamp(token["expires_at"]).isoformat()
+
+        db = SessionLocal()
+        try:
+            row = db.query(GmailCredential).filter(GmailCredential.user_id == user_id).first()
+            if row is None:
+                row = GmailCredential(user_id=user_id)
+                db.add(row)
+            elif not payload["refresh_token"]:
+                # Google only returns a refresh token on first consent; keep the stored one
+                payload["refresh_token"] = json.loads(self._cipher().decrypt(row.token_encrypted))["refresh_token"]
+            row.token_encrypted = self._cipher().encrypt(json.dumps(payload).encode())
+            row.scopes = payload["scopes"]
+            if email:
+                row.email = email
+            db.commit()
+        finally:
+            db.close()
+        self.invalidate(user_id)
+
+    def delete(self, user_id: int) -> bool:
+        """Forget a user's Gmail connection"""
+        db = SessionLocal()
+        try:
+            deleted = db.query(GmailCredential).filter(GmailCredential.user_id == user_id).delete()
+            db.commit()
+        finally:
+            db.close()
+        self.invalidate(user_id)
+        return bool(deleted)
+
+    def import_legacy_token(self, path: str = LEGACY_TOKEN_FILE) -> bool:
+        """Move the old shared gmail_token.json into the store for one user.
+
+        GMAIL_LEGACY_TOKEN_USER_ID names the user who owns the mailbox; without
+        it the file is left in place and a notice is printed, since the Gmail
+        tool no longer reads it.
+        """
+        if not os.path.exists(path):
+            return False
+        user_id = os.getenv("GMAIL_LEGACY_TOKEN_USER_ID", "")
+        if not user_id.isdigit():
+            print(f"⚠️  {path} is no longer used: each user now connects Gmail from the sidebar. "
+                  f"Set GMAIL_LEGACY_TOKEN_USER_ID to import it for the user who owns that mailbox.")
+            return False
+        with open(path) as f:
+            token = json.load(f)
+        if token.get("expiry"):
+            # google-auth writes "...Z"; the store keeps naive UTC
+            token["expiry"] = token["expiry"].rstrip("Z")
+        self.save(int(user_id), token)
+        os.replace(path, f"{path}.imported")
+        print(f"✅ Imported {path} as user {user_id}'s Gmail connection")
+        return True
+
+    def status(self, user_id: int) -> Optional[Dict[str, Any]]:
+        """Connected account details, or None when the user has not connected Gmail"""
+        db = SessionLocal()
+        try:
+            row = db.query(GmailCredential).filter(GmailCredential.user_id == user_id).first()
+            if row is None:
+                return None
+            return {"email": row.email, "scopes": row.scopes, "connected_at": row.created_at, "updated_at": row.updated_at}
+        finally:
+            db.close()
+
+    def get_credentials(self, user_id: int):
+        """The user's google Credentials, refreshed if close to expiry; None if not connected"""
+        with self._user_lock(user_id):
+            with self._lock:
+                credentials = self._credentials.get(user_id)
+                if credentials is not None:
+                    self._credentials.move_to_end(user_id)
+            if credentials is None:
+                credentials = self._load(user_id)
+                if credentials is None:
+                    return None
+            if credentials.expiry is None or credentials.expiry - REFRESH_MARGIN <= datetime.utcnow():
+                credentials = self._refresh(user_id, credentials)
+                if credentials is None:
+                    return None
+            with self._lock:
+                self._credentials[user_id] = credentials
+                self._credentials.move_to_end(user_id)
+                while len(self._credentials) > self.max_services:
+                    self._credentials.popitem(last=False)
+            return credentials
+
+    def get_service(self, user_id: int):
+        """A Gmail API client for the user, reused per (user, thread); None if not connected"""
+        credentials = self.get_credentials(user_id)
+        if credentials is None:
+            return None
+        key = (user_id, threading.get_ident())
+        with self._lock:
+            entry = self._services.get(key)
+            # A reconnect or a refresh that replaced the credentials object invalidates the client
+            if entry is not None and entry[1] is credentials:
+                self._services.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        from googleapiclient.discovery import build
+        service = build('gmail', 'v1', credentials=credentials, static_discovery=True, cache_discovery=False)
+        with self._lock:
+            self.builds += 1
+            self._services[key] = (service, credentials)
+            while len(self._services) > self.max_services:
+                self._services.popitem(last=False)
+        return service
+
+    def new_http(self, user_id: int):
+        """A separate authorized HTTP connection, for batches run on worker threads"""
+        credentials = self.get_credentials(user_id)
+        if credentials is None:
+            return None
+        import httplib2
+        from google_auth_httplib2 import AuthorizedHttp
+        return AuthorizedHttp(credentials, http=httplib2.Http())
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's cached credentials and clients.
+
+        Pooled GmailTool instances look credentials up here by user id, so a
+        refresh needs nothing else; connect and disconnect also call
+        agno_team_service.evict_user to drop the user's toolkits and Teams.
+        """
+        with self._lock:
+            self._credentials.pop(user_id, None)
+            for key in [key for key in self._services if key[0] == user_id]:
+                del self._services[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "builds": self.builds,
+                "refreshes": self.refreshes,
+                "cached_users": len(self._credentials),
+                "cached_services": len(self._services),
+            }
+
+    def _load(self, user_id: int):
+        # Caller must hold the user's lock
+        db = SessionLocal()
+        try:
+            row = db.query(GmailCredential).filter(GmailCredential.user_id == user_id).first()
+            token_encrypted = row.token_encrypted if row else None
+        finally:
+            db.close()
+        if token_encrypted is None:
+            return None
+
+        from google.oauth2.credentials import Credentials
+        payload = json.loads(self._cipher().decrypt(token_encrypted))
+        return Credentials(
+            token=payload["token"],
+            refresh_token=payload["refresh_token"],
+            token_uri=TOKEN_URI,
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            scopes=payload["scopes"],
+            expiry=datetime.fromisoformat(payload["expiry"]) if payload.get("expiry") else None,
+        )
+
+    def _refresh(self, user_id: int, credentials):
+        # Caller must hold the user's lock
+        from google.auth.exceptions import RefreshError
+        from google.auth.transport.requests import Request
+        try:
+            credentials.refresh(Request())
+        except RefreshError as e:
+            if _is_revoked_grant(e):
+                # Revoked or expired grant: the user has to connect Gmail again
+                print(f"⚠️  Gmail grant revoked for user {user_id}; removing the stored token: {e}")
+                self.delete(user_id)
+            else:
+                # Token endpoint outage or client misconfiguration: keep the token and retry later
+                print(f"❌ Gmail token refresh failed for user {user_id}: {e}")
+            return None
+        self.refreshes += 1
+        self.save(user_id, {
+            "token": credentials.token,
+            "refresh_token": credentials.refresh_token,
+            "expiry": credentials.expiry.isoformat() if credentials.expiry else None,
+            "scopes": list(credentials.scopes or GMAIL_SCOPES),
+        })
+        return credentials
+
+
+# Global instance
+gmail_credential_store = GmailCredentialStore(
+    max_services=int(os.getenv("GMAIL_SERVICE_CACHE_SIZE", "256"))
+)
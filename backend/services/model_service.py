@@ -1,130 +1,198 @@
+import asyncio
 import os
-import requests
-import json
+import time
+from datetime import datetime
 from typing import Dict, List, Optional
+
+import httpx
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+# Chat models offered from the OpenAI catalog (excluding gpt-4o-2024-05-13)
+OPENAI_ALLOWED_MODELS = [
+    'gpt-5.1',
+    'gpt-5',
+    'gpt-5-mini',
+    'gpt-5-nano',
+    'gpt-5-pro',
+    'gpt-4.1',
+    'gpt-4.1-mini',
+    'gpt-4.1-nano',
+    'gpt-4o',
+    'gpt-4o-mini'
+]
+OPENAI_EXCLUDED_MODELS = ['gpt-4o-2024-05-13']
+
+PROVIDERS = {
+    'openai': {'name': 'OpenAI', 'url': 'https://api.openai.com/v1/models'},
+    'groq': {'name': 'Groq', 'url': 'https://api.groq.com/openai/v1/models'},
+}
+
+
+class CatalogEntry:
+    """Last known model list of one provider"""
+
+    def __init__(self, models: List[Dict], source: str):
+        self.models = models
+        self.source = source  # api or fallback
+        self.fetched_at = time.monotonic()
+        self.fetched_at_wall = datetime.utcnow()
+
+    def age(self) -> float:
+        return time.monotonic() - self.fetched_at
+
+
 class ModelService:
+    """Model catalog with a TTL cache and stale-while-revalidate refreshes.
+
+    Page loads never wait on a provider for longer than first_fetch_timeout:
+    a fresh entry is served as is, a stale one is served while a background
+    task refetches it, and a provider with nothing cached yet gets its
+    fallback list if the first fetch is slow.
+    """
+
     def __init__(self):
         self.openai_api_key = os.getenv('OPENAI_API_KEY')
         self.groq_api_key = os.getenv('GROQ_API_KEY')
-        
-    def get_openai_models(self) -> List[Dict]:
-        """Fetch available models from OpenAI API"""
-        if not self.openai_api_key:
-            print("Warning: OPENAI_API_KEY not found, using fallback models")
-            return self._get_openai_fallback_models()
-        
-        try:
-            headers = {
-                'Authorization': f'Bearer {self.openai_api_key}',
+        self.ttl_seconds = float(os.getenv('MODEL_CATALOG_TTL_SECONDS', '900'))
+        # Fallback lists are retried sooner than real catalogs
+        self.fallback_ttl_seconds = float(os.getenv('MODEL_CATALOG_FALLBACK_TTL_SECONDS', '60'))
+        self.first_fetch_timeout = float(os.getenv('MODEL_CATALOG_FIRST_FETCH_TIMEOUT', '2'))
+        self.request_timeout = float(os.getenv('MODEL_CATALOG_REQUEST_TIMEOUT', '10'))
+        self._entries: Dict[str, CatalogEntry] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self._client: Optional[httpx.AsyncClient] = None
+        self.hits = 0
+        self.stale_hits = 0
+        self.fallbacks_served = 0
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def _api_key(self, provider: str) -> Optional[str]:
+        return self.openai_api_key if provider == 'openai' else self.groq_api_key
+
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.request_timeout)
+        return self._client
+
+    async def _fetch(self, provider: str) -> List[Dict]:
+        """Fetch and filter one provider's model list"""
+        api_key = self._api_key(provider)
+        if not api_key:
+            raise RuntimeError(f"{provider.upper()}_API_KEY not configured")
+        response = await self._get_client().get(
+            PROVIDERS[provider]['url'],
+            headers={
+                'Authorization': f'Bearer {api_key}',
                 'Content-Type': 'application/json'
             }
-            
-            response = requests.get(
-                'https://api.openai.com/v1/models',
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                models_data = response.json()
-                available_models = []
-                
-                # Filter for specific chat models only (excluding gpt-4o-2024-05-13)
-                allowed_models = [
-                    'gpt-5.1',
-                    'gpt-5',
-                    'gpt-5-mini',
-                    'gpt-5-nano',
-                    'gpt-5-pro',
-                    'gpt-4.1',
-                    'gpt-4.1-mini',
-                    'gpt-4.1-nano',
-                    'gpt-4o',
-                    'gpt-4o-mini'
-                ]
-                
-                excluded_models = ['gpt-4o-2024-05-13']
-                
-                for model in models_data.get('data', []):
-                    model_id = model.get('id', '')
-                    # Check if model is in allowed list and not in excluded list
-                    if model_id in allowed_models and model_id not in excluded_models:
-                        available_models.append({
-                            'id': model_id,
-                            'name': self._format_model_name(model_id),
-                            'available': True,
-                            'provider': 'openai'
-                        })
-                
-                return available_models
-            else:
-                print(f"OpenAI API error: {response.status_code}")
-                return self._get_openai_fallback_models()
-                
-        except Exception as e:
-            print(f"Error fetching OpenAI models: {e}")
-            return self._get_openai_fallback_models()
-    
-    def get_groq_models(self) -> List[Dict]:
-        """Fetch available models from Groq API"""
-        if not self.groq_api_key:
-            print("Warning: GROQ_API_KEY not found, using fallback models")
-            return self._get_groq_fallback_models()
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"{PROVIDERS[provider]['name']} API error: {response.status_code}")
+        models_data = response.json()
         
+        available_models = []
+        for model in models_data.get('data', []):
+            model_id = model.get('id', '')
+            # Check if model is in allowed list and not in excluded list
+            if provider == 'openai' and (model_id not in OPENAI_ALLOWED_MODELS or model_id in OPENAI_EXCLUDED_MODELS):
+                continue
+            available_models.append({
+                'id': model_id,
+                'name': self._format_model_name(model_id),
+                'available': True,
+                'provider': provider
+            })
+        return available_models
+
+    async def _refresh(self, provider: str) -> CatalogEntry:
+        """Refetch a provider's catalog, keeping the previous list if the fetch fails"""
+        self.refreshes += 1
         try:
-            headers = {
-                'Authorization': f'Bearer {self.groq_api_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                'https://api.groq.com/openai/v1/models',
-                headers=headers,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                models_data = response.json()
-                available_models = []
-                
-                for model in models_data.get('data', []):
-                    model_id = model.get('id', '')
-                    available_models.append({
-                        'id': model_id,
-                        'name': self._format_model_name(model_id),
-                        'available': True,
-                        'provider': 'groq'
-                    })
-                
-                return available_models
-            else:
-                print(f"Groq API error: {response.status_code}")
-                return self._get_groq_fallback_models()
-                
+            entry = CatalogEntry(await self._fetch(provider), 'api')
         except Exception as e:
-            print(f"Error fetching Groq models: {e}")
-            return self._get_groq_fallback_models()
-    
-    def get_all_models(self) -> Dict[str, Dict]:
+            self.refresh_failures += 1
+            print(f"⚠️ Error fetching {PROVIDERS[provider]['name']} models: {e}")
+            previous = self._entries.get(provider)
+            if previous is not None and previous.source == 'api':
+                # Keep serving the last real catalog; retry after the fallback TTL
+                previous.fetched_at = time.monotonic() - self.ttl_seconds + self.fallback_ttl_seconds
+                return previous
+            entry = CatalogEntry(self._fallback_models(provider), 'fallback')
+        self._entries[provider] = entry
+        return entry
+
+    def _schedule_refresh(self, provider: str) -> asyncio.Task:
+        """Start a refresh unless one is already running"""
+        task = self._refreshing.get(provider)
+        if task is None or task.done():
+            task = asyncio.create_task(self._refresh(provider))
+            self._refreshing[provider] = task
+        return task
+
+    def _is_fresh(self, entry: CatalogEntry) -> bool:
+        ttl = self.ttl_seconds if entry.source == 'api' else self.fallback_ttl_seconds
+        return entry.age() < ttl
+
+    async def get_models(self, provider: str) -> List[Dict]:
+        """Model list of one provider without waiting on a slow API"""
+        entry = self._entries.get(provider)
+        if entry is not None:
+            if self._is_fresh(entry):
+                self.hits += 1
+            else:
+                self.stale_hits += 1
+                self._schedule_refresh(provider)
+            return entry.models
+        
+        # Nothing cached yet: wait briefly for the first fetch, then fall back
+        task = self._schedule_refresh(provider)
+        try:
+            return (await asyncio.wait_for(asyncio.shield(task), self.first_fetch_timeout)).models
+        except asyncio.TimeoutError:
+            self.fallbacks_served += 1
+            return self._fallback_models(provider)
+
+    async def get_all_models(self) -> Dict[str, Dict]:
         """Get all available models from all providers"""
+        providers = list(PROVIDERS)
+        model_lists = await asyncio.gather(*(self.get_models(provider) for provider in providers))
         return {
-            'openai': {
-                'name': 'OpenAI',
-                'api_key_configured': bool(self.openai_api_key),
-                'models': self.get_openai_models()
-            },
-            'groq': {
-                'name': 'Groq',
-                'api_key_configured': bool(self.groq_api_key),
-                'models': self.get_groq_models()
+            provider: {
+                'name': PROVIDERS[provider]['name'],
+                'api_key_configured': bool(self._api_key(provider)),
+                'models': models
             }
+            for provider, models in zip(providers, model_lists)
         }
-    
+
+    def get_fallback_catalog(self) -> Dict[str, Dict]:
+        """Static catalog used when everything else fails"""
+        return {
+            provider: {
+                'name': PROVIDERS[provider]['name'],
+                'api_key_configured': bool(self._api_key(provider)),
+                'models': self._fallback_models(provider)
+            }
+            for provider in PROVIDERS
+        }
+
+    def warm(self) -> None:
+        """Fetch every provider's catalog in the background"""
+        for provider in PROVIDERS:
+            self._schedule_refresh(provider)
+
+    async def aclose(self) -> None:
+        """Cancel refreshes and close the HTTP client"""
+        for task in self._refreshing.values():
+            task.cancel()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
     def _format_model_name(self, model_id: str) -> str:
         """Format model ID into a readable name"""
         name_mapping = {
@@ -174,12 +242,38 @@ class ModelService:
             {'id': 'gemma-2-9b-it', 'name': 'Gemma 2 9B IT', 'available': True, 'provider': 'groq'}
         ]
     
+    def _fallback_models(self, provider: str) -> List[Dict]:
+        if provider == 'openai':
+            return self._get_openai_fallback_models()
+        return self._get_groq_fallback_models()
+
     def validate_model(self, provider: str, model_id: str) -> bool:
-        """Validate if a model is available for a provider"""
-        all_models = self.get_all_models()
-        provider_models = all_models.get(provider, {}).get('models', [])
-        
+        """Validate if a model is available for a provider (cached catalog, no fetch)"""
+        if provider not in PROVIDERS:
+            return False
+        entry = self._entries.get(provider)
+        provider_models = entry.models if entry is not None else self._fallback_models(provider)
         return any(model['id'] == model_id for model in provider_models)
 
+    def stats(self) -> Dict:
+        """Catalog cache counters and per-provider age"""
+        return {
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "fallbacks_served": self.fallbacks_served,
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "providers": {
+                provider: {
+                    "source": entry.source,
+                    "age_seconds": round(entry.age(), 1),
+                    "fetched_at": entry.fetched_at_wall.isoformat(),
+                    "models": len(entry.models),
+                    "refreshing": provider in self._refreshing and not self._refreshing[provider].done(),
+                }
+                for provider, entry in self._entries.items()
+            },
+        }
+
 # Global instance
 model_service = ModelService()
@@ -0,0 +1,118 @@
+"""
+PasswordService - bcrypt hashing on a dedicated, bounded process pool
+
+bcrypt is deliberately slow CPU work. Running it inline in request handlers
+ties up the shared threadpool and, through the GIL, the rest of the app
+during login storms. Here it runs in worker processes with a cap on queued
+jobs; once the cap is reached callers get PasswordServiceBusy instead of
+piling up behind each other. Kept free of app imports because worker
+processes import this module on start.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+import asyncio
+import multiprocessing
+import os
+import threading
+
+import bcrypt
+
+# bcrypt cost factor for new hashes; existing hashes are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+
+
+class PasswordServiceBusy(Exception):
+    """Raised when too many hashing jobs are already queued"""
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    """Hash a password using bcrypt"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def verify_password(password: str, hashed_password: str) -> bool:
+    """Verify a password against its hash"""
+    try:
+        return bcrypt.checkpw(password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        # Malformed hash stored for the user
+        return False
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12)"""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordService:
+    def __init__(self):
+        self.rounds = BCRYPT_ROUNDS
+        self.max_workers = int(os.getenv("PASSWORD_HASH_WORKERS", str(min(2, os.cpu_count() or 1))))
+        # Jobs allowed in flight (running + queued) before rejecting new ones
+        self.max_pending = int(os.getenv("PASSWORD_HASH_MAX_PENDING", str(self.max_workers * 16)))
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                # spawn: forking a threaded server process is unsafe
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            return self._pool
+
+    async def _run(self, fn, *args) -> Any:
+        pool = self._get_pool()
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordServiceBusy("Password hashing is saturated, try again shortly")
+            self._pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, fn, *args)
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self.completed += 1
+
+    async def hash(self, password: str) -> str:
+        """Hash a password at the configured cost"""
+        return await self._run(hash_password, password, self.rounds)
+
+    async def verify(self, password: str, hashed_password: str) -> bool:
+        """Check a password against a stored hash"""
+        return await self._run(verify_password, password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """Whether a stored hash was made at a different cost than the configured one"""
+        return hash_rounds(hashed_password) != self.rounds
+
+    def shutdown(self) -> None:
+        """Stop the worker processes"""
+        with self._lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool counters"""
+        with self._lock:
+            return {
+                "rounds": self.rounds,
+                "workers": self.max_workers,
+                "pending": self._pending,
+                "max_pending": self.max_pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+            }
+
+# Global password service instance
+password_service = PasswordService()
@@ -0,0 +1,123 @@
+"""
+PDF text extraction that fans pages out across a process pool
+
+Pages are split into batches, each batch is parsed in a worker process and
+page text is yielded in order as batches finish, so callers can stream a
+document instead of building one big string. The PDF is written to a temp
+file once and workers are sent only its path and a page range. Kept free of
+app imports because worker processes import this module on start.
+"""
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Deque, Iterator, List, Optional, Tuple
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+
+# Below this many pages the pool overhead outweighs the parallelism
+PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "16"))
+PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", "8"))
+MAX_PROCESSES = int(os.getenv("PDF_EXTRACT_PROCESSES", str(min(4, os.cpu_count() or 1))))
+
+# Batches queued ahead of the consumer; later ones are submitted as pages are read
+MAX_PENDING_BATCHES = int(os.getenv("PDF_PENDING_BATCHES", str(MAX_PROCESSES * 2)))
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+# Worker side: the document last opened by this process, so a worker parses
+# each file once however many of its batches it runs
+_worker_reader: Optional[Tuple[str, Any]] = None
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # spawn: forking a threaded server process is unsafe
+            _pool = ProcessPoolExecutor(
+                max_workers=MAX_PROCESSES,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pool
+
+
+def parse_page_range(pages: Optional[str], total_pages: int) -> Tuple[int, int]:
+    """Turn "10-20", "7" or "30-" (1-based, inclusive) into a 0-based [start, end) slice"""
+    if not pages or not pages.strip():
+        return 0, total_pages
+    spec = pages.replace(" ", "")
+    try:
+        if "-" in spec:
+            first, last = spec.split("-", 1)
+            start = int(first) if first else 1
+            end = int(last) if last else total_pages
+        else:
+            start = end = int(spec)
+    except ValueError:
+        raise ValueError(f"Invalid page range '{pages}'. Use a page number or a range like '10-20'")
+    if start < 1 or end < start:
+        raise ValueError(f"Invalid page range '{pages}'")
+    if start > total_pages:
+        raise ValueError(f"Page {start} is out of range; the document has {total_pages} pages")
+    return start - 1, min(end, total_pages)
+
+
+def count_pages(data: bytes) -> int:
+    """Number of pages in a PDF"""
+    import PyPDF2
+    return len(PyPDF2.PdfReader(io.BytesIO(data)).pages)
+
+
+def _extract_page_batch(path: str, start: int, end: int) -> List[str]:
+    # Runs in a worker process
+    global _worker_reader
+    import PyPDF2
+    if _worker_reader is None or _worker_reader[0] != path:
+        _worker_reader = (path, PyPDF2.PdfReader(path))
+    reader = _worker_reader[1]
+    return [reader.pages[index].extract_text() or "" for index in range(start, end)]
+
+
+def iter_pdf_pages(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """Yield the text of pages [start, end) in order"""
+    # PyPDF2 is only imported once a PDF is actually read
+    import PyPDF2
+    reader = PyPDF2.PdfReader(io.BytesIO(data))
+    end = len(reader.pages) if end is None else min(end, len(reader.pages))
+    if end - start < PARALLEL_MIN_PAGES or MAX_PROCESSES <= 1:
+        for index in range(start, end):
+            yield reader.pages[index].extract_text() or ""
+        return
+
+    # Temp file names are unique per call, so they also key the worker-side reader
+    fd, path = tempfile.mkstemp(prefix="pdf-extract-", suffix=".pdf")
+    with os.fdopen(fd, "wb") as handle:
+        handle.write(data)
+
+    pool = _get_pool()
+    batches = iter(range(start, end, PAGES_PER_TASK))
+    pending: Deque[Future] = deque()
+
+    def submit_next() -> None:
+        batch_start = next(batches, None)
+        if batch_start is not None:
+            pending.append(pool.submit(_extract_page_batch, path, batch_start, min(batch_start + PAGES_PER_TASK, end)))
+
+    try:
+        for _ in range(max(1, MAX_PENDING_BATCHES)):
+            submit_next()
+        while pending:
+            future = pending.popleft()
+            submit_next()
+            yield from future.result()
+    finally:
+        # Stop queued batches if the consumer gives up early
+        for future in pending:
+            future.cancel()
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
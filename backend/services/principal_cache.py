@@ -0,0 +1,147 @@
+"""
+PrincipalCache - Short-lived cache of authenticated users keyed by user id
+
+get_current_user runs on every authenticated request; caching the few
+fields it needs saves a users/user_roles join per request. Entries expire
+after a short TTL and are dropped explicitly whenever an endpoint changes a
+user's profile, role or active flag.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+import os
+import threading
+import time
+
+
+@dataclass(frozen=True)
+class RoleRef:
+    """Role name as seen through `principal.user_role.name`"""
+    id: int
+    name: str
+
+
+@dataclass(frozen=True)
+class UserPrincipal:
+    """Immutable snapshot of the authenticated user.
+
+    Exposes the User attributes request handlers read, so it can be used
+    wherever the ORM row was used read-only. Handlers that modify the user
+    load the row themselves.
+    """
+    id: int
+    email: str
+    username: str
+    role_id: int
+    role_name: str
+    is_active: bool
+    created_at: Optional[datetime]
+
+    @property
+    def user_role(self) -> RoleRef:
+        return RoleRef(id=self.role_id, name=self.role_name)
+
+    @classmethod
+    def from_user(cls, user: Any) -> "UserPrincipal":
+        """Snapshot a User row (with its role loaded)"""
+        return cls(
+            id=user.id,
+            email=user.email,
+            username=user.username,
+            role_id=user.role_id,
+            role_name=user.user_role.name,
+            is_active=user.is_active,
+            created_at=user.created_at,
+        )
+
+
+class PrincipalCache:
+    """TTL cache of UserPrincipal by user id.
+
+    Invalidation stamps the user with a new value of a global counter, so
+    that a lookup which was already reading the old row from the database
+    cannot store it back. Only the newest max_entries stamps are kept;
+    lookups older than a dropped stamp are simply not cached.
+    """
+
+    def __init__(self, ttl_seconds: float = 30.0, max_entries: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: Dict[int, Tuple[UserPrincipal, float]] = {}
+        # user id -> counter value at their last invalidation, oldest first
+        self._invalidated: Dict[int, int] = {}
+        self._clock = 0
+        # Lookups started before this counter value may predate a dropped stamp
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, user_id: int) -> int:
+        """Generation to pass to put() for a lookup starting now"""
+        with self._lock:
+            return self._clock
+
+    def get(self, user_id: int) -> Optional[UserPrincipal]:
+        """Cached principal if present and fresh"""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl_seconds:
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def put(self, principal: UserPrincipal, generation: int) -> None:
+        """Store a principal unless the user was invalidated while it was loading"""
+        if self.ttl_seconds <= 0:
+            return
+        with self._lock:
+            if generation < self._floor or self._invalidated.get(principal.id, 0) > generation:
+                return
+            if len(self._entries) >= self.max_entries:
+                self._evict_expired()
+            if len(self._entries) < self.max_entries:
+                self._entries[principal.id] = (principal, time.monotonic())
+
+    def invalidate(self, user_id: int) -> None:
+        """Drop a user's principal after their row changed"""
+        with self._lock:
+            self._entries.pop(user_id, None)
+            self._clock += 1
+            self._invalidated.pop(user_id, None)
+            self._invalidated[user_id] = self._clock
+            while len(self._invalidated) > self.max_entries:
+                oldest = next(iter(self._invalidated))
+                self._floor = self._invalidated.pop(oldest)
+            self.invalidations += 1
+
+    def _evict_expired(self) -> None:
+        now = time.monotonic()
+        for user_id in [uid for uid, (_, loaded_at) in self._entries.items() if now - loaded_at > self.ttl_seconds]:
+            del self._entries[user_id]
+
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters"""
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+                "cached_users": len(self._entries),
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+def create_principal_cache() -> PrincipalCache:
+    """Build a PrincipalCache configured from the environment"""
+    return PrincipalCache(
+        ttl_seconds=float(os.getenv("AUTH_PRINCIPAL_CACHE_TTL_SECONDS", "30")),
+        max_entries=int(os.getenv("AUTH_PRINCIPAL_CACHE_MAX_ENTRIES", "10000")),
+    )
+
+# Global principal cache instance
+principal_cache = create_principal_cache()
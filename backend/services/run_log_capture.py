@@ -0,0 +1,98 @@
+"""
+Per-run capture of Agno debug logs
+
+A single logging handler is attached to the Agno loggers once. It routes each
+record to the buffer of the run that is active in the current context (a
+contextvar), so concurrent runs on threads or asyncio tasks never see each
+other's output and nothing process-global is swapped.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional
+import logging
+import os
+import threading
+
+# Loggers used by Agno for agents, teams and workflows
+AGNO_LOGGER_NAMES = ("agno", "agno-team", "agno-workflow")
+
+# Upper bound on the log kept per run; later records are counted, not stored
+MAX_RUN_LOG_CHARS = int(os.getenv("AGENT_RUN_LOG_MAX_CHARS", "1000000"))
+
+
+class RunLogBuffer:
+    """Bounded log sink owned by exactly one agent run"""
+
+    def __init__(self, max_chars: int = MAX_RUN_LOG_CHARS):
+        self.max_chars = max_chars
+        self.dropped = 0
+        self._parts: List[str] = []
+        self._size = 0
+
+    def write(self, line: str) -> None:
+        if self._size + len(line) + 1 > self.max_chars:
+            self.dropped += 1
+            return
+        self._parts.append(line)
+        self._size += len(line) + 1
+
+    def getvalue(self) -> str:
+        text = "\n".join(self._parts)
+        if self.dropped:
+            text += f"\n... [{self.dropped} log records truncated]"
+        return text
+
+
+_current_buffer: ContextVar[Optional[RunLogBuffer]] = ContextVar("agno_run_log_buffer", default=None)
+
+
+class _RunLogHandler(logging.Handler):
+    """Forwards records to the buffer of the run in the current context"""
+
+    def createLock(self):
+        # Buffers are never shared between runs, so there is nothing to guard
+        self.lock = None
+
+    def emit(self, record: logging.LogRecord) -> None:
+        buffer = _current_buffer.get()
+        if buffer is None:
+            return
+        try:
+            buffer.write(self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+_handler: Optional[_RunLogHandler] = None
+_install_lock = threading.Lock()
+
+
+def install() -> None:
+    """Attach the routing handler to the Agno loggers (idempotent)"""
+    global _handler
+    if _handler is not None:
+        return
+    with _install_lock:
+        if _handler is not None:
+            return
+        handler = _RunLogHandler(level=logging.DEBUG)
+        handler.setFormatter(logging.Formatter("%(levelname)-7s %(message)s"))
+        for name in AGNO_LOGGER_NAMES:
+            logging.getLogger(name).addHandler(handler)
+        _handler = handler
+
+
+@contextmanager
+def capture_run_log(max_chars: int = MAX_RUN_LOG_CHARS) -> Iterator[RunLogBuffer]:
+    """Collect Agno log records emitted in the current context into a new buffer"""
+    install()
+    buffer = RunLogBuffer(max_chars)
+    token = _current_buffer.set(buffer)
+    try:
+        yield buffer
+    finally:
+        try:
+            _current_buffer.reset(token)
+        except ValueError:
+            # Async generators may be finalized from another context
+            pass
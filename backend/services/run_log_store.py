@@ -0,0 +1,266 @@
+"""
+RunLogStore - Compressed, tiered storage for agent run traces
+
+Hot traces live gzip-compressed in the logs table, cold ones are moved to
+MinIO, and expired ones keep only their summary row. A background job
+compacts legacy uncompressed rows and moves rows between tiers.
+"""
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+import asyncio
+import base64
+import gzip
+import json
+import os
+import re
+
+from sqlalchemy import func, literal, select, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from database import SessionLocal
+from models import AgentRunLog
+from services.file_service import file_service
+from services.run_trace import summarize_trace
+
+ANSI_ESCAPE_RE = re.compile(r"\x1B\[[0-?]*[ -/]*[@-~]")
+
+TIER_HOT = "hot"
+TIER_COLD = "cold"
+TIER_EXPIRED = "expired"
+
+COLD_PREFIX = "run-logs/"
+
+# Columns needed by list views (never the trace or legacy dump)
+SUMMARY_COLUMNS = (
+    AgentRunLog.id,
+    AgentRunLog.conversation_id,
+    AgentRunLog.persona_id,
+    AgentRunLog.message_id,
+    AgentRunLog.summary,
+    AgentRunLog.storage_tier,
+    AgentRunLog.created_at,
+)
+
+COUNT_MODES = ("exact", "approximate", "none")
+
+
+def encode_trace(trace: Optional[Dict[str, Any]], raw_log: Optional[str]) -> bytes:
+    """Serialize a trace and its raw log into one gzip blob"""
+    payload = json.dumps({"trace": trace, "raw_log": raw_log or ""}, default=str, separators=(",", ":"))
+    return gzip.compress(payload.encode("utf-8"), compresslevel=6)
+
+
+def decode_trace(blob: bytes) -> Dict[str, Any]:
+    """Inverse of encode_trace"""
+    return json.loads(gzip.decompress(blob).decode("utf-8"))
+
+
+def encode_cursor(created_at: datetime, log_id: int) -> str:
+    """Opaque keyset cursor for the (created_at, id) position of a row"""
+    raw = f"{created_at.isoformat()}|{log_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """Inverse of encode_cursor; raises ValueError on malformed input"""
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        created_at, log_id = base64.urlsafe_b64decode(padded.encode("ascii")).decode("utf-8").split("|", 1)
+        return datetime.fromisoformat(created_at), int(log_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+class RunLogStore:
+    def __init__(self):
+        self.hot_days = int(os.getenv("RUN_LOG_HOT_DAYS", "7"))
+        self.retention_days = int(os.getenv("RUN_LOG_RETENTION_DAYS", "90"))
+        self.compaction_interval = int(os.getenv("RUN_LOG_COMPACTION_INTERVAL_SECONDS", "3600"))
+        self.compaction_batch = int(os.getenv("RUN_LOG_COMPACTION_BATCH", "200"))
+        self.compaction_enabled = os.getenv("RUN_LOG_COMPACTION_ENABLED", "true").lower() == "true"
+        self._compaction_task: Optional[asyncio.Task] = None
+
+    def build_record(
+        self,
+        conversation_id: int,
+        persona_id: int,
+        message_id: int,
+        trace: Optional[Dict[str, Any]],
+        raw_log: Optional[str]
+    ) -> AgentRunLog:
+        """Create a hot-tier log row holding the compressed trace"""
+        raw_log = ANSI_ESCAPE_RE.sub("", raw_log or "")
+        return AgentRunLog(
+            conversation_id=conversation_id,
+            persona_id=persona_id,
+            message_id=message_id,
+            summary=summarize_trace(trace, raw_log),
+            trace_gz=encode_trace(trace, raw_log),
+            storage_tier=TIER_HOT,
+        )
+
+    async def list_summaries(
+        self,
+        db: AsyncSession,
+        limit: int,
+        cursor: Optional[str] = None,
+        conversation_id: Optional[int] = None
+    ) -> Tuple[List[Any], Optional[str]]:
+        """One page of summary rows, newest first, and the cursor of the next page"""
+        query = select(*SUMMARY_COLUMNS)
+        if conversation_id is not None:
+            query = query.where(AgentRunLog.conversation_id == conversation_id)
+        if cursor:
+            # Row comparison lets Postgres seek straight into the (created_at, id) indexes
+            cursor_created_at, cursor_id = decode_cursor(cursor)
+            query = query.where(
+                tuple_(AgentRunLog.created_at, AgentRunLog.id) < tuple_(literal(cursor_created_at), literal(cursor_id))
+            )
+        query = query.order_by(AgentRunLog.created_at.desc(), AgentRunLog.id.desc()).limit(limit + 1)
+        rows = (await db.execute(query)).all()
+        
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+        return rows, next_cursor
+
+    async def count(self, db: AsyncSession, mode: str, conversation_id: Optional[int] = None) -> Tuple[Optional[int], bool]:
+        """Row count as (count, is_estimate); the estimate comes from planner statistics"""
+        if mode == "none":
+            return None, False
+        if mode == "approximate" and conversation_id is None:
+            estimate = (await db.execute(
+                text("SELECT reltuples::bigint FROM pg_class WHERE oid = 'logs'::regclass")
+            )).scalar()
+            # reltuples is -1 (or 0) until the table has been analyzed
+            if estimate is not None and estimate > 0:
+                return int(estimate), True
+        query = select(func.count()).select_from(AgentRunLog)
+        if conversation_id is not None:
+            query = query.where(AgentRunLog.conversation_id == conversation_id)
+        return (await db.execute(query)).scalar_one(), False
+
+    def load_detail(self, log: AgentRunLog) -> Dict[str, Any]:
+        """Full trace and raw log for one row, wherever it is stored"""
+        if log.trace_gz is not None:
+            return decode_trace(log.trace_gz)
+        if log.trace_object_name:
+            return decode_trace(file_service.get_bytes(log.trace_object_name))
+        if log.raw_log is not None:
+            return {"trace": None, "raw_log": log.raw_log}
+        return {"trace": None, "raw_log": None}
+
+    def delete_cold_objects(self, object_names: List[str]) -> None:
+        """Remove cold-tier objects of rows that are being deleted"""
+        for object_name in object_names:
+            if object_name:
+                file_service.delete_file(object_name)
+
+    def compact_legacy(self, db: Session) -> int:
+        """Compress rows that still hold an uncompressed raw_log"""
+        rows = db.query(AgentRunLog).filter(
+            AgentRunLog.raw_log.isnot(None)
+        ).order_by(AgentRunLog.id).limit(self.compaction_batch).with_for_update(skip_locked=True).all()
+        for row in rows:
+            row.summary = row.summary or summarize_trace(None, row.raw_log)
+            row.trace_gz = encode_trace(None, row.raw_log)
+            row.raw_log = None
+        db.commit()
+        return len(rows)
+
+    def demote_to_cold(self, db: Session) -> int:
+        """Move hot traces older than the hot window to MinIO"""
+        cutoff = datetime.utcnow() - timedelta(days=self.hot_days)
+        rows = db.query(AgentRunLog).filter(
+            AgentRunLog.storage_tier == TIER_HOT,
+            AgentRunLog.trace_gz.isnot(None),
+            AgentRunLog.created_at < cutoff
+        ).order_by(AgentRunLog.id).limit(self.compaction_batch).with_for_update(skip_locked=True).all()
+        moved = 0
+        try:
+            for row in rows:
+                object_name = f"{COLD_PREFIX}{row.id}.json.gz"
+                file_service.put_bytes(object_name, row.trace_gz, content_type="application/gzip")
+                row.trace_object_name = object_name
+                row.trace_gz = None
+                row.storage_tier = TIER_COLD
+                moved += 1
+        finally:
+            # Keep whatever was uploaded before a storage failure
+            db.commit()
+        return moved
+
+    def expire(self, db: Session) -> int:
+        """Drop traces past retention, keeping the summary row"""
+        cutoff = datetime.utcnow() - timedelta(days=self.retention_days)
+        rows = db.query(AgentRunLog).filter(
+            AgentRunLog.storage_tier != TIER_EXPIRED,
+            AgentRunLog.created_at < cutoff
+        ).order_by(AgentRunLog.id).limit(self.compaction_batch).with_for_update(skip_locked=True).all()
+        object_names = [row.trace_object_name for row in rows if row.trace_object_name]
+        for row in rows:
+            if row.raw_log is not None and not row.summary:
+                row.summary = summarize_trace(None, row.raw_log)
+            row.raw_log = None
+            row.trace_gz = None
+            row.trace_object_name = None
+            row.storage_tier = TIER_EXPIRED
+        db.commit()
+        
+        # Delete cold objects only once no row points at them; a failed delete
+        # leaves an orphaned object, never a row pointing at a missing one
+        for object_name in object_names:
+            try:
+                if not file_service.delete_file(object_name):
+                    print(f"⚠️ Failed to delete expired trace object {object_name}")
+            except Exception as e:
+                print(f"⚠️ Failed to delete expired trace object {object_name}: {e}")
+        return len(rows)
+
+    def compact_once(self) -> Dict[str, int]:
+        """Run one pass of every compaction step"""
+        db = SessionLocal()
+        try:
+            return {
+                "expired": self.expire(db),
+                "compressed": self.compact_legacy(db),
+                "moved_to_cold": self.demote_to_cold(db),
+            }
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    async def run_compaction_loop(self):
+        """Periodically compact run logs without blocking the event loop"""
+        while True:
+            try:
+                result = await asyncio.to_thread(self.compact_once)
+                if any(result.values()):
+                    print(f"🗜️ Run log compaction: {result}")
+            except Exception as e:
+                print(f"⚠️ Run log compaction failed: {e}")
+            await asyncio.sleep(self.compaction_interval)
+
+    def start_compaction(self):
+        """Start the background compaction job once per process"""
+        if not self.compaction_enabled or self._compaction_task is not None:
+            return
+        self._compaction_task = asyncio.create_task(self.run_compaction_loop())
+
+    async def stop_compaction(self):
+        """Cancel the background compaction job"""
+        if self._compaction_task is None:
+            return
+        self._compaction_task.cancel()
+        try:
+            await self._compaction_task
+        except asyncio.CancelledError:
+            pass
+        self._compaction_task = None
+
+# Global run log store instance
+run_log_store = RunLogStore()
@@ -0,0 +1,189 @@
+"""
+Structured run traces built from Agno run events
+
+A trace is a flat list of spans (model calls, tool calls and member
+delegations) with start offsets, durations and token counts, plus run-level
+totals. It is what gets persisted for every assistant reply instead of the
+raw debug dump alone.
+"""
+from typing import Any, Dict, List, Optional
+import time
+
+from agno.run.agent import RunEvent
+from agno.run.team import TeamRunEvent
+
+TRACE_VERSION = 1
+
+
+def _metrics_to_dict(metrics: Any) -> Dict[str, Any]:
+    """Token counts and duration (ms) from an Agno Metrics object"""
+    if metrics is None:
+        return {}
+    duration = getattr(metrics, "duration", None)
+    return {
+        "input_tokens": getattr(metrics, "input_tokens", 0) or 0,
+        "output_tokens": getattr(metrics, "output_tokens", 0) or 0,
+        "total_tokens": getattr(metrics, "total_tokens", 0) or 0,
+        "duration_ms": round(duration * 1000, 1) if duration is not None else None,
+    }
+
+
+class RunTraceRecorder:
+    """Collects spans for a single team run"""
+
+    def __init__(self):
+        self._started = time.monotonic()
+        self.spans: List[Dict[str, Any]] = []
+        self._open_tools: Dict[str, Dict[str, Any]] = {}
+        self._open_members: Dict[str, Dict[str, Any]] = {}
+        self.model: Optional[str] = None
+
+    def _offset_ms(self) -> float:
+        return round((time.monotonic() - self._started) * 1000, 1)
+
+    def _close(self, span: Dict[str, Any]) -> None:
+        span["duration_ms"] = round(self._offset_ms() - span["start_ms"], 1)
+
+    def observe(self, event: Any) -> None:
+        """Record a streamed team or member event"""
+        event_name = getattr(event, "event", None)
+        agent_name = getattr(event, "agent_name", None) or getattr(event, "team_name", None)
+
+        if event_name in (TeamRunEvent.tool_call_started, RunEvent.tool_call_started):
+            tool = getattr(event, "tool", None)
+            span = {
+                "kind": "tool",
+                "name": getattr(tool, "tool_name", None),
+                "agent": agent_name,
+                "args": getattr(tool, "tool_args", None),
+                "start_ms": self._offset_ms(),
+                "duration_ms": None,
+                "status": "running",
+            }
+            self._open_tools[getattr(tool, "tool_call_id", None) or str(id(span))] = span
+            self.spans.append(span)
+        elif event_name in (TeamRunEvent.tool_call_completed, RunEvent.tool_call_completed):
+            tool = getattr(event, "tool", None)
+            span = self._open_tools.pop(getattr(tool, "tool_call_id", None), None)
+            if span is None:
+                span = {"kind": "tool", "name": getattr(tool, "tool_name", None), "agent": agent_name,
+                        "start_ms": self._offset_ms()}
+                self.spans.append(span)
+            self._close(span)
+            span["status"] = "error" if getattr(tool, "tool_call_error", False) else "ok"
+        elif event_name == RunEvent.run_started:
+            span = {
+                "kind": "member",
+                "name": agent_name,
+                "agent": agent_name,
+                "model": getattr(event, "model", None),
+                "start_ms": self._offset_ms(),
+                "duration_ms": None,
+                "status": "running",
+            }
+            self._open_members[getattr(event, "run_id", None) or str(id(span))] = span
+            self.spans.append(span)
+        elif event_name == RunEvent.run_completed:
+            span = self._open_members.pop(getattr(event, "run_id", None), None)
+            if span is None:
+                span = {"kind": "member", "name": agent_name, "agent": agent_name, "start_ms": self._offset_ms()}
+                self.spans.append(span)
+            self._close(span)
+            span["status"] = "ok"
+            span.update({k: v for k, v in _metrics_to_dict(getattr(event, "metrics", None)).items() if k != "duration_ms"})
+        elif event_name == TeamRunEvent.run_started:
+            self.model = getattr(event, "model", None)
+        elif event_name == TeamRunEvent.run_completed:
+            # Team leader model usage for the whole run
+            metrics = _metrics_to_dict(getattr(event, "metrics", None))
+            if metrics:
+                self.spans.append({
+                    "kind": "model",
+                    "name": self.model,
+                    "agent": agent_name,
+                    "start_ms": 0.0,
+                    "status": "ok",
+                    **metrics,
+                })
+
+    def observe_output(self, output: Any) -> None:
+        """Record a completed (non-streamed) team run output"""
+        team_name = getattr(output, "team_name", None)
+        self.model = getattr(output, "model", None) or self.model
+
+        for message in getattr(output, "messages", None) or []:
+            if getattr(message, "role", None) != "assistant":
+                continue
+            metrics = _metrics_to_dict(getattr(message, "metrics", None))
+            self.spans.append({"kind": "model", "name": self.model, "agent": team_name, "status": "ok", **metrics})
+
+        for tool in getattr(output, "tools", None) or []:
+            self.spans.append(self._tool_span(tool, team_name))
+
+        for member in getattr(output, "member_responses", None) or []:
+            member_name = getattr(member, "agent_name", None) or getattr(member, "team_name", None)
+            self.spans.append({
+                "kind": "member",
+                "name": member_name,
+                "agent": member_name,
+                "model": getattr(member, "model", None),
+                "status": "ok",
+                **_metrics_to_dict(getattr(member, "metrics", None)),
+            })
+            for tool in getattr(member, "tools", None) or []:
+                self.spans.append(self._tool_span(tool, member_name))
+
+    def _tool_span(self, tool: Any, agent_name: Optional[str]) -> Dict[str, Any]:
+        metrics = _metrics_to_dict(getattr(tool, "metrics", None))
+        return {
+            "kind": "tool",
+            "name": getattr(tool, "tool_name", None),
+            "agent": agent_name,
+            "args": getattr(tool, "tool_args", None),
+            "duration_ms": metrics.get("duration_ms"),
+            "status": "error" if getattr(tool, "tool_call_error", False) else "ok",
+        }
+
+    def finish(self, status: str = "ok", error: Optional[str] = None) -> Dict[str, Any]:
+        """Close any open spans and return the trace document"""
+        for span in list(self._open_tools.values()) + list(self._open_members.values()):
+            self._close(span)
+            span["status"] = "incomplete"
+        self._open_tools.clear()
+        self._open_members.clear()
+
+        totals = {"input_tokens": 0, "output_tokens": 0, "total_tokens": 0}
+        for span in self.spans:
+            if span["kind"] in ("model", "member"):
+                for key in totals:
+                    totals[key] += span.get(key) or 0
+
+        return {
+            "version": TRACE_VERSION,
+            "status": status,
+            "error": error,
+            "model": self.model,
+            "duration_ms": self._offset_ms(),
+            "totals": totals,
+            "spans": self.spans,
+        }
+
+
+def summarize_trace(trace: Optional[Dict[str, Any]], raw_log: Optional[str] = None) -> Dict[str, Any]:
+    """Small per-run summary kept uncompressed for list views"""
+    trace = trace or {}
+    spans = trace.get("spans") or []
+    totals = trace.get("totals") or {}
+    return {
+        "status": trace.get("status", "unknown"),
+        "model": trace.get("model"),
+        "duration_ms": trace.get("duration_ms"),
+        "input_tokens": totals.get("input_tokens", 0),
+        "output_tokens": totals.get("output_tokens", 0),
+        "total_tokens": totals.get("total_tokens", 0),
+        "model_calls": sum(1 for span in spans if span.get("kind") == "model"),
+        "tool_calls": sum(1 for span in spans if span.get("kind") == "tool"),
+        "member_calls": sum(1 for span in spans if span.get("kind") == "member"),
+        "tools": sorted({span["name"] for span in spans if span.get("kind") == "tool" and span.get("name")}),
+        "log_chars": len(raw_log or ""),
+    }
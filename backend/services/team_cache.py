@@ -0,0 +1,181 @@
+"""
+TeamCache - Persona-keyed cache of team blueprints and idle Agno Teams
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import os
+import threading
+import time
+
+
+@dataclass(frozen=True)
+class AgentBlueprint:
+    """Immutable snapshot of an Agent row needed to build an Agno Agent"""
+    id: int
+    name: str
+    role: str
+    instructions: str
+    model_provider: str
+    model_id: str
+    tools: Tuple[str, ...]
+
+
+@dataclass(frozen=True)
+class PersonaBlueprint:
+    """Immutable snapshot of a Persona row and its active agents"""
+    id: int
+    name: str
+    instructions: Optional[str]
+    model_provider: str
+    model_id: str
+    agent_ids: Tuple[int, ...]  # Raw persona.agents list, including inactive agents
+    agents: Tuple[AgentBlueprint, ...]
+    per_user: bool = False  # Some agent has a per-user tool, so Teams are built for one user
+
+
+class TeamCache:
+    """Caches persona blueprints and pools of idle, ready-to-run Teams.
+
+    Agno Teams keep per-run state, so a Team is never shared between
+    concurrent runs: callers check one out, run it and hand it back.
+    Every invalidation bumps the persona's generation so that Teams built
+    from an outdated blueprint are dropped instead of returned to the pool.
+    Teams of a ``per_user`` persona carry that user's toolkits and are pooled
+    per (persona, user); the persona's idle limit spans all of its users.
+    """
+
+    def __init__(self, max_idle_per_persona: int = 4, ttl_seconds: float = 300.0):
+        self.max_idle_per_persona = max_idle_per_persona
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._blueprints: Dict[int, Tuple[PersonaBlueprint, float]] = {}
+        self._idle: Dict[int, "OrderedDict[Optional[str], List[Any]]"] = {}
+        self._generations: Dict[int, int] = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def generation(self, persona_id: int) -> int:
+        """Current generation of a persona's cache entry"""
+        with self._lock:
+            return self._generations.get(persona_id, 0)
+
+    def get_blueprint(self, persona_id: int) -> Optional[PersonaBlueprint]:
+        """Return the cached blueprint if present and not expired"""
+        with self._lock:
+            entry = self._blueprints.get(persona_id)
+            if entry is None:
+                return None
+            blueprint, loaded_at = entry
+            if time.monotonic() - loaded_at > self.ttl_seconds:
+                self._drop(persona_id)
+                return None
+            return blueprint
+
+    def put_blueprint(self, blueprint: PersonaBlueprint, generation: int) -> None:
+        """Store a blueprint unless the persona was invalidated while it was loading"""
+        with self._lock:
+            if self._generations.get(blueprint.id, 0) == generation:
+                self._blueprints[blueprint.id] = (blueprint, time.monotonic())
+
+    def acquire(
+        self,
+        blueprint: PersonaBlueprint,
+        build: Callable[[PersonaBlueprint], Any],
+        owner: Optional[str] = None,
+    ) -> Tuple[Any, int]:
+        """Check out an idle Team for the persona (and owner, if per-user), building one on a miss"""
+        owner = owner if blueprint.per_user else None
+        with self._lock:
+            generation = self._generations.get(blueprint.id, 0)
+            pools = self._idle.get(blueprint.id)
+            idle = pools.get(owner) if pools else None
+            if idle:
+                self.hits += 1
+                team = idle.pop()
+                if not idle:
+                    del pools[owner]
+                return team, generation
+            self.misses += 1
+        # Build outside the lock - model clients and toolkits are slow to construct
+        return build(blueprint), generation
+
+    def release(self, blueprint: PersonaBlueprint, team: Any, generation: int, owner: Optional[str] = None) -> None:
+        """Return a Team to the idle pool if it is still current"""
+        owner = owner if blueprint.per_user else None
+        with self._lock:
+            if self._generations.get(blueprint.id, 0) != generation:
+                return
+            pools = self._idle.setdefault(blueprint.id, OrderedDict())
+            idle = pools.setdefault(owner, [])
+            pools.move_to_end(owner)
+            if len(idle) >= self.max_idle_per_persona:
+                return
+            if sum(len(teams) for teams in pools.values()) >= self.max_idle_per_persona:
+                # Make room by dropping a Team of the least recently active user
+                oldest_owner, oldest = next(iter(pools.items()))
+                oldest.pop(0)
+                if not oldest:
+                    del pools[oldest_owner]
+            idle.append(team)
+
+    def invalidate_persona(self, persona_id: int) -> None:
+        """Drop everything cached for a persona"""
+        with self._lock:
+            self._drop(persona_id)
+            self.invalidations += 1
+
+    def invalidate_agent(self, agent_id: int) -> None:
+        """Drop every cached persona that references the agent"""
+        with self._lock:
+            affected = [
+                persona_id for persona_id, (blueprint, _) in self._blueprints.items()
+                if agent_id in blueprint.agent_ids
+            ]
+            for persona_id in affected:
+                self._drop(persona_id)
+            self.invalidations += 1
+
+    def invalidate_owner(self, owner: Optional[str]) -> None:
+        """Drop a user's idle per-user Teams, e.g. after their credentials change"""
+        with self._lock:
+            for persona_id, pools in list(self._idle.items()):
+                pools.pop(owner, None)
+                if not pools:
+                    del self._idle[persona_id]
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        """Drop every cached blueprint and idle Team"""
+        with self._lock:
+            for persona_id in set(self._blueprints) | set(self._idle):
+                self._drop(persona_id)
+            self.invalidations += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and current cache size"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "invalidations": self.invalidations,
+                "cached_personas": len(self._blueprints),
+                "idle_teams": sum(len(idle) for pools in self._idle.values() for idle in pools.values()),
+            }
+
+    def _drop(self, persona_id: int) -> None:
+        # Caller must hold self._lock
+        self._blueprints.pop(persona_id, None)
+        self._idle.pop(persona_id, None)
+        self._generations[persona_id] = self._generations.get(persona_id, 0) + 1
+
+
+def create_team_cache() -> TeamCache:
+    """Build a TeamCache configured from the environment"""
+    return TeamCache(
+        max_idle_per_persona=int(os.getenv("TEAM_CACHE_MAX_IDLE", "4")),
+        ttl_seconds=float(os.getenv("TEAM_CACHE_TTL_SECONDS", "300")),
+    )
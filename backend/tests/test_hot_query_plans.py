@@ -0,0 +1,68 @@
+"""
+Index coverage tests for the queries the chat endpoints run on every turn
+
+Builds the tables from the models in a scratch schema of the
+TEST_DATABASE_URL Postgres database, seeds a small data set and EXPLAINs
+each hot query with sequential scans disabled. The planner then falls back
+to a sequential scan only when no index can serve the query, so any Seq
+Scan on a hot table means an index is missing. Runs on its own engine and
+never touches the app's DATABASE_URL; skipped when TEST_DATABASE_URL is
+unset or not reachable. benchmarks/explain_hot_queries.py runs the same
+queries at full scale.
+"""
+import os
+from types import SimpleNamespace
+
+import pytest
+
+TEST_DATABASE_URL = os.getenv("TEST_DATABASE_URL")
+if not TEST_DATABASE_URL:
+    pytest.skip("TEST_DATABASE_URL is not set", allow_module_level=True)
+
+pytest.importorskip("sqlalchemy")
+pytest.importorskip("psycopg")
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.pool import NullPool
+
+from database import Base, to_psycopg_url
+from benchmarks.explain_hot_queries import hot_queries, seed, seq_scans
+
+SCHEMA = "hot_query_plans_test"
+SIZES = SimpleNamespace(messages=5000, conversations=200, users=50)
+
+
+@pytest.fixture(scope="module")
+def conn():
+    engine = create_engine(to_psycopg_url(TEST_DATABASE_URL), poolclass=NullPool)
+    try:
+        connection = engine.connect()
+    except OperationalError as e:
+        engine.dispose()
+        pytest.skip(f"Postgres not reachable: {e}")
+    try:
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        connection.execute(text(f"SET search_path TO {SCHEMA}"))
+        Base.metadata.create_all(connection)
+        seed(connection, SIZES)
+        connection.commit()
+        connection.execute(text(f"SET search_path TO {SCHEMA}"))
+        connection.execute(text("SET enable_seqscan = off"))
+        yield connection
+    finally:
+        connection.rollback()
+        connection.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        connection.commit()
+        connection.close()
+        engine.dispose()
+
+
+@pytest.mark.parametrize("name", list(hot_queries(SIZES)))
+def test_hot_query_uses_an_index(conn, name):
+    query = hot_queries(SIZES)[name]
+    sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+    plan = conn.execute(text(f"EXPLAIN (FORMAT JSON) {sql}")).scalar()[0]["Plan"]
+    assert seq_scans(plan) == []
@@ -0,0 +1,116 @@
+"""
+Query-count regression tests for the persona and user listing endpoints
+
+Each endpoint function is called directly with a session on a scratch
+in-memory SQLite database, and the SQL statements it issues are counted
+with an engine event. A listing must cost a fixed, small number of
+statements however many rows it returns; a count that grows with the data
+means rows are being loaded one at a time.
+"""
+from types import SimpleNamespace
+
+import pytest
+
+sqlalchemy = pytest.importorskip("sqlalchemy")
+main = pytest.importorskip("main")
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from database import Base
+from models import Persona, User, UserPersona, UserRole
+
+USERS = 12
+PERSONAS = 6
+ADMIN = SimpleNamespace(id=1)
+
+
+@pytest.fixture(scope="module")
+def session_factory():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+    Session = sessionmaker(bind=engine, autoflush=False)
+
+    db = Session()
+    role = UserRole(name="user")
+    db.add(role)
+    db.flush()
+    users = [
+        User(email=f"user{index}@example.com", username=f"user{index}", role_id=role.id)
+        for index in range(USERS)
+    ]
+    personas = [Persona(name=f"persona {index}", agents=[]) for index in range(PERSONAS)]
+    db.add_all(users + personas)
+    db.flush()
+    # Uneven assignments, so a per-row query would show up as a different count
+    db.add_all([
+        UserPersona(user_id=user.id, persona_id=persona.id, is_active=True)
+        for user_index, user in enumerate(users)
+        for persona in personas[:user_index % PERSONAS]
+    ])
+    db.commit()
+    db.close()
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    yield Session, statements
+    engine.dispose()
+
+
+def endpoint(path: str):
+    """Handler function of a GET route (some handlers share a Python name)"""
+    for route in main.app.routes:
+        if getattr(route, "path", None) == path and "GET" in getattr(route, "methods", ()):
+            return route.endpoint
+    raise LookupError(path)
+
+
+def count_statements(session_factory, path: str, **kwargs) -> int:
+    Session, statements = session_factory
+    db = Session()
+    try:
+        statements.clear()
+        endpoint(path)(db=db, **kwargs)
+        return len(statements)
+    finally:
+        db.close()
+
+
+@pytest.mark.parametrize("path", ["/admin/users", "/admin/personas"])
+def test_paged_lists_use_one_statement(session_factory, path):
+    counts = {
+        limit: count_statements(session_factory, path, skip=0, limit=limit, admin_user=ADMIN)
+        for limit in (1, 10000)
+    }
+    assert counts == {1: 1, 10000: 1}
+
+
+def test_user_personas_by_admin(session_factory):
+    counts = {
+        user_id: count_statements(session_factory, "/admin/users/{user_id}/personas", user_id=user_id, admin_user=ADMIN)
+        for user_id in range(1, USERS + 1)
+    }
+    # The user lookup plus one join
+    assert set(counts.values()) == {2}
+
+
+def test_current_user_personas(session_factory):
+    counts = {
+        user_id: count_statements(session_factory, "/user/personas", current_user=SimpleNamespace(id=user_id))
+        for user_id in range(1, USERS + 1)
+    }
+    assert set(counts.values()) == {1}
+
+
+def test_persona_users(session_factory):
+    counts = {
+        persona_id: count_statements(session_factory, "/admin/personas/{persona_id}/users", persona_id=persona_id, admin_user=ADMIN)
+        for persona_id in range(1, PERSONAS + 1)
+    }
+    # The persona lookup plus one join
+    assert set(counts.values()) == {2}
@@ -0,0 +1,61 @@
+"""
+Startup tests: importing the app must not load toolkits or their SDKs
+
+Tool modules are imported by the registry on first use and service
+connections are opened in the lifespan hook, so `import main` in a fresh
+interpreter must leave them out of sys.modules and must not need MinIO or
+Postgres. benchmarks/startup_importtime.py profiles the import time.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The toolkits and the SDKs and document parsers behind them
+LAZY_MODULES = (
+    "tools.yt_tool",
+    "tools.web_search_tool",
+    "tools.file_processing_tool",
+    "tools.gmail_tool",
+    "litellm",
+    "googleapiclient",
+    "google_auth_oauthlib",
+    "youtube_transcript_api",
+    "newspaper",
+    "PyPDF2",
+    "docx",
+)
+
+
+@pytest.fixture(scope="module")
+def startup_modules():
+    """Modules loaded by `import main` in a fresh interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-c", "import json, sys, main; print(json.dumps(sorted(sys.modules)))"],
+        cwd=BACKEND_DIR,
+        capture_output=True,
+        text=True,
+        timeout=300,
+    )
+    if result.returncode != 0 and "ModuleNotFoundError" in result.stderr:
+        pytest.skip(f"backend dependencies are not installed: {result.stderr.strip().splitlines()[-1]}")
+    assert result.returncode == 0, result.stderr[-2000:]
+    # main prints on import; the module list is the last line
+    return set(json.loads(result.stdout.strip().splitlines()[-1]))
+
+
+def test_import_main_keeps_toolkits_lazy(startup_modules):
+    eager = sorted(
+        name for name in startup_modules
+        if any(name == lazy or name.startswith(f"{lazy}.") for lazy in LAZY_MODULES)
+    )
+    assert eager == []
+
+
+def test_import_main_loads_the_tool_registry(startup_modules):
+    # Guards the test above against passing because main never got that far
+    assert "tools.registry" in startup_modules
@@ -2,14 +2,12 @@
 File Processing Tool for Agno
 Handles PDF, DOCX, TXT, and other document processing
 """
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from agno.tools import Toolkit
 import os
 import mimetypes
-from services.file_service import file_service
-import PyPDF2
-import io
-from docx import Document
+from services.extraction_service import extraction_service, is_extractable, render_document
+from services.file_index import file_index
 import json
 
 
@@ -17,96 +15,111 @@ class FileProcessingTool(Toolkit):
     """Tool for processing uploaded files"""
     
     def __init__(self):
-        super().__init__()
-        self.name = "file_processing"
+        tools: List[Any] = [self.process_file, self.search_file, self.list_uploaded_files]
+        super().__init__(name="file_processing", tools=tools)
         self.description = "Process and analyze uploaded files including PDFs, Word documents, and text files"
     
-    def process_file(self, file_id: str) -> str:
+    def process_file(self, file_id: str, pages: Optional[str] = None) -> str:
         """
         Process an uploaded file and extract its content
         
         Args:
             file_id: The ID of the uploaded file
+            pages: Optional PDF page range such as "10-20" or "7" (1-based). Large
+                PDFs return their first pages only; use this to read further.
             
         Returns:
             Extracted content from the file
         """
         try:
-            # Get file info from database (we'll need to import this)
-            from models import FileModel
-            from database import get_db
+            from models import File as FileModel
+            from database import SessionLocal
             
-            db = next(get_db())
-            file_record = db.query(FileModel).filter(FileModel.id == file_id).first()
-            
-            if not file_record:
-                return f"File with ID {file_id} not found"
-            
-            # Get file content from MinIO
-            download_url = file_service.get_download_url(file_record.object_name)
-            
-            # Download file content
-            import requests
-            response = requests.get(download_url)
-            if response.status_code != 200:
-                return f"Failed to download file: {response.status_code}"
-            
-            file_content = response.content
-            content_type = file_record.content_type.lower()
-            
-            # Process based on file type
-            if content_type == 'application/pdf':
-                return self._process_pdf(file_content, file_record.filename)
-            elif content_type in ['application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'application/msword']:
-                return self._process_docx(file_content, file_record.filename)
-            elif content_type == 'text/plain':
-                return self._process_txt(file_content, file_record.filename)
-            else:
-                return f"Unsupported file type: {content_type}. Supported types: PDF, DOCX, TXT"
+            db = SessionLocal()
+            try:
+                file_record = db.query(FileModel).filter(FileModel.id == file_id).first()
+                
+                if not file_record:
+                    return f"File with ID {file_id} not found"
+                
+                content_type = file_record.content_type.lower()
+                if not is_extractable(content_type):
+                    return f"Unsupported file type: {content_type}. Supported types: PDF, DOCX, TXT"
+                
+                # Extracted text is cached by content hash (LRU + MinIO sidecar)
+                digest, document = extraction_service.get_document(
+                    file_record.object_name,
+                    content_type,
+                    file_record.content_hash
+                )
+                if not file_record.content_hash:
+                    file_record.content_hash = digest
+                    db.commit()
+                
+                try:
+                    return render_document(document, file_record.filename, pages)
+                except ValueError as e:
+                    return str(e)
+            finally:
+                db.close()
                 
         except Exception as e:
             return f"Error processing file: {str(e)}"
     
-    def _process_pdf(self, file_content: bytes, filename: str) -> str:
-        """Process PDF file and extract text"""
-        try:
-            pdf_file = io.BytesIO(file_content)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
-            
-            text_content = ""
-            for page_num, page in enumerate(pdf_reader.pages):
-                page_text = page.extract_text()
-                text_content += f"\n--- Page {page_num + 1} ---\n"
-                text_content += page_text
-            
-            return f"PDF Content from '{filename}':\n{text_content}"
-            
-        except Exception as e:
-            return f"Error processing PDF '{filename}': {str(e)}"
-    
-    def _process_docx(self, file_content: bytes, filename: str) -> str:
-        """Process DOCX file and extract text"""
-        try:
-            doc_file = io.BytesIO(file_content)
-            doc = Document(doc_file)
-            
-            text_content = ""
-            for paragraph in doc.paragraphs:
-                text_content += paragraph.text + "\n"
-            
-            return f"Word Document Content from '{filename}':\n{text_content}"
+    def search_file(self, file_id: str, query: str, k: int = 5) -> str:
+        """
+        Search an uploaded file and return only the passages relevant to a query
+        
+        Args:
+            file_id: The ID of the uploaded file
+            query: What to look for in the file
+            k: Number of passages to return
             
-        except Exception as e:
-            return f"Error processing DOCX '{filename}': {str(e)}"
-    
-    def _process_txt(self, file_content: bytes, filename: str) -> str:
-        """Process TXT file and extract text"""
+        Returns:
+            The best matching passages with their page numbers
+        """
         try:
-            text_content = file_content.decode('utf-8')
-            return f"Text File Content from '{filename}':\n{text_content}"
+            from models import File as FileModel
+            from database import SessionLocal
             
+            db = SessionLocal()
+            try:
+                file_record = db.query(FileModel).filter(FileModel.id == file_id).first()
+                
+                if not file_record:
+                    return f"File with ID {file_id} not found"
+                
+                content_type = file_record.content_type.lower()
+                if not is_extractable(content_type):
+                    return f"Unsupported file type: {content_type}. Supported types: PDF, DOCX, TXT"
+                
+                k = max(1, min(int(k), 20))
+                results = file_index.search(file_record.content_hash, query, k) if file_record.content_hash else None
+                if results is None:
+                    # Not indexed yet (older upload) - index it now
+                    digest, document = extraction_service.get_document(
+                        file_record.object_name,
+                        content_type,
+                        file_record.content_hash
+                    )
+                    if not file_record.content_hash:
+                        file_record.content_hash = digest
+                        db.commit()
+                    file_index.build(digest, document)
+                    results = file_index.search(digest, query, k) or []
+                
+                if not results:
+                    return f"No text found in '{file_record.filename}'"
+                
+                passages = [f"Top {len(results)} passages from '{file_record.filename}' for: {query}"]
+                for rank, result in enumerate(results, start=1):
+                    passages.append(f"\n[{rank}] (page {result['page']}, score {result['score']:.2f})\n{result['text']}")
+                return "\n".join(passages)
+            finally:
+                db.close()
+                
         except Exception as e:
-            return f"Error processing TXT '{filename}': {str(e)}"
+            return f"Error searching file: {str(e)}"
     
     def list_uploaded_files(self, conversation_id: int) -> str:
         """
@@ -119,25 +132,27 @@ class FileProcessingTool(Toolkit):
             List of uploaded files
         """
         try:
-            from models import MessageFile, FileModel
-            from database import get_db
-            
-            db = next(get_db())
-            
-            # Get all files associated with messages in this conversation
-            message_files = db.query(MessageFile).join(MessageFile.file).filter(
-                MessageFile.message.has(conversation_id=conversation_id)
-            ).all()
-            
-            if not message_files:
-                return "No files uploaded in this conversation"
-            
-            file_list = "Uploaded Files:\n"
-            for msg_file in message_files:
-                file_record = msg_file.file
-                file_list += f"- {file_record.filename} (ID: {file_record.id})\n"
-            
-            return file_list
+            from models import MessageFile
+            from database import SessionLocal
+            
+            db = SessionLocal()
+            try:
+                # Get all files associated with messages in this conversation
+                message_files = db.query(MessageFile).join(MessageFile.file).filter(
+                    MessageFile.message.has(conversation_id=conversation_id)
+                ).all()
+                
+                if not message_files:
+                    return "No files uploaded in this conversation"
+                
+                file_list = "Uploaded Files:\n"
+                for msg_file in message_files:
+                    file_record = msg_file.file
+                    file_list += f"- {file_record.filename} (ID: {file_record.id})\n"
+                
+                return file_list
+            finally:
+                db.close()
             
         except Exception as e:
             return f"Error listing files: {str(e)}"
@@ -154,11 +169,37 @@ class FileProcessingTool(Toolkit):
                         "file_id": {
                             "type": "string",
                             "description": "The ID of the uploaded file to process"
+                        },
+                        "pages": {
+                            "type": "string",
+                            "description": "Optional PDF page range, e.g. '10-20' or '7'"
                         }
                     },
                     "required": ["file_id"]
                 }
             },
+            {
+                "name": "search_file",
+                "description": "Search an uploaded file and return only the passages relevant to a query",
+                "parameters": {
+                    "type": "object",
+                    "properties": {
+                        "file_id": {
+                            "type": "string",
+                            "description": "The ID of the uploaded file to search"
+                        },
+                        "query": {
+                            "type": "string",
+                            "description": "What to look for in the file"
+                        },
+                        "k": {
+                            "type": "integer",
+                            "description": "Number of passages to return (default 5)"
+                        }
+                    },
+                    "required": ["file_id", "query"]
+                }
+            },
             {
                 "name": "list_uploaded_files",
                 "description": "List all files uploaded in the current conversation",
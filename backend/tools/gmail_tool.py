@@ -11,59 +11,42 @@ from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.base import MIMEBase
 from email import encoders
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+import time
 from agno.tools import Toolkit
+from services.gmail_credentials import gmail_credential_store, GMAIL_SCOPES
 import logging
-from dotenv import load_dotenv
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+CATEGORIES = ['primary', 'promotions', 'social', 'updates']
+
+# Search results fetch only these headers, batched (Gmail allows up to 100 calls per batch)
+METADATA_HEADERS = ['Subject', 'From', 'Date']
+GMAIL_BATCH_SIZE = min(int(os.getenv("GMAIL_BATCH_SIZE", "50")), 100)
+GMAIL_BATCH_CONCURRENCY = int(os.getenv("GMAIL_BATCH_CONCURRENCY", "2"))
+GMAIL_RETRY_DELAY_SECONDS = float(os.getenv("GMAIL_RETRY_DELAY_SECONDS", "1"))
+RETRYABLE_STATUSES = (403, 429, 500, 503)  # 403 is how Gmail reports per-user rate limits
+
+
 class GmailTool(Toolkit):
-    """Custom Gmail integration tool for ManishGPT"""
+    """Custom Gmail integration tool for ManishGPT
     
-    def __init__(self):
-        # Load environment variables
-        load_dotenv()
-        
-        self.scopes = [
-            'https://www.googleapis.com/auth/gmail.readonly',
-            'https://www.googleapis.com/auth/gmail.send',
-            'https://www.googleapis.com/auth/gmail.modify'
-        ]
-        
-        # Gmail API setup
-        self.service = None
-        self.credentials = None
-        
-        # Load credentials from environment variables
-        client_id = os.getenv('GMAIL_CLIENT_ID')
-        client_secret = os.getenv('GMAIL_CLIENT_SECRET')
-        project_id = os.getenv('GMAIL_PROJECT_ID')
+    Registered as a per-user tool: each user's instance reads that user's
+    mailbox, with tokens and API clients managed by gmail_credential_store.
+    Users connect their account through /user/gmail/connect.
+    """
+    
+    def __init__(self, user_id: Optional[str] = None):
+        self.user_id = int(user_id) if user_id and str(user_id).isdigit() else None
+        self.scopes = GMAIL_SCOPES
         
-        if not client_id or not client_secret:
-            logger.error("Gmail credentials not found in environment variables")
-            logger.error("Please set GMAIL_CLIENT_ID and GMAIL_CLIENT_SECRET in your .env file")
-            self.user_credentials = None
-        else:
-            self.user_credentials = {
-                "installed": {
-                    "client_id": client_id,
-                    "project_id": project_id,
-                    "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                    "token_uri": "https://oauth2.googleapis.com/token",
-                    "auth_provider_x509_cert_url": "https://www.googleapis.com/oauth2/v1/certs",
-                    "client_secret": client_secret,
-                    "redirect_uris": ["http://localhost"]
-                }
-            }
-            logger.info("Gmail credentials loaded from environment variables")
+        # Set to use a fixed service object instead of the user's (e.g. a stub)
+        self._service = None
         
         # Define tools list
         tools = [
@@ -77,87 +60,26 @@ class GmailTool(Toolkit):
         
         super().__init__(name="gmail", tools=tools)
     
-    def _save_token(self, creds):
-        """Save credentials to token file"""
-        try:
-            token_file = 'gmail_token.json'
-            with open(token_file, 'w') as token:
-                token.write(creds.to_json())
-            logger.info(f"Token saved to {token_file}")
-        except Exception as e:
-            logger.error(f"Error saving token: {e}")
+    @property
+    def service(self):
+        """The user's Gmail client for the calling thread, or None if Gmail is not connected"""
+        if self._service is not None:
+            return self._service
+        if self.user_id is None:
+            return None
+        return gmail_credential_store.get_service(self.user_id)
     
-    def _load_token(self):
-        """Load credentials from token file"""
-        try:
-            token_file = 'gmail_token.json'
-            if os.path.exists(token_file):
-                creds = Credentials.from_authorized_user_file(token_file, self.scopes)
-                logger.info(f"Token loaded from {token_file}")
-                return creds
-        except Exception as e:
-            logger.error(f"Error loading token: {e}")
-        return None
+    @service.setter
+    def service(self, value):
+        self._service = value
     
     def authenticate(self) -> bool:
-        """Authenticate with Gmail API with token persistence"""
+        """Whether the user has a usable Gmail connection"""
         try:
-            # First try to load existing token from file
-            if not self.credentials:
-                self.credentials = self._load_token()
-            
-            # Check if we already have valid credentials
-            if self.credentials and self.credentials.valid:
-                logger.info("Using existing valid credentials")
-                self.service = build('gmail', 'v1', credentials=self.credentials)
+            if self.service is not None:
                 return True
-            
-            # Check if we have expired credentials that can be refreshed
-            if self.credentials and self.credentials.expired and self.credentials.refresh_token:
-                logger.info("Refreshing expired credentials")
-                self.credentials.refresh(Request())
-                self.service = build('gmail', 'v1', credentials=self.credentials)
-                self._save_token(self.credentials)  # Save refreshed token
-                logger.info("Credentials refreshed successfully")
-                return True
-            
-            # Use user-provided credentials first, then fall back to environment
-            if self.user_credentials:
-                creds_info = self.user_credentials
-                logger.info("Using user-provided Gmail credentials")
-            else:
-                # Load credentials from environment
-                creds_json = os.getenv('GMAIL_CREDENTIALS_JSON')
-                if not creds_json:
-                    logger.error("Gmail credentials not found")
-                    logger.error("Please provide credentials using set_credentials() method")
-                    logger.error("Or set GMAIL_CREDENTIALS_JSON environment variable")
-                    logger.error("Get credentials from: https://console.cloud.google.com/")
-                    return False
-                    
-                # Parse credentials
-                creds_info = json.loads(creds_json)
-                logger.info("Using environment Gmail credentials")
-                
-            flow = InstalledAppFlow.from_client_config(
-                creds_info, 
-                self.scopes
-            )
-            
-            # Run local server for auth
-            creds = flow.run_local_server(port=0)
-            
-            # Build service
-            self.service = build('gmail', 'v1', credentials=creds)
-            self.credentials = creds
-            
-            # Save token for future use
-            self._save_token(creds)
-            
-            logger.info("Gmail authentication successful")
-            logger.info(f"Authenticated as: {self._get_user_email()}")
-            return True
-            
+            logger.warning(f"Gmail is not connected for user {self.user_id}; connect it via /user/gmail/connect")
+            return False
         except Exception as e:
             logger.error(f"Gmail auth failed: {e}")
             return False
@@ -184,38 +106,7 @@ class GmailTool(Toolkit):
             if unread_only:
                 gmail_query = f"is:unread {query}"
             
-            # Search Gmail
-            results = self.service.users().messages().list(
-                userId='me',
-                q=gmail_query,
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
-            
-            # Get full message details
-            detailed_messages = []
-            for msg in messages:
-                try:
-                    message = self.service.users().messages().get(
-                        userId='me', 
-                        id=msg['id']
-                    ).execute()
-                    
-                    detailed_messages.append({
-                        'id': msg['id'],
-                        'snippet': message.get('snippet', ''),
-                        'subject': self._extract_subject(message),
-                        'from': self._extract_sender(message),
-                        'date': self._extract_date(message),
-                        'labels': message.get('labelIds', [])
-                    })
-                except HttpError as e:
-                    logger.error(f"Error getting message {msg['id']}: {e}")
-                    continue
-
-            print("gg messages", detailed_messages)        
-            return detailed_messages
+            return self._search(gmail_query, max_results)
             
         except HttpError as e:
             logger.error(f"Gmail search error: {e}")
@@ -253,37 +144,7 @@ class GmailTool(Toolkit):
                 gmail_query += f" {query}"
             
             logger.info(f"Searching Gmail with query: {gmail_query}")
-            
-            # Search Gmail
-            results = self.service.users().messages().list(
-                userId='me',
-                q=gmail_query,
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
-            
-            # Get full message details
-            detailed_messages = []
-            for msg in messages:
-                try:
-                    message = self.service.users().messages().get(
-                        userId='me', 
-                        id=msg['id']
-                    ).execute()
-                    
-                    detailed_messages.append({
-                        'id': msg['id'],
-                        'snippet': message.get('snippet', ''),
-                        'subject': self._extract_subject(message),
-                        'from': self._extract_sender(message),
-                        'date': self._extract_date(message),
-                        'labels': message.get('labelIds', [])
-                    })
-                except HttpError as e:
-                    logger.error(f"Error getting message {msg['id']}: {e}")
-                    continue
-
+            detailed_messages = self._search(gmail_query, max_results)
             logger.info(f"Found {len(detailed_messages)} emails between {start_date} and {end_date}")
             return detailed_messages
             
@@ -309,9 +170,8 @@ class GmailTool(Toolkit):
                 return []
         
         # Validate category
-        valid_categories = ['primary', 'promotions', 'social', 'updates']
-        if category.lower() not in valid_categories:
-            logger.error(f"Invalid category: {category}. Valid categories: {valid_categories}")
+        if category.lower() not in CATEGORIES:
+            logger.error(f"Invalid category: {category}. Valid categories: {CATEGORIES}")
             return []
         
         try:
@@ -328,38 +188,7 @@ class GmailTool(Toolkit):
                 gmail_query += f" {query}"
             
             logger.info(f"Searching Gmail category '{category}' with query: {gmail_query}")
-            
-            # Search Gmail
-            results = self.service.users().messages().list(
-                userId='me',
-                q=gmail_query,
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
-            
-            # Get full message details
-            detailed_messages = []
-            for msg in messages:
-                try:
-                    message = self.service.users().messages().get(
-                        userId='me', 
-                        id=msg['id']
-                    ).execute()
-                    
-                    detailed_messages.append({
-                        'id': msg['id'],
-                        'snippet': message.get('snippet', ''),
-                        'subject': self._extract_subject(message),
-                        'from': self._extract_sender(message),
-                        'date': self._extract_date(message),
-                        'labels': message.get('labelIds', []),
-                        'category': category.lower()
-                    })
-                except HttpError as e:
-                    logger.error(f"Error getting message {msg['id']}: {e}")
-                    continue
-
+            detailed_messages = self._search(gmail_query, max_results, category=category.lower())
             logger.info(f"Found {len(detailed_messages)} emails in {category} category")
             return detailed_messages
             
@@ -390,8 +219,7 @@ class GmailTool(Toolkit):
             
             # Add category if specified
             if category:
-                valid_categories = ['primary', 'promotions', 'social', 'updates']
-                if category.lower() in valid_categories:
+                if category.lower() in CATEGORIES:
                     gmail_query += f" category:{category.lower()}"
                 else:
                     logger.warning(f"Invalid category: {category}. Ignoring category filter.")
@@ -401,39 +229,12 @@ class GmailTool(Toolkit):
                 gmail_query += f" {query}"
             
             logger.info(f"Searching for unread emails with query: {gmail_query}")
-            
-            # Search Gmail
-            results = self.service.users().messages().list(
-                userId='me',
-                q=gmail_query,
-                maxResults=max_results
-            ).execute()
-            
-            messages = results.get('messages', [])
-            
-            # Get full message details
-            detailed_messages = []
-            for msg in messages:
-                try:
-                    message = self.service.users().messages().get(
-                        userId='me', 
-                        id=msg['id']
-                    ).execute()
-                    
-                    detailed_messages.append({
-                        'id': msg['id'],
-                        'snippet': message.get('snippet', ''),
-                        'subject': self._extract_subject(message),
-                        'from': self._extract_sender(message),
-                        'date': self._extract_date(message),
-                        'labels': message.get('labelIds', []),
-                        'is_unread': True,
-                        'category': category.lower() if category else 'unknown'
-                    })
-                except HttpError as e:
-                    logger.error(f"Error getting message {msg['id']}: {e}")
-                    continue
-
+            detailed_messages = self._search(
+                gmail_query,
+                max_results,
+                is_unread=True,
+                category=category.lower() if category else 'unknown'
+            )
             logger.info(f"Found {len(detailed_messages)} unread emails")
             return detailed_messages
             
@@ -441,6 +242,96 @@ class GmailTool(Toolkit):
             logger.error(f"Gmail unread search error: {e}")
             return []
     
+    def _search(self, gmail_query: str, max_results: int, **extra: Any) -> List[Dict[str, Any]]:
+        """List matching message ids, then fetch their headers in batches.
+        
+        One list call plus one batch call per GMAIL_BATCH_SIZE messages,
+        instead of a messages().get round-trip per result.
+        """
+        service = self.service
+        results = service.users().messages().list(
+            userId='me',
+            q=gmail_query,
+            maxResults=max_results
+        ).execute()
+        
+        message_ids = [msg['id'] for msg in results.get('messages', [])]
+        summaries = []
+        for message in self._get_metadata(service, message_ids):
+            summaries.append({
+                'id': message['id'],
+                'snippet': message.get('snippet', ''),
+                'subject': self._extract_subject(message),
+                'from': self._extract_sender(message),
+                'date': self._extract_date(message),
+                'labels': message.get('labelIds', []),
+                **extra
+            })
+        return summaries
+    
+    def _get_metadata(self, service, message_ids: List[str]) -> List[Dict[str, Any]]:
+        """Fetch headers and snippets for messages, in list order, skipping failures"""
+        if not message_ids:
+            return []
+        
+        chunks = [message_ids[i:i + GMAIL_BATCH_SIZE] for i in range(0, len(message_ids), GMAIL_BATCH_SIZE)]
+        fetched: Dict[str, Dict[str, Any]] = {}
+        retry: List[str] = []
+        if len(chunks) == 1:
+            results = [self._execute_batch(service, chunks[0])]
+        else:
+            # httplib2 connections are not thread-safe: every worker batch gets its own
+            with ThreadPoolExecutor(max_workers=GMAIL_BATCH_CONCURRENCY) as executor:
+                results = list(executor.map(lambda chunk: self._execute_batch(service, chunk, self._new_http()), chunks))
+        for batch_fetched, batch_retry in results:
+            fetched.update(batch_fetched)
+            retry.extend(batch_retry)
+        
+        # Calls rejected for rate limits get one more (sequential) try after a pause
+        if retry:
+            time.sleep(GMAIL_RETRY_DELAY_SECONDS)
+            for i in range(0, len(retry), GMAIL_BATCH_SIZE):
+                fetched.update(self._execute_batch(service, retry[i:i + GMAIL_BATCH_SIZE])[0])
+        
+        return [fetched[message_id] for message_id in message_ids if message_id in fetched]
+    
+    def _execute_batch(self, service, message_ids: List[str], http=None) -> Tuple[Dict[str, Dict[str, Any]], List[str]]:
+        """One batch HTTP request of metadata-only messages().get calls.
+        
+        Returns the fetched messages by id and the ids worth retrying.
+        """
+        fetched: Dict[str, Dict[str, Any]] = {}
+        retry: List[str] = []
+        
+        def collect(request_id, response, exception):
+            if exception is None:
+                fetched[request_id] = response
+            elif isinstance(exception, HttpError) and exception.resp.status in RETRYABLE_STATUSES:
+                retry.append(request_id)
+            else:
+                logger.error(f"Error getting message {request_id}: {exception}")
+        
+        batch = service.new_batch_http_request(callback=collect)
+        for message_id in message_ids:
+            batch.add(
+                service.users().messages().get(
+                    userId='me',
+                    id=message_id,
+                    format='metadata',
+                    metadataHeaders=METADATA_HEADERS,
+                    fields='id,labelIds,snippet,payload/headers'
+                ),
+                request_id=message_id
+            )
+        batch.execute(http=http)
+        return fetched, retry
+    
+    def _new_http(self):
+        """A separate authorized HTTP connection for a worker thread"""
+        if self._service is not None or self.user_id is None:
+            return None
+        return gmail_credential_store.new_http(self.user_id)
+    
     def read_email(self, message_id: str) -> Dict[str, Any]:
         """Read specific Gmail message"""
         if not self.service:
@@ -1,36 +1,173 @@
-from typing import Callable, Dict, List
+from collections import OrderedDict
+from importlib import import_module
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Type, Union
+import os
+import threading
 
-from agno.tools import Toolkit
+if TYPE_CHECKING:
+    from agno.tools import Toolkit
 
-# Import and register concrete tools here
-from .yt_tool import YouTube_Tool
-from .web_search_tool import WebSearchTool
-from .file_processing_tool import FileProcessingTool
-from .gmail_tool import GmailTool
 
+# Instance scopes: "shared" toolkits are built once per process and handed to
+# every agent; "per_user" toolkits hold a user's credentials or session, so
+# one instance is kept per user and their factory is called with user_id=...
+SHARED = "shared"
+PER_USER = "per_user"
 
-# Registry maps a short tool name to a factory that returns a Toolkit instance
-TOOL_REGISTRY: Dict[str, Callable[[], Toolkit]] = {
-    "youtube": lambda: YouTube_Tool(),
-    "web_search": lambda: WebSearchTool(),
-    "file_processing": lambda: FileProcessingTool(),
-    "gmail": lambda: GmailTool(),
+# Registry maps a short tool name to a "module:Class" spec, imported on first
+# use so that unused toolkits (and their SDKs) never load, or to a factory
+# that returns a Toolkit instance
+TOOL_REGISTRY: Dict[str, Union[str, Callable[..., "Toolkit"]]] = {
+    "youtube": ".yt_tool:YouTube_Tool",
+    "web_search": ".web_search_tool:WebSearchTool",
+    "file_processing": ".file_processing_tool:FileProcessingTool",
+    "gmail": ".gmail_tool:GmailTool",
 }
 
+TOOL_SCOPES: Dict[str, str] = {
+    "youtube": SHARED,
+    "web_search": SHARED,
+    "file_processing": SHARED,
+    "gmail": PER_USER,
+}
+
+# Catalog entries synced into the tools table, readable without importing anything
+TOOL_DESCRIPTIONS: Dict[str, str] = {
+    "youtube": "YouTube video transcript extraction tool",
+    "web_search": "Web search tool for finding information",
+    "file_processing": "File processing tool for PDF, DOCX, and other document types",
+    "gmail": "Gmail integration tool for email management",
+}
 
-def register_tool(name: str, factory: Callable[[], Toolkit]) -> None:
-    if not callable(factory):
-        raise ValueError("factory must be callable and return a Toolkit instance")
-    TOOL_REGISTRY[name] = factory
+# Per-user instances kept before the least recently used is dropped
+USER_TOOL_POOL_SIZE = int(os.getenv("TOOL_USER_POOL_SIZE", "256"))
 
+_factories: Dict[str, Callable[..., "Toolkit"]] = {}
+_shared: Dict[str, "Toolkit"] = {}
+_per_user: "OrderedDict[Tuple[str, Optional[str]], Toolkit]" = OrderedDict()
+_lock = threading.Lock()
+_counters = {"hits": 0, "builds": 0, "evictions": 0}
 
-def get_tools(tool_names: List[str]) -> List[Toolkit]:
-    tools: List[Toolkit] = []
-    for name in tool_names:
-        factory = TOOL_REGISTRY.get(name)
+
+def _load_class(spec: str) -> Type["Toolkit"]:
+    module_name, _, class_name = spec.partition(":")
+    module = import_module(module_name, package=__package__)
+    return getattr(module, class_name)
+
+
+def register_tool(
+    name: str,
+    factory: Union[str, Callable[..., "Toolkit"]],
+    description: str = "",
+    scope: str = SHARED,
+) -> None:
+    if not isinstance(factory, str) and not callable(factory):
+        raise ValueError("factory must be a 'module:Class' spec or a callable returning a Toolkit instance")
+    if scope not in (SHARED, PER_USER):
+        raise ValueError(f"Unknown tool scope: {scope}")
+    with _lock:
+        TOOL_REGISTRY[name] = factory
+        TOOL_SCOPES[name] = scope
+        _factories.pop(name, None)
+        _forget(name)
+        if description:
+            TOOL_DESCRIPTIONS[name] = description
+
+
+def tool_scope(name: str) -> str:
+    return TOOL_SCOPES.get(name, SHARED)
+
+
+def has_per_user_tools(tool_names: List[str]) -> bool:
+    """Whether agents with these tools must be built for a specific user"""
+    return any(tool_scope(name) == PER_USER for name in tool_names)
+
+
+def tool_class_name(name: str) -> str:
+    """Class name of a registered tool, without importing it when it is a spec"""
+    entry = TOOL_REGISTRY[name]
+    if isinstance(entry, str):
+        return entry.partition(":")[2]
+    return get_tool(name).__class__.__name__
+
+
+def get_tool_factory(name: str) -> Callable[..., "Toolkit"]:
+    """Factory for a registered tool, importing its module on first use"""
+    factory = _factories.get(name)
+    if factory is not None:
+        return factory
+    entry = TOOL_REGISTRY.get(name)
+    if entry is None:
+        raise ValueError(f"Unknown tool name: {name}")
+    with _lock:
+        factory = _factories.get(name)
         if factory is None:
-            raise ValueError(f"Unknown tool name: {name}")
-        tools.append(factory())
+            factory = _load_class(entry) if isinstance(entry, str) else entry
+            _factories[name] = factory
+    return factory
+
+
+def get_tool(name: str, user_id: Optional[str] = None) -> "Toolkit":
+    """The pooled instance of a tool: process-wide, or the user's own for per-user tools.
+
+    Instances are shared by every agent that lists the tool, so toolkit
+    methods must not keep per-run state.
+    """
+    per_user = tool_scope(name) == PER_USER
+    key = (name, user_id)
+    with _lock:
+        tool = _per_user.get(key) if per_user else _shared.get(name)
+        if tool is not None:
+            if per_user:
+                _per_user.move_to_end(key)
+            _counters["hits"] += 1
+            return tool
+
+    # Build outside the lock - toolkits may load credentials or open clients
+    factory = get_tool_factory(name)
+    tool = factory(user_id=user_id) if per_user else factory()
+
+    with _lock:
+        _counters["builds"] += 1
+        if not per_user:
+            # Another request may have built it meanwhile; keep the first one
+            return _shared.setdefault(name, tool)
+        existing = _per_user.get(key)
+        if existing is not None:
+            return existing
+        _per_user[key] = tool
+        while len(_per_user) > USER_TOOL_POOL_SIZE:
+            _per_user.popitem(last=False)
+            _counters["evictions"] += 1
+        return tool
+
+
+def get_tools(tool_names: List[str], user_id: Optional[str] = None) -> List["Toolkit"]:
+    tools: List["Toolkit"] = []
+    for name in tool_names:
+        tools.append(get_tool(name, user_id))
     return tools
 
 
+def evict_user_tools(user_id: Optional[str]) -> None:
+    """Drop a user's per-user tool instances, e.g. after their credentials change"""
+    with _lock:
+        for key in [key for key in _per_user if key[1] == user_id]:
+            del _per_user[key]
+
+
+def _forget(name: str) -> None:
+    # Caller must hold _lock
+    _shared.pop(name, None)
+    for key in [key for key in _per_user if key[0] == name]:
+        del _per_user[key]
+
+
+def stats() -> Dict[str, Any]:
+    """Instance pool counters for the admin metrics endpoint"""
+    with _lock:
+        return {
+            **_counters,
+            "shared_instances": len(_shared),
+            "per_user_instances": len(_per_user),
+        }
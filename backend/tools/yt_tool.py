@@ -46,6 +46,9 @@ class YouTube_Tool(Toolkit):
 
         super().__init__(name="youtube_tools", tools=tools, **kwargs)
 
+        # One transcript client (and its HTTP session) for the shared instance
+        self._transcript_api = YouTubeTranscriptApi()
+
 
 
     def get_youtube_video_id(self, url: str) -> Optional[str]:
@@ -88,9 +91,8 @@ class YouTube_Tool(Toolkit):
             if not video_id:
                 return "Error: Could not extract video ID from URL"
             
-            ytt_api = YouTubeTranscriptApi()
             print("📝 Fetching transcript...")
-            transcript = ytt_api.fetch(video_id)
+            transcript = self._transcript_api.fetch(video_id)
             
             # Join all transcript snippets with proper spacing
             all_text = " ".join([snippet.text for snippet in transcript.snippets])
@@ -26,13 +26,21 @@ function Chat({ isSidebarCollapsed }) {
   const [personaId, setPersonaId] = useState(null);
   const [conversationId, setConversationId] = useState(null);
   const [personaName, setPersonaName] = useState(null);
+  const [hasOlderMessages, setHasOlderMessages] = useState(false);
+  const [loadingOlder, setLoadingOlder] = useState(false);
   const messagesEndRef = useRef(null);
+  const skipScrollRef = useRef(false);
 
   const scrollToBottom = () => {
     messagesEndRef.current?.scrollIntoView({ behavior: "smooth" });
   };
 
   useEffect(() => {
+    // Prepending older messages should keep the reader where they are
+    if (skipScrollRef.current) {
+      skipScrollRef.current = false;
+      return;
+    }
     scrollToBottom();
   }, [messages]);
 
@@ -47,6 +55,7 @@ function Chat({ isSidebarCollapsed }) {
         setPersonaId(extractedPersonaId);
         setConversationId(null);
         setMessages([]); // Clear messages for new persona chat
+        setHasOlderMessages(false);
         // Fetch persona name
         fetchPersonaName(extractedPersonaId);
       } else {
@@ -54,7 +63,10 @@ function Chat({ isSidebarCollapsed }) {
         setPersonaId(null);
         setConversationId(id);
         userAPI.getMessages(id)
-          .then(setMessages)
+          .then(data => {
+            setMessages(data.messages);
+            setHasOlderMessages(data.has_more);
+          })
           .catch(error => console.error('Error fetching messages:', error));
         // Fetch conversation to get persona info
         userAPI.getConversation(id)
@@ -70,9 +82,27 @@ function Chat({ isSidebarCollapsed }) {
       setConversationId(null);
       setPersonaName(null);
       setMessages([]);
+      setHasOlderMessages(false);
     }
   }, [id, location.pathname]);
 
+  const loadOlderMessages = async () => {
+    const oldest = messages.find(m => m.id);
+    if (!conversationId || !oldest || loadingOlder) return;
+
+    setLoadingOlder(true);
+    try {
+      const data = await userAPI.getMessages(conversationId, { before_id: oldest.id });
+      skipScrollRef.current = true;
+      setMessages(prev => [...data.messages, ...prev]);
+      setHasOlderMessages(data.has_more);
+    } catch (error) {
+      console.error('Error fetching older messages:', error);
+    } finally {
+      setLoadingOlder(false);
+    }
+  };
+
   const fetchPersonaName = async (personaId) => {
     try {
       const personas = await userAPI.getPersonas();
@@ -239,18 +269,15 @@ function Chat({ isSidebarCollapsed }) {
     const file = event.target.files[0];
     if (!file) return;
 
-    // Validate file size (10MB max)
-    if (file.size > 10 * 1024 * 1024) {
-      alert('File too large. Maximum size is 10MB');
+    // Validate file size (100MB max, matches the backend MAX_UPLOAD_SIZE default)
+    if (file.size > 100 * 1024 * 1024) {
+      alert('File too large. Maximum size is 100MB');
       return;
     }
 
     setIsUploading(true);
     try {
-      const formData = new FormData();
-      formData.append('file', file);
-
-      const response = await userAPI.uploadFile(formData);
+      const response = await userAPI.uploadFile(file);
       setUploadedFiles(prev => [...prev, response]);
     } catch (error) {
       console.error('File upload failed:', error);
@@ -449,6 +476,24 @@ function Chat({ isSidebarCollapsed }) {
             flexDirection: "column",
             gap: "24px",
           }}>
+            {hasOlderMessages && (
+              <button
+                onClick={loadOlderMessages}
+                disabled={loadingOlder}
+                style={{
+                  alignSelf: "center",
+                  background: "transparent",
+                  border: "1px solid var(--border-subtle)",
+                  borderRadius: "16px",
+                  color: "var(--text-secondary)",
+                  padding: "6px 16px",
+                  cursor: loadingOlder ? "default" : "pointer",
+                  fontSize: "13px",
+                }}
+              >
+                {loadingOlder ? "Loading..." : "Load earlier messages"}
+              </button>
+            )}
             {messages.map((m, i) => {
               let codeBlockIndex = 0;
               const isHovered = hoveredMessage === i;
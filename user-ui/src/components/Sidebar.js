@@ -7,6 +7,7 @@ import ChevronLeftIcon from '@mui/icons-material/ChevronLeft';
 import ChevronRightIcon from '@mui/icons-material/ChevronRight';
 import PsychologyIcon from '@mui/icons-material/Psychology';
 import LogoutIcon from '@mui/icons-material/Logout';
+import MailOutlineIcon from '@mui/icons-material/MailOutline';
 import ChatBubbleOutlineIcon from '@mui/icons-material/ChatBubbleOutline';
 import MoreHorizIcon from '@mui/icons-material/MoreHoriz';
 import { useAuth } from '../contexts/AuthContext';
@@ -19,6 +20,7 @@ function Sidebar({ isCollapsed, onToggle }) {
   const [editValue, setEditValue] = useState("");
   const [contextMenu, setContextMenu] = useState({ show: false, x: 0, y: 0, conversationId: null });
   const [activePersonaId, setActivePersonaId] = useState(null);
+  const [gmail, setGmail] = useState({ connected: false });
   const navigate = useNavigate();
   const location = useLocation();
   const { user, logout } = useAuth();
@@ -26,6 +28,16 @@ function Sidebar({ isCollapsed, onToggle }) {
   useEffect(() => {
     fetchPersonas();
     fetchConversations();
+    fetchGmailStatus();
+
+    // The Gmail consent flow redirects back with ?gmail=connected or ?gmail=error
+    const params = new URLSearchParams(window.location.search);
+    if (params.get('gmail') === 'error') {
+      alert(`Could not connect Gmail (${params.get('error') || 'unknown error'})`);
+    }
+    if (params.has('gmail')) {
+      navigate(location.pathname, { replace: true });
+    }
 
     const handleConversationDeleted = () => fetchConversations();
     const handleConversationCreated = () => fetchConversations();
@@ -84,6 +96,29 @@ function Sidebar({ isCollapsed, onToggle }) {
     }
   };
 
+  const fetchGmailStatus = async () => {
+    try {
+      setGmail(await userAPI.getGmailStatus());
+    } catch (error) {
+      console.error('Error fetching Gmail status:', error);
+    }
+  };
+
+  const handleGmailClick = async () => {
+    try {
+      if (gmail.connected) {
+        if (!window.confirm(`Disconnect Gmail (${gmail.email || 'connected account'})?`)) return;
+        await userAPI.disconnectGmail();
+        setGmail({ connected: false });
+      } else {
+        window.location.href = await userAPI.connectGmail();
+      }
+    } catch (error) {
+      console.error('Error updating Gmail connection:', error);
+      alert('Could not update the Gmail connection');
+    }
+  };
+
   const fetchConversations = async () => {
     try {
       const data = await userAPI.getConversations();
@@ -592,12 +627,36 @@ function Sidebar({ isCollapsed, onToggle }) {
         </div>
       )}
 
-      {/* Logout Button */}
+      {/* Gmail connection and Logout Buttons */}
       <div style={{
         marginTop: "auto",
         paddingTop: "20px",
         borderTop: "1px solid var(--border-subtle)",
       }}>
+        <button
+          onClick={handleGmailClick}
+          title={gmail.connected ? `Connected as ${gmail.email || 'unknown'} - click to disconnect` : 'Connect your Gmail account for the Gmail tool'}
+          style={{
+            background: "transparent",
+            border: "none",
+            color: "var(--text-secondary)",
+            cursor: "pointer",
+            padding: "10px 12px",
+            borderRadius: "8px",
+            display: "flex",
+            alignItems: "center",
+            gap: "10px",
+            fontSize: "14px",
+            fontWeight: "500",
+            width: "100%",
+            transition: "var(--transition-fast)",
+          }}
+          onMouseEnter={(e) => e.target.style.background = "var(--bg-tertiary)"}
+          onMouseLeave={(e) => e.target.style.background = "transparent"}
+        >
+          <MailOutlineIcon style={{ fontSize: "18px" }} />
+          {gmail.connected ? 'Disconnect Gmail' : 'Connect Gmail'}
+        </button>
         <button
           onClick={logout}
           style={{
@@ -168,27 +168,102 @@ export const userAPI = {
     }
   },
 
-  getMessages: async (conversationId) => {
-    const response = await api.get(`/user/conversations/${conversationId}/messages`);
+  // Returns { messages, has_more }; pass { before_id } for older pages or { after_id } to sync newer ones
+  getMessages: async (conversationId, params = {}) => {
+    const response = await api.get(`/user/conversations/${conversationId}/messages`, { params });
     return response.data;
   },
 
   // File upload methods
-  uploadFile: async (formData) => {
+  uploadFile: async (file) => {
     const token = localStorage.getItem('userToken');
-    const response = await fetch(`${API_BASE_URL}/user/upload`, {
+    const authHeaders = {
+      'Authorization': `Bearer ${token}`,
+      'Content-Type': 'application/json',
+    };
+
+    // 1. Ask the backend for a presigned POST policy
+    const presignResponse = await fetch(`${API_BASE_URL}/user/uploads/presign`, {
+      method: 'POST',
+      headers: authHeaders,
+      body: JSON.stringify({
+        filename: file.name,
+        content_type: file.type || 'application/octet-stream',
+        file_size: file.size,
+      }),
+    });
+    if (presignResponse.status === 501) {
+      // Direct uploads not configured on this server: send the file through the backend
+      const formData = new FormData();
+      formData.append('file', file);
+      const response = await fetch(`${API_BASE_URL}/user/upload`, {
+        method: 'POST',
+        headers: { 'Authorization': `Bearer ${token}` },
+        body: formData,
+      });
+      if (!response.ok) {
+        throw new Error(`Upload failed: ${response.status}`);
+      }
+      return response.json();
+    }
+    if (!presignResponse.ok) {
+      throw new Error(`Upload failed: ${presignResponse.status}`);
+    }
+    const { upload_url, fields, upload_token } = await presignResponse.json();
+
+    // 2. Send the bytes straight to object storage; the file field must come last
+    const formData = new FormData();
+    Object.entries(fields).forEach(([key, value]) => formData.append(key, value));
+    formData.append('file', file);
+    const storageResponse = await fetch(upload_url, {
+      method: 'POST',
+      body: formData,
+    });
+    if (!storageResponse.ok) {
+      throw new Error(`Upload failed: ${storageResponse.status}`);
+    }
+
+    // 3. Register the uploaded object as a file
+    const finalizeResponse = await fetch(`${API_BASE_URL}/user/uploads/finalize`, {
       method: 'POST',
+      headers: authHeaders,
+      body: JSON.stringify({ upload_token }),
+    });
+    if (!finalizeResponse.ok) {
+      throw new Error(`Upload failed: ${finalizeResponse.status}`);
+    }
+
+    return finalizeResponse.json();
+  },
+
+  // Gmail connection for the Gmail tool
+  getGmailStatus: async () => {
+    const response = await api.get('/user/gmail');
+    return response.data;
+  },
+
+  // Returns the Google consent URL; credentials are included so the backend can
+  // set the nonce cookie its callback checks
+  connectGmail: async () => {
+    const token = localStorage.getItem('userToken');
+    const response = await fetch(`${API_BASE_URL}/user/gmail/connect`, {
       headers: {
         'Authorization': `Bearer ${token}`,
       },
-      body: formData,
+      credentials: 'include',
     });
 
     if (!response.ok) {
-      throw new Error(`Upload failed: ${response.status}`);
+      throw new Error(`Gmail connect failed: ${response.status}`);
     }
 
-    return response.json();
+    const { auth_url } = await response.json();
+    return auth_url;
+  },
+
+  disconnectGmail: async () => {
+    const response = await api.delete('/user/gmail');
+    return response.data;
   },
 
   downloadFile: async (fileId) => {